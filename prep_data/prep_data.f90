@@ -1,3 +1,84 @@
+module grid
+
+    ! Per-cell state of the model being prepared, formerly the COMMON
+    ! blocks named in the comments and sized by parameter (idim=10000).
+    ! grid_alloc sizes the arrays before each configuration is prepared.
+    implicit none
+
+    integer, parameter :: iqn = 17
+
+    integer :: idim = 0
+
+    ! /abun/
+    real,             allocatable :: ycc(:,:)
+    ! /carac/
+    double precision, allocatable :: deltam(:), abar(:)
+    ! /cellc/
+    double precision, allocatable :: u(:), rho(:), ye(:), q(:), dq(:)
+    ! /celle/
+    double precision, allocatable :: x(:), v(:)
+    ! /cent/
+    double precision, allocatable :: dj(:)
+    ! /eosq/
+    double precision, allocatable :: pr(:), vsound(:), u2(:)
+    double precision              :: vsmax = 0.d0
+    ! /freez/
+    double precision, allocatable :: ufreez(:)
+    ! /nustuff/
+    double precision, allocatable :: ynue(:), ynueb(:), ynux(:),             &
+                                     unue(:), unueb(:), unux(:)
+    ! /state/
+    double precision, allocatable :: xp(:), xn(:), eta(:)
+    integer,          allocatable :: ifleos(:)
+    ! /tempe/
+    double precision, allocatable :: temp(:)
+    ! /timei/
+    double precision, allocatable :: steps(:)
+
+    contains
+    subroutine grid_alloc(ncell)
+
+    ! Allocates (zeroed) room for at least ncell cells
+    integer :: ncell
+
+        if (allocated(x)) then
+            if (ncell.le.idim) return
+            deallocate(ycc, deltam, abar, u, rho, ye, q, dq, x, v, dj,      &
+                       pr, vsound, u2, ufreez, ynue, ynueb, ynux,            &
+                       unue, unueb, unux, xp, xn, eta, ifleos, temp, steps)
+        endif
+
+        idim = ncell
+
+        allocate(ycc(idim,iqn))
+        allocate(deltam(idim), abar(idim))
+        allocate(u(idim), rho(idim), ye(idim), q(idim), dq(idim))
+        allocate(x(0:idim), v(0:idim))
+        allocate(dj(idim))
+        allocate(pr(idim), vsound(idim), u2(idim))
+        allocate(ufreez(idim))
+        allocate(ynue(idim), ynueb(idim), ynux(idim),                       &
+                 unue(idim), unueb(idim), unux(idim))
+        allocate(xp(idim), xn(idim), eta(idim), ifleos(idim))
+        allocate(temp(idim))
+        allocate(steps(idim))
+
+        ycc    = 0.0
+        deltam = 0.d0;   abar   = 0.d0
+        u      = 0.d0;   rho    = 0.d0;   ye     = 0.d0;   q = 0.d0;   dq = 0.d0
+        x      = 0.d0;   v      = 0.d0
+        dj     = 0.d0
+        pr     = 0.d0;   vsound = 0.d0;   u2     = 0.d0
+        ufreez = 0.d0
+        ynue   = 0.d0;   ynueb  = 0.d0;   ynux   = 0.d0
+        unue   = 0.d0;   unueb  = 0.d0;   unux   = 0.d0
+        xp     = 0.d0;   xn     = 0.d0;   eta    = 0.d0;   ifleos = 0
+        temp   = 0.d0
+        steps  = 0.d0
+
+    end subroutine
+end module
+
 program read 
     !*************************************************************              
     !                                                            *              
@@ -8,8 +89,159 @@ program read
     !  It then sets up a binary file that can be read by         *
     !  COLLAPSO1D, our 1d supernova model.                       *              
     !                                                            *              
+    !  Batch mode: ./prep_data setup_prep_batch [rank nproc]     *
+    !  prepares every configuration listed in the batch file,    *
+    !  loading the EOS table and nuclear data only once. With    *
+    !  nproc > 1, each process takes every nproc-th entry.       *
+    !                                                            *              
     !*************************************************************              
     !                                                                             
+          use grid, only: grid_alloc
+          implicit double precision (a-h, o-z) 
+    !                                                                       
+          double precision maxrad, deltam_growth, enclmass_conv_cutoff 
+          integer ieos, ieos_loaded, iconf, irank, nproc, ios
+          integer pns_grid_goal,conv_grid_goal,grid_goal
+          logical batch, sl_loaded
+    !                                                                       
+          character*1024 filin,filout,eos_table,batch_file,arg
+    !                                                                       
+          batch = command_argument_count().ge.1
+          irank = 0
+          nproc = 1
+          if (command_argument_count().ge.3) then
+              call get_command_argument(number=2, value=arg)
+              read(arg,*) irank
+              call get_command_argument(number=3, value=arg)
+              read(arg,*) nproc
+          endif
+    !                                                                       
+    !--single configuration from setup_prep                                 
+    !                                                                       
+          if (.not.batch) then
+              open(521,file='setup_prep') 
+              read(521,*) 
+              read(521,522) filin 
+              read(521,*) 
+              read(521,*) 
+              read(521,522) filout 
+              read(521,*) 
+              read(521,*) 
+              read(521,*) pns_grid_goal
+              read(521,*) 
+              read(521,*)    
+              read(521,*) conv_grid_goal
+              read(521,*)
+              read(521,*)
+              read(521,*) grid_goal
+              read(521,*) 
+              read(521,*)                                      
+              read(521,*) pns_cutoff
+              read(521,*) 
+              read(521,*) 
+              read(521,*) enclmass_conv_cutoff
+              read(521,*)
+              read(521,*)
+              read(521,*) deltam_conv 
+              read(521,*)
+              read(521,*) 
+              read(521,*) deltam_growth
+              read(521,*)
+              read(521,*) 
+              read(521,*) maxrad 
+              read(521,*) 
+              read(521,*) 
+              read(521,*) ieos      
+              read(521,*) 
+              read(521,*)       
+              read(521,522) eos_table
+
+              call grid_alloc(max(10000,2*grid_goal))
+              call prep_model(filin,filout,pns_grid_goal,conv_grid_goal,  &
+                              grid_goal,pns_cutoff,enclmass_conv_cutoff,  &
+                              deltam_conv,deltam_growth,maxrad,ieos,      &
+                              eos_table)
+              stop
+          endif
+    !                                                                       
+    !--batch of configurations, one per line after the header              
+    !                                                                       
+          call get_command_argument(number=1, value=batch_file)
+          open(521,file=trim(batch_file)) 
+          read(521,*) 
+          read(521,*) 
+          read(521,*) 
+          read(521,522) eos_table
+          read(521,*) 
+
+          ! wdump also writes abundances to unit 43, keep it separate per process
+          if (nproc.gt.1) then
+              write(arg,'(I0)') irank
+              open(43,file='fort.43_'//trim(arg))
+          endif
+
+          print*,'============= Batch Setup =============='
+          print*, 'Batch File:              ', trim(batch_file)
+          print*, 'Process:                 ', irank, ' of', nproc
+          print*,'======================================='
+
+          iconf       = 0
+          ieos_loaded = 0
+          sl_loaded   = .false.
+          do
+              read(521,*,iostat=ios) filin, filout, pns_grid_goal,           &
+                                     conv_grid_goal, grid_goal, pns_cutoff,  &
+                                     enclmass_conv_cutoff, deltam_conv,      &
+                                     deltam_growth, maxrad, ieos
+              if (ios.lt.0) exit
+              if (ios.gt.0) then
+                  print*, 'ERROR: could not read configuration', iconf+1, 'in ', trim(batch_file)
+                  call exit
+              endif
+              iconf = iconf + 1
+              if (mod(iconf-1,nproc).ne.irank) cycle
+    !                   
+    !--nuclear data and the EOS table are shared by all configurations
+    !   
+              if (ieos.eq.4.and..not.sl_loaded) then     
+                call nucdata   ! nucdata is in nse5.f                                       
+                call loadmx () ! loadmx is in sleos.f
+                sl_loaded = .true.
+              endif        
+              if (ieos.eq.5.and.ieos_loaded.ne.5) then 
+                call readtable(trim(eos_table))
+                ieos_loaded = 5
+              endif  
+
+              call grid_alloc(max(10000,2*grid_goal))
+              call prep_model(filin,filout,pns_grid_goal,conv_grid_goal,  &
+                              grid_goal,pns_cutoff,enclmass_conv_cutoff,  &
+                              deltam_conv,deltam_growth,maxrad,-ieos,     &
+                              eos_table)
+          enddo
+          close(521)
+
+      522 format(A) 
+          print*,'======================================='
+          print*, 'Prepared', (iconf-irank+nproc-1)/nproc, 'configurations'
+          stop 
+          END                                                                                     
+!      
+          subroutine prep_model(filin,filout,pns_grid_goal,conv_grid_goal,  &
+                                grid_goal,pns_cutoff,enclmass_conv_cutoff,  &
+                                deltam_conv,deltam_growth,maxrad,ieos_in,   &
+                                eos_table)
+!************************************************************           
+!                                                           *           
+!  Prepares a single progenitor: reads the KEPLER data,     *
+!  builds the grid and writes the initial dump to filout.   *
+!  ieos_in < 0 means that the EOS data is already loaded.   *
+!                                                           *           
+!************************************************************           
+          use grid, only: idim, x, v, u, rho, ye, q, dq, ynue, ynueb, &
+                          ynux, unue, unueb, unux, pr, vsound, u2, vsmax, &
+                          deltam, abar, xp, xn, eta, ifleos, ufreez, &
+                          temp, dj, ycc
           implicit double precision (a-h, o-z) 
     !                                                                       
           parameter(utemp=1e9) 
@@ -21,23 +253,9 @@ program read
           parameter(pi43=3.14159*4.0/3.0) 
           parameter(iqn=17)
     !                                                                       
-          parameter(idim=10000) 
-    !                                                                       
-          common /celle/ x(0:idim),v(0:idim) 
-          common /cellc/ u(idim),rho(idim),ye(idim),q(idim),dq(idim) 
           common /numb/ ncell 
-          common /nustuff/ ynue(idim),ynueb(idim),ynux(idim),               &
-                           unue(idim),unueb(idim),unux(idim)                  
-          common /eosq / pr(idim), vsound(idim), u2(idim), vsmax 
-          common /carac/ deltam(idim), abar(idim) 
-          common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-          common /freez/ ufreez(idim) 
-          common /tempe/ temp(idim) 
-          common /cent/ dj(idim) 
-          common /abun/ ycc 
     
           double precision yccin(idim,iqn),rnorm 
-          real ycc(idim,iqn) 
     
           double precision rhocgs, tkelv, yej, abarj, ucgs, pcgs, xpj, xnj 
           double precision f3, enclmass(0:idim) 
@@ -45,7 +263,7 @@ program read
           double precision, allocatable :: vel(:),rad(:),dens(:),t9(:),     &
          &             yel(:),ab(:),omega(:),press(:)                       
           double precision maxrad, maxmass, deltam_growth, enclmass_conv_cutoff 
-          integer max,j,i,izone,ieos
+          integer max,j,i,izone,ieos,ieos_in
           integer conv_grid,pns_grid,pns_grid_goal,conv_grid_goal,grid_goal
           integer nlines, nkep, header_length, counter 
           logical initial_growth, legacy_grid, iterate_grid
@@ -70,47 +288,7 @@ program read
           max     = 0 
           maxmass = 0                                                   
     !                                                                       
-    !--read options                                                         
-    !                                                                       
-          open(521,file='setup_prep') 
-          read(521,*) 
-          read(521,522) filin 
-          read(521,*) 
-          read(521,*) 
-          read(521,522) filout 
-          read(521,*) 
-          read(521,*) 
-          read(521,*) pns_grid_goal
-          read(521,*) 
-          read(521,*)    
-          read(521,*) conv_grid_goal
-          read(521,*)
-          read(521,*)
-          read(521,*) grid_goal
-          read(521,*) 
-          read(521,*)                                      
-          read(521,*) pns_cutoff
-          read(521,*) 
-          read(521,*) 
-          read(521,*) enclmass_conv_cutoff
-          read(521,*)
-          read(521,*)
-          read(521,*) deltam_conv 
-          read(521,*)
-          read(521,*) 
-          read(521,*) deltam_growth
-          read(521,*)
-          read(521,*) 
-          read(521,*) maxrad 
-          read(521,*) 
-          read(521,*) 
-          read(521,*) ieos      
-          read(521,*) 
-          read(521,*)       
-          read(521,522) eos_table                
-
-      522 format(A) 
-
+          ieos = abs(ieos_in)
           print*,'================ Setup ================='
           print*, 'Input File:              ', trim(filin)
           print*, 'Output File:             ', trim(filout)
@@ -206,14 +384,14 @@ program read
     !                   
     !--use Swesty-Lattimer eos
     !   
-          if (ieos.eq.4) then     
+          if (ieos_in.eq.4) then     
             call nucdata   ! nucdata is in nse5.f                                       
             call loadmx () ! loadmx is in sleos.f
           endif        
     !                   
     !--load eos table
     !      
-          if (ieos.eq.5) then 
+          if (ieos_in.eq.5) then 
             call readtable(trim(eos_table))
           endif  
           
@@ -280,7 +458,8 @@ program read
           print *,'  Grid Size:           ', ncell 
           print *,'  Output file name:            ', trim(filout) 
           print *,'---------------------------------------' 
-          stop 
+          close(29)
+          return 
           END                                                                                     
 !      
           subroutine wdump 
@@ -290,30 +469,20 @@ program read
 !                                                           *           
 !************************************************************           
   !                                                                       
+          use grid, only: idim, x, v, u, rho, ye, q, dq, ynue, ynueb, &
+                          ynux, unue, unueb, unux, xp, xn, eta, ifleos, &
+                          pr, vsound, u2, vsmax, ufreez, deltam, abar, &
+                          temp, dj, ycc, steps
           implicit double precision (a-h, o-z) 
   !                                                                       
           logical from_dump 
           integer idump 
-          parameter (idim=10000) 
           parameter(iqn=17)
-          common /celle/ x(0:idim),v(0:idim) 
-          common /cellc/ u(idim),rho(idim),ye(idim),q(idim),dq(idim) 
           common /numb/ ncell 
-          common /nustuff/ ynue(idim),ynueb(idim),ynux(idim),               &
-                           unue(idim),unueb(idim),unux(idim)                  
-          common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-          common /eosq / pr(idim), vsound(idim), u2(idim), vsmax 
-          common /freez/ ufreez(idim) 
-          common /carac/ deltam(idim), abar(idim) 
-          common /tempe/ temp(idim) 
           common /cgas / gamma 
           common /times / t, dt 
           common /ener2/ tkin, tterm 
           logical te(idim), teb(idim), tx(idim) 
-          common /cent/ dj(idim) 
-          real ycc(idim,iqn) 
-          common /abun/ ycc 
-          common /timei/ steps(idim) 
           common /rshock/ shock_ind, shock_x 
           common /pns/ pns_ind, pns_x 
           common /dump/ from_dump 
@@ -409,6 +578,10 @@ program read
 ! adjacent cells to calculate the important values of my code.  *       
 !                                                               *              
 !****************************************************************                                  
+            use grid, only: idim, x, v, u, rho, ye, q, dq, ynue, ynueb, &
+                            ynux, unue, unueb, unux, pr, vsound, u2, &
+                            vsmax, deltam, abar, xp, xn, eta, ifleos, &
+                            ufreez, temp, dj, ycc
             implicit double precision (a-h, o-z) 
             !                                                                       
             parameter(utemp = 1e9) 
@@ -419,27 +592,14 @@ program read
             parameter(uergg = 1e16) 
             parameter(pi43  = 3.14159*4.0/3.0) 
             !                                                                       
-            parameter(idim=10000) 
             parameter(iqn=17)
             !                                                                       
-            common /celle/ x(0:idim),v(0:idim) 
-            common /cellc/ u(idim),rho(idim),ye(idim),q(idim),dq(idim) 
             common /numb/ ncell 
-            common /nustuff/ ynue(idim),ynueb(idim),ynux(idim),        &
-                             unue(idim),unueb(idim),unux(idim)                  
-            common /eosq / pr(idim), vsound(idim), u2(idim), vsmax 
-            common /carac/ deltam(idim), abar(idim) 
-            common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-            common /freez/ ufreez(idim) 
-            common /tempe/ temp(idim) 
-            common /cent/ dj(idim) 
-            common /abun/ ycc 
     
             dimension vel(nkep),rad(nkep),dens(nkep),t9(nkep),        &
                       yel(nkep),ab(nkep),omega(nkep),press(nkep) 
             dimension yccin(idim,iqn)
     
-            real ycc(idim,iqn) 
             double precision rhocgs, tkelv, yej, abarj, ucgs, pcgs, xpj, xnj 
             double precision enclmass(0:idim), enclmass_bisection(0:idim)                      
             double precision maxrad, maxmass
@@ -656,6 +816,10 @@ program read
 ! adjacent cells to calculate the important values of my code.  *       
 !                                                               *              
 !****************************************************************                                  
+          use grid, only: idim, x, v, u, rho, ye, q, dq, ynue, ynueb, &
+                          ynux, unue, unueb, unux, pr, vsound, u2, vsmax, &
+                          deltam, abar, xp, xn, eta, ifleos, ufreez, &
+                          temp, dj, ycc
           implicit double precision (a-h, o-z) 
           !                                                                       
           parameter(utemp = 1e9) 
@@ -666,27 +830,14 @@ program read
           parameter(uergg = 1e16) 
           parameter(pi43  = 3.14159*4.0/3.0) 
           !                                                                       
-          parameter(idim=10000) 
           parameter(iqn=17)
           !                                                                       
-          common /celle/ x(0:idim),v(0:idim) 
-          common /cellc/ u(idim),rho(idim),ye(idim),q(idim),dq(idim) 
           common /numb/ ncell 
-          common /nustuff/ ynue(idim),ynueb(idim),ynux(idim),        &
-                           unue(idim),unueb(idim),unux(idim)                  
-          common /eosq / pr(idim), vsound(idim), u2(idim), vsmax 
-          common /carac/ deltam(idim), abar(idim) 
-          common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-          common /freez/ ufreez(idim) 
-          common /tempe/ temp(idim) 
-          common /cent/ dj(idim) 
-          common /abun/ ycc 
   
           dimension vel(nkep),rad(nkep),dens(nkep),t9(nkep),        &
                     yel(nkep),ab(nkep),omega(nkep),press(nkep) 
           dimension yccin(idim,iqn)
   
-          real ycc(idim,iqn) 
           double precision rhocgs, tkelv, yej, abarj, ucgs, pcgs, xpj, xnj 
           double precision enclmass(0:idim)                       
           double precision maxrad, deltam_growth, deltam_conv, pns_growth
@@ -877,15 +1028,14 @@ program read
 !                                                        *              
 !*********************************************************  
 
+         use grid, only: idim, deltam, abar
          implicit double precision (a-h, o-z) 
 
-         parameter(idim=10000)
          parameter(iqn=17)
          dimension vel(nkep),rad(nkep),dens(nkep),t9(nkep),            &
                    yel(nkep),ab(nkep),omega(nkep),press(nkep) 
          dimension yccin(idim,iqn)
          
-         common /carac/ deltam(idim), abar(idim)
  
          double precision enclmass(0:idim)                       
          double precision maxrad, deltam_growth  
@@ -965,16 +1115,15 @@ program read
 !                                                        *              
 !*********************************************************  
 
+      use grid, only: idim, deltam, abar
       implicit double precision (a-h, o-z) 
   
-      parameter(idim=10000)
       parameter(iqn=17)
       dimension vel(nkep),rad(nkep),dens(nkep),t9(nkep),            &
       yel(nkep),ab(nkep),omega(nkep),press(nkep) 
       dimension yccin(idim,iqn)
   
       common /numb/ ncell
-      common /carac/ deltam(idim), abar(idim)
   
       double precision enclmass(0:idim)                       
       double precision maxrad, deltam_growth  
@@ -1059,9 +1208,9 @@ program read
 !*********************************************************
       use eosmodule
       
+      use grid, only: idim
       implicit double precision (a-h,o-z)
 
-      parameter(idim=10000)
       parameter(utemp=1e9) 
       parameter(udens=2e6) 
       parameter(uvel=1e8) 
@@ -7,44 +7,37 @@
 !                                                      *                
 !*******************************************************                
 !      
+      use pytorch, only: mlmodel_init, mlmodel_free
+      use dumpio, only: dump_close
+      use profiler, only: prof_init, prof_start, prof_stop, prof_dump, &
+                          p_printout
+      use grid, only: deltam, abar, u, rho, ye, q, x, v, f, pr, vsound, &
+                      u2, vsmax, etanue, etanueb, etanux, ufreez, ynue, &
+                      ynueb, ynux, unue, unueb, unux, xp, xn, eta, &
+                      ifleos, xpf, pvar2, pvar3, pvar4, temp, xmu, &
+                      trapnue, trapnueb, trapnux
       implicit double precision (a-h,o-z) 
 !                                                                       
 !--ntstep counts the number of timesteps                                
-      integer jtrape,jtrapb,jtrapx,ntstep
+      integer jtrape,jtrapb,jtrapx,ntstep,mlin_grid_size
       character*1024 mlmodel_name
-!                                                                       
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1) 
 !                                                                       
       common /bstuf/ rb, dumrb, f1rb, f2rb 
-      common /carac/ deltam(idim), abar(idim) 
       common /cases/ t9nse, rhoswe, rhonue, rhonux 
-      common /cellc/ u(idim),rho(idim),ye(idim),q(idim) 
-      common /celle/ x(0:idim),v(0:idim),f(0:idim) 
       common /cgas / gamma 
       common /const/ gg, clight, arad, bigr, xsecnn, xsecne 
       common /ener2/ tkin, tterm 
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
       common /epcap/ betafac, c2cu, c3cu 
-      common /etnus/ etanue(idim),etanueb(idim),etanux(idim) 
       common /ftrap/ ftrape,ftrapb,ftrapx 
       common /jtrap/ jtrape,jtrapb,jtrapx 
-      common /freez/ ufreez(idim) 
       common /numb / ncell, ncell1 
-      common /nustuff/ ynue(idim),ynueb(idim),ynux(idim),               &
-     &               unue(idim),unueb(idim),unux(idim)                  
       common /propt/ dtime,tmax 
       common /shock/ cq,cl 
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /swesty/ xpf(idim), pvar2(idim), pvar3(idim), pvar4(idim) 
-      common /tempe/ temp(idim) 
-      common /therm/ xmu(idim) 
       common /timej / time, dt
       common /rshock/ shock_ind, shock_x
       common /pns/ pns_ind, pns_x
 
-      logical trapnue, trapnueb, trapnux, print_endstep 
-      common /trap / trapnue(idim), trapnueb(idim), trapnux(idim) 
+      logical print_endstep
       common /typef/ iextf, ieos 
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
@@ -52,11 +45,19 @@
       common /uswest/ usltemp, uslrho, uslu, uslp, u2slu
       common /mlmod/ mlmodel_name
       common /idump/ idump
+      common /interp/ mlin_grid_size
 !                                                                       
 !--read initial condition   
 !
       call readini      
 !                                                                       
+!--load the ML model once; it stays resident for the whole run
+!                                                                       
+      if (mlmodel_name.ne.'None'.and.mlmodel_name.ne.'none'.and.        &
+          mlmodel_name.ne.'Constant'.and.mlmodel_name.ne.'constant') then
+         call mlmodel_init(trim(mlmodel_name), (/mlin_grid_size,5,1/))
+      endif
+!                                                                       
 !--define code's units                                                  
 !                                                                       
       call unit 
@@ -69,6 +70,7 @@
 !                                                                                                          
 !--ntstep is the number of timesteps                                          
       ntstep = 1 
+      call prof_init(ntstep)
           
       do while (time.lt.tmax) 
         !--idump is a counter for dump files         
@@ -81,7 +83,10 @@
 !--produce output if desired                                            
 !                                                                       
         lu=61 
+        call prof_start(p_printout)
         call printout(lu) 
+        call prof_stop(p_printout)
+        call prof_dump(57, idump, time*utime, ntstep)
         print*,' '    
         print*,'****************' 
         print*,' idump        = ', idump
@@ -92,6 +97,8 @@
       end do 
 !                                                                       
       call printout(lu) 
+      call dump_close
+      call mlmodel_free
       stop "DONE: reached the maximum time"
       END                                           
 !
@@ -140,14 +147,21 @@
 !  cell      0         1         2         3                            
 !  edge                                                                 
 !                    
+      use grid, only: idim, ebetaeq, pbetaeq, deltam, abar, dq, dunu, pr, &
+                      vsound, u2, vsmax, etanue, etanueb, etanux, ufreez, &
+                      xp, xn, eta, ifleos, xpf, pvar2, pvar3, pvar4, &
+                      temp, xmu, trapnue, trapnueb, trapnux, pr_turb, &
+                      output_preserve
+      use profiler, only: prof_start, prof_stop, p_hydro, p_density, &
+                          p_eos, p_gravity, p_nuinit, p_nuemit, p_nusphere, &
+                          p_nuabsorb, p_artvis, p_turbpres, p_forces, &
+                          p_nudiff, p_energ, p_nuwork
       implicit double precision (a-h,o-z) 
 !                                                                       
       integer jtrape,jtrapb,jtrapx, mlin_grid_size
       character*1024 mlmodel_name
       logical add_pturb, first_bounce, track_shock
 
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1) 
       parameter (tiny=-1e-5) 
       parameter (iqn = 17)
 !                                                                       
@@ -160,26 +174,14 @@
       dimension dynue(idim),dynueb(idim),dynux(idim) 
       dimension dunue(idim),dunueb(idim),dunux(idim) 
 !                                                                       
-      logical ebetaeq, pbetaeq 
-      common /beta/ ebetaeq(idim), pbetaeq(idim) 
       common /bstuf/ rb, dumrb, f1rb, f2rb 
-      common /carac/ deltam(idim), abar(idim) 
       common /const/ gg, clight, arad, bigr, xsecnn, xsecne 
-      common /ener1/ dq(idim), dunu(idim) 
       common /ener2/ tkin, tterm 
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
       common /epcap/ betafac, c2cu, c3cu 
-      common /etnus/ etanue(idim),etanueb(idim),etanux(idim) 
-      common /freez/ ufreez(idim) 
       common /ftrap/ ftrape,ftrapb,ftrapx 
       common /jtrap/ jtrape,jtrapb,jtrapx 
       common /shock/ cq,cl 
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /swesty/ xpf(idim), pvar2(idim), pvar3(idim), pvar4(idim) 
-      common /tempe/ temp(idim) 
-      common /therm/ xmu(idim) 
-      logical trapnue, trapnueb, trapnux, print_endstep 
-      common /trap / trapnue(idim), trapnueb(idim), trapnux(idim) 
+      logical print_endstep
       common /typef/ iextf, ieos 
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
@@ -191,7 +193,6 @@
       common /bnc/ rlumnue_max, bounce_ntstep, bounce_time, &
                    add_pturb, first_bounce, track_shock
       common /interp/ mlin_grid_size
-      common /mlout/ pr_turb(idim1), output_preserve(idim) 
 !      common /nuout/ rlumnue, rlumnueb, rlumnux,                       
 !     1               enue, enueb, enux, e2nue, e2nueb, e2nux           
 !
@@ -209,7 +210,10 @@
 !--compute density                                                      
 ! ---------------------------------------------------------             
 !     
+      call prof_start(p_hydro)
+      call prof_start(p_density)
       call density(ncell,x,rho) 
+      call prof_stop(p_density)
 !                                                                       
 !--compute thermodynamical properties                                   
 !  ----------------------------------                                   
@@ -217,15 +221,19 @@
 !  ieos=3 or 4 calls for the Swesty-Lattimer EOS above rhoswe
 !  ieos=5 or 6 calls SFHo Tables EOS 
 !       
+      call prof_start(p_eos)
       if(ieos.eq.1)call eospg(ncell,rho,u) 
       if(ieos.eq.2)call eospgr(ncell,rho,u) 
       if(ieos.eq.3.or.ieos.eq.4)call eos3(ncell,rho,u,ye) 
       if(ieos.eq.5)call eos5(ncell,rho,u,ye)
+      call prof_stop(p_eos)
 !                                                                       
 !--do gravity                                                           
 !  --------------------------------------------------------             
 !              
+      call prof_start(p_gravity)
       call gravity(ncell,deltam,x,f)
+      call prof_stop(p_gravity)
 !                                                                       
 !--neutrino physics                                                     
 !  ---------------- 
@@ -255,6 +263,7 @@
 !--skip neutrino physics                                                
 !      goto 90                                                          
 !     
+      call prof_start(p_nuinit)
       call nuinit(ncell,rho,x,ye,dye,                                   &
                   ynue,ynueb,ynux,dynue,dynueb,dynux,                   &
                   unue,unueb,unux,dunue,dunueb,dunux) 
@@ -262,18 +271,18 @@
 !-- nu contribution to pressure                                         
 !             
       call nupress(ncell,rho,unue,unueb,unux)
+      call prof_stop(p_nuinit)
 !                                                                       
-!--e+/e- capture                                                        
+!--e+/e- capture and plasma/pair neutrino emission processes            
 !                
-      call nuecap(ncell,rho,ye,dye,dynue,dynueb,dunue,dunueb)
-!                                                                       
-!--plasma/pair neutrino emission processes                              
-!               
-      call nupp(ncell,rho,ye,dynue,dynueb,dynux,                        &
-                dunue,dunueb,dunux)
+      call prof_start(p_nuemit)
+      call nuemit(ncell,rho,ye,dye,dynue,dynueb,dynux,                  &
+                  dunue,dunueb,dunux)
+      call prof_stop(p_nuemit)
 !                                                                       
 !--neutrino/anti neutrino conversion                                    
 !               
+      call prof_start(p_nusphere)
       call nuconv(ncell,x,rho,ynue,ynueb,ynux,                          &
                   dynue,dynueb,dynux,dunue,dunueb,dunux)
 !                                                                       
@@ -293,21 +302,15 @@
 !--and normalize energy sums                                            
 !            
       call nulum(ntstep,print_endstep) 
+      call prof_stop(p_nusphere)
 !                                                                       
-!--neutrino absorption                                                  
+!--neutrino absorption, neutrino/electron scattering                    
+!--and the beta equilibrium cases                                       
 !  
-      call nuabs(ncell,rho,x,dye,ynue,ynueb,                            &
-                 dynue,dynueb,dunue,dunueb)
-!                                                                       
-!--neutrino/electron scattering                                         
-!  
-      call nuscat(ncell,rho,x,ynue,ynueb,ynux,                          &
-                  dunue,dunueb,dunux)  
-!                                                                       
-!--do the beta equilibrium cases                                        
-!      
-      call nubeta(ncell,x,rho,ye,dye,ynue,ynueb,unue,unueb,             &
-                  dynue,dynueb,dunue,dunueb)
+      call prof_start(p_nuabsorb)
+      call nuabsorb(ncell,rho,x,ye,dye,ynue,ynueb,ynux,                 &
+                    unue,unueb,dynue,dynueb,dunue,dunueb,dunux)
+      call prof_stop(p_nuabsorb)
 !                                                                       
    90 continue 
 !                                                                       
@@ -317,7 +320,9 @@
 !                                                                       
 !--compute q values                                                     
 !         
+      call prof_start(p_artvis)
       call artvis(ncell,x,rho,v,q)
+      call prof_stop(p_artvis)
 !     
       if (first_bounce.eqv..true.) then
         !--calculate PNS, only in post-bounce stage        
@@ -338,7 +343,9 @@
         elseif (mlmodel_name=='Constant'.or.mlmodel_name=='constant') then
             call turbpress_constant(ncell,v,vsound,pr,rho,x) 
         else
+            call prof_start(p_turbpres)
             call turbpress(ncell,rho,x,v,temp,u,ntstep,print_endstep)
+            call prof_stop(p_turbpres)
         endif
       else
           !--check if: 
@@ -349,23 +356,32 @@
       endif
 !
 !--compute forces on the particles  
+      call prof_start(p_forces)
       call forces(ncell,x,f,q,v,rho)
+      call prof_stop(p_forces)
 !                                                                       
 !--flux limited diffusion                                               
 !--skip neutrino 
+      call prof_start(p_nudiff)
       call nudiff(ncell,x,rho,time,ye,                                  &
                   ynue,ynueb,ynux,dynue,dynueb,dynux,                   &
                   dunue,dunueb,dunux)
+      call prof_stop(p_nudiff)
 !                                                                       
 !--compute energy derivative                                            
 !        
+      call prof_start(p_energ)
       call energ(ncell,x,v,dye,du,rho)
+      call prof_stop(p_energ)
 !                                                                       
 !--compute neutrino pressure work and change of <E>s                    
 !                                                                       
 !--skip neutrino 
+      call prof_start(p_nuwork)
       call nuwork(ncell,x,v,rho,                                        &
                   unue,unueb,unux,dunue,dunueb,dunux)
+      call prof_stop(p_nuwork)
+      call prof_stop(p_hydro)
 !                         
    99 return    
       END                                           
@@ -381,6 +397,9 @@
 ! adjacent cells to calculate the important values.             *       
 !                                                               *              
 !****************************************************************                                  
+      use grid, only: idim, temp, deltam, abar, ycc, yccave, pr, vsound, &
+                      u2, vsmax, xp, xn, eta, ifleos, etanue, etanueb, &
+                      etanux
       implicit double precision (a-h, o-z) 
       !                   
       !                                                                       
@@ -388,8 +407,6 @@
 
       !parameter(uvel  = 1e8)  
       parameter (pi43  = 3.14159*4.0/3.0)                                                                    
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1)
       parameter (iqn = 17)
 
       dimension x(0:idim), v(0:idim), f(0:idim) 
@@ -400,14 +417,8 @@
       dimension dynue(idim),dynueb(idim),dynux(idim) 
       dimension dunue(idim),dunueb(idim),dunux(idim) 
 
-      real             :: ycc, uccave
+      real :: uccave
     
-      common /tempe/ temp(idim)
-      common /carac/ deltam(idim), abar(idim)
-      common /cc   / ycc(idim,iqn), yccave(iqn)
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim)
-      common /etnus/ etanue(idim),etanueb(idim),etanux(idim)
       common /rshock/ shock_ind, shock_x
       common /units/ umass, udist, udens, utime, uergg, uergcc
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg
@@ -777,49 +788,50 @@
 !
       use pytorch
       use data_functions
+      use profiler, only: prof_start, prof_stop, p_mlmodel
+      use grid, only: idim, idim1, trapnue, trapnueb, trapnux, etanue, &
+                      etanueb, etanux, prnu, pr, vsound, u2, vsmax, &
+                      pr_turb, output_preserve
       implicit double precision (a-h,o-z) 
 !          
       character*1024 :: mlmodel_name
       integer mlin_grid_size
       real scale_pr, scale_pr_relative
-      double precision pr_turb,output_preserve
 !
-      parameter(idim=10000) 
-      parameter(idim1=idim+1) 
       parameter (avokb=6.02e23*1.381e-16)
 !                                                                       
       dimension rho(idim), temp(idim), u(idim)
       dimension x(0:idim), v(0:idim)
       dimension unue(idim),unueb(idim),unux(idim)       
 !                                                                       
-      logical trapnue, trapnueb, trapnux 
       
-      common /trap/ trapnue(idim),trapnueb(idim),trapnux(idim) 
-      common /etnus/ etanue(idim),etanueb(idim),etanux(idim) 
-      common /eosnu/ prnu(idim1) 
       common /units/ umass, udist, udens, utime, uergg, uergcc
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg
       common /mlmod/ mlmodel_name               
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
       common /rshock/ shock_ind, shock_x
       common /pns/ pns_ind, pns_x
       common /nuprint/ nups,nupk,tacr       
       common /interp/ mlin_grid_size
-      common /mlout/ pr_turb(idim1), output_preserve(idim)
                                     
       ! The tensor shape is exactly backwards from python: (Length,Channels,N batches)
-      real(real32)              :: input(mlin_grid_size, 5, 1)
-      real(real32), allocatable :: output_h(:,:,:)    
+      ! and the input is filled directly into ml_input(mlin_grid_size, 5, 1)
       double precision          :: pr_relative(idim1)
       double precision          :: interp_x(mlin_grid_size)
-      logical                   :: print_endstep   
-      integer                   :: shock_offset   
+      logical                   :: print_endstep, infer
+      integer                   :: shock_offset, ipns, nout
+      integer, save             :: ml_last_step = 0
+      logical, save             :: ml_inferred  = .false.
+      integer                   :: in_ind(2,mlin_grid_size)
+      double precision          :: in_w(4,mlin_grid_size)
+      integer,          allocatable :: out_ind(:,:)
+      double precision, allocatable :: out_w(:,:)
       
       !--entropy conversion factor                                            
       sfac=avokb*utemp/uergg
 
       !--don't inject right below the shock
       shock_offset = int(shock_ind)-2
+      ipns         = int(pns_ind)
             
       ! Scale Pressure to fit into single precission (taken from ML training)
       scale_v           = udist/utime*1e-8
@@ -839,32 +851,57 @@
       !   scale_entropy     = 1./sfac
       !   scale_pr_relative = 1.
 
-      ! only inference once every # timesteps
-      if (mod(ntstep,5).eq.0) then
+      ! Inference cadence: every ml_max_stale timesteps, or, if ml_tolerance > 0,
+      ! whenever the inputs changed by more than ml_tolerance since the last
+      ! inference (and at least every ml_max_stale timesteps)
+      if (ml_tolerance.gt.0.d0 .or. mod(ntstep,ml_max_stale).eq.0) then
         if (print_endstep.eqv..false.) then
 
-            !   input(:,1,1) = interpolate(x(1:),v(1:),ncell,int(pns_ind),shock_offset,mlin_grid_size) *  scale_v
-            input(:,1,1) = interpolate(x(1:),rho,ncell,int(pns_ind),shock_offset,mlin_grid_size) *        scale_rho
-            input(:,2,1) = interpolate(x(1:),pr(1:),ncell,int(pns_ind),shock_offset,mlin_grid_size) *     scale_pr
-            input(:,3,1) = interpolate(x(1:),vsound(1:),ncell,int(pns_ind),shock_offset,mlin_grid_size) * scale_vsound      
-            input(:,4,1) = interpolate(x(1:),temp,ncell,int(pns_ind),shock_offset,mlin_grid_size) *       scale_temp
-            input(:,5,1) = interpolate(x(1:),u,ncell,int(pns_ind),shock_offset,mlin_grid_size) *          scale_entropy
+            if (.not.model_loaded) then
+               call mlmodel_init(trim(mlmodel_name), (/mlin_grid_size,5,1/))
+            endif
+
+            ! brackets and weights over the PNS-shock range are found once
+            ! and shared by all input fields
+            if (shock_offset.gt.ipns) then
+               call resample_weights(x(ipns:shock_offset), shock_offset-ipns+1, &
+                                     mlin_grid_size, in_ind, in_w)
+
+            !  ml_input(:,1,1) = resample(v(ipns:shock_offset),in_ind,in_w) *      scale_v
+               ml_input(:,1,1) = resample(rho(ipns:shock_offset),in_ind,in_w) *    scale_rho
+               ml_input(:,2,1) = resample(pr(ipns:shock_offset),in_ind,in_w) *     scale_pr
+               ml_input(:,3,1) = resample(vsound(ipns:shock_offset),in_ind,in_w) * scale_vsound
+               ml_input(:,4,1) = resample(temp(ipns:shock_offset),in_ind,in_w) *   scale_temp
+               ml_input(:,5,1) = resample(u(ipns:shock_offset),in_ind,in_w) *      scale_entropy
+            endif
             
         !   948 format(A, 1pe12.4, 1pe12.4)
-        !       write(*,948), 'range rho    ', minval(input(:,1,1)), maxval(input(:,1,1))
-        !       write(*,948), 'range P      ', minval(input(:,2,1)), maxval(input(:,2,1))
-        !       write(*,948), 'range vsound ', minval(input(:,3,1)), maxval(abs(input(:,3,1)))      
-        !       write(*,948), 'range T      ', minval(input(:,4,1)), maxval(input(:,4,1))
-        !       write(*,948), 'range entropy', minval(input(:,5,1)), maxval(input(:,5,1))
+        !       write(*,948), 'range rho    ', minval(ml_input(:,1,1)), maxval(ml_input(:,1,1))
+        !       write(*,948), 'range P      ', minval(ml_input(:,2,1)), maxval(ml_input(:,2,1))
+        !       write(*,948), 'range vsound ', minval(ml_input(:,3,1)), maxval(abs(ml_input(:,3,1)))      
+        !       write(*,948), 'range T      ', minval(ml_input(:,4,1)), maxval(ml_input(:,4,1))
+        !       write(*,948), 'range entropy', minval(ml_input(:,5,1)), maxval(ml_input(:,5,1))
             
             ! ML model (reverse the order for fortran data)
             ! Input: ['rho','Pgas', 'vsound', 'T', 'entropy'] (1, 5, 200)
             ! Output: [pr_relative = P_turb/P_gas] (1, 1, 200)
 
-            output_h = mlmodel(input, trim(mlmodel_name))   
-            
-            output_preserve(:) = 0
-            output_preserve(:mlin_grid_size) = output_h(:,1,1)
+            ! without a PNS-shock range the inputs were not refreshed
+            infer = shock_offset.gt.ipns
+            if (infer.and.ml_inferred.and.ml_tolerance.gt.0.d0) then
+               infer = ntstep-ml_last_step.ge.ml_max_stale .or.           &
+                       ml_input_change().gt.ml_tolerance
+            endif
+
+            ! the prediction is written straight into output_preserve
+            if (infer) then
+               output_preserve(mlin_grid_size+1:) = 0
+               call prof_start(p_mlmodel)
+               call mlmodel_run(output_preserve(:mlin_grid_size))
+               call prof_stop(p_mlmodel)
+               ml_last_step = ntstep
+               ml_inferred  = .true.
+            endif
         endif
       endif
 
@@ -872,22 +909,29 @@
       pr_turb(:)     = 0.   
       pr_relative(:) = 0.
 
-      if (.not.allocated(output_h)) allocate(output_h(mlin_grid_size,1,1))
-      output_h(:,1,1) = output_preserve(:mlin_grid_size)      
-      
-      interp_x        = linspace(x(int(pns_ind)), x(int(shock_offset)), mlin_grid_size)   
-      pr_relative(int(pns_ind):shock_offset) = interpolate(DBLE(interp_x),DBLE(output_h(:,1,1)),            &
-                                                           mlin_grid_size,1,mlin_grid_size,                 &
-                                                           int(shock_offset-int(pns_ind)+1))      
+      if (shock_offset.ge.ipns) then
+         nout = shock_offset-ipns+1
+         allocate(out_ind(2,nout), out_w(4,nout))
+         interp_x = linspace(x(ipns), x(shock_offset), mlin_grid_size)
+         call resample_weights(interp_x, mlin_grid_size, nout, out_ind, out_w)
+         pr_relative(ipns:shock_offset) = resample(output_preserve(:mlin_grid_size),out_ind,out_w)
+         deallocate(out_ind, out_w)
+      endif
       pr_relative = scale_pr_relative*pr_relative                                                           
       pr_turb     = pr_relative*pr
 
       
 511   format(A,1p,I5,A,E10.3)
+512   format(A,1p,E10.3,A,E10.3)
       if (mod(ntstep,nups).eq.0) then        
         if (print_endstep .eqv. .true.) then    
             write(*,511)'[ max(ML predict)(i,#) ]', maxloc(pr_relative),     & 
             '                    ',  maxval(pr_relative)
+            if (ml_calls.gt.0) then
+               write(*,512)'[ ML inference (ms): last ]', ml_time_last*1.d3, &
+               '    mean ', ml_time/ml_calls*1.d3
+               write(*,512)'[ ML calls per timestep   ]', ml_calls/dble(ntstep)
+            endif
         end if 
       endif
         
@@ -905,17 +949,13 @@
 !                                                        *               
 !*********************************************************                
 !
+      use grid, only: idim, idim1, pr_turb, output_preserve
       implicit double precision (a-h,o-z) 
 !          
-      double precision pr_turb
-!
-      parameter(idim=10000) 
-      parameter(idim1 = idim+1) 
 !                                   
       common /units/ umass, udist, udens, utime, uergg, uergcc                                                                                                                 
       common /rshock/ shock_ind, shock_x
       common /pns/ pns_ind, pns_x       
-      common /mlout/ pr_turb(idim1), output_preserve(idim)
       common /cpturb/ constant_pturb
                                           
       dimension v(0:ncell),vsound(0:ncell),mach(0:ncell-1)      
@@ -1051,9 +1091,9 @@
 !                                                          *
 !***********************************************************
 !            
+      use grid, only: idim, deltam, abar
       implicit double precision (a-h,o-z) 
           
-      parameter (idim=10000)   
       dimension rho(idim)
 
       logical :: add_pturb, first_bounce, track_shock
@@ -1063,7 +1103,6 @@
                    add_pturb, first_bounce, track_shock
       common /timej / time, dt! 
       common /units/ umass, udist, udens, utime, uergg, uergcc
-      common /carac/ deltam(idim), abar(idim)
       common /numb / ncell, ncell1 
       common /pns/ pns_ind, pns_x
 
@@ -1095,23 +1134,21 @@
 !                                                          *            
 !***********************************************************            
 !                                                                       
+      use grid, only: idim, dq, dunu, pr, vsound, u2, vsmax, deltam, &
+                      abar
       implicit double precision (a-h,o-z) 
-!                                                                       
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1) 
 !                                                                       
       dimension x(0:idim),v(0:idim) 
       dimension rho(idim),q(idim) 
 !                                                                       
-      common /ener1/ dq(idim), dunu(idim) 
       common /shock/ cq,cl 
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
-      common /carac/ deltam(idim), abar(idim) 
 !                                                                       
       data pi4/12.56637d0/ 
 !                                                                       
 !--update q value                                                       
 !                                                                       
+!$omp parallel do schedule(static)                                     &
+!$omp private(k,k1,akp1,ak,akp05,gradv,dv,alpha,cs,alphal)
       do kp05=1,ncell 
          k        = kp05 - 1 
          k1       = kp05 
@@ -1138,6 +1175,7 @@
          end if 
          dq(kp05) =-q(kp05)*gradv/deltam(kp05) 
       enddo 
+!$omp end parallel do
 !                                                                       
       return 
       END                                           
@@ -1181,24 +1219,24 @@
 !                                                               *       
 !****************************************************************       
 !                                                                       
+      use grid, only: idim, deltam, abar
       implicit double precision (a-h,o-z) 
-!                                                                       
-      parameter (idim=10000) 
 !                                                                       
       dimension x(0:idim),rho(idim) 
-      common /carac/ deltam(idim), abar(idim) 
 !                                                                       
       data pi4/12.566371/ 
       integer :: i
 !                                                                       
 !--update density                                                       
 !                                                                       
+!$omp parallel do schedule(static) private(k,k1)
       do kp05=1,ncell 
          k1 = kp05 
          k  = kp05 - 1 
          rho(kp05) = 3.d0*deltam(kp05)/                                   &
                      (pi4*(x(k1)*x(k1)*x(k1)-x(k)*x(k)*x(k)))            
       enddo
+!$omp end parallel do
       
       return 
       END                                           
@@ -1210,26 +1248,19 @@
 !                                                           *           
 !************************************************************           
 !                                                                       
+      use grid, only: idim, ebetaeq, pbetaeq, temp, xp, xn, eta, ifleos, &
+                      xmue, xmuhat, pr, vsound, u2, vsmax, dq, dunu, &
+                      deltam, abar
       implicit double precision (a-h,o-z) 
 !                                                                       
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1) 
       parameter (avokb=6.02e23*1.381e-16) 
 !                                                                       
       dimension x(0:idim),v(0:idim) 
       dimension du(idim), dye(idim), rho(idim) 
 !                                                                       
-      logical ebetaeq, pbetaeq 
-      common /beta/ ebetaeq(idim), pbetaeq(idim) 
-      common /tempe/ temp(idim) 
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
       common /typef/ iextf, ieos 
-      common /cpots/ xmue(idim), xmuhat(idim) 
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
-      common /ener1/ dq(idim), dunu(idim) 
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
-      common /carac/ deltam(idim), abar(idim) 
       !common /turb/ vturb2(idim),dmix(idim),alpha(4),bvf(idim) 
 !                                                                       
       data pi4/12.566371/ 
@@ -1239,6 +1270,7 @@
 !--entropy conversion factor                                            
       sfac=avokb*utemp/uergg 
 !                                                                       
+!$omp parallel do schedule(static) private(k,k1,akp1,akp,pdv,xp05,xp15,dubef)
       do kp05=1,ncell 
          k    = kp05-1 
          k1   = kp05 
@@ -1306,6 +1338,7 @@
             endif 
          endif 
       enddo 
+!$omp end parallel do
 !                                                                       
       return 
       END                                           
@@ -1322,14 +1355,14 @@
 !                                                                       
 !**************************************************************         
 !                                                                       
+      use grid, only: idim, ycc, yccave, x, v, f, deltam, abar, xp, xn, &
+                      eta, ifleos, xmue, xmuhat, ufreez, dq, dunu, pr, &
+                      vsound, u2, vsmax, temp, xpf, pvar2, pvar3, pvar4
       implicit double precision (a-h,o-z) 
 !                                                                       
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1) 
       parameter (iqn=17) 
       parameter (avokb=6.02e23*1.381e-16) 
 !                                                                                     
-      real ycc,yccave       
       double precision umass 
       double precision rhok, dens, tempk, yek, xpk, xnk, xak, xhk, yehk 
       double precision zbark, abark, abar2, ubind, dubind 
@@ -1342,21 +1375,11 @@
       dimension dye(idim), du(idim) 
 !                                                                       
       common /ceos / amas(iqn), znum(iqn) 
-      common /cc   / ycc(idim,iqn), yccave(iqn) 
-      common /celle/ x(0:idim),v(0:idim),f(0:idim) 
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
       common /const/ gg, clight, arad, bigr, xsecnn, xsecne 
-      common /carac/ deltam(idim), abar(idim) 
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /cpots/ xmue(idim), xmuhat(idim) 
-      common /freez/ ufreez(idim) 
-      common /ener1/ dq(idim), dunu(idim) 
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
-      common /tempe/ temp(idim) 
       common /cases/ t9nse, rhoswe, rhonue, rhonux 
       common/uocean/ uopr, uotemp, uorho1, uotemp1, uou1 
-      common /swesty/ xpf(idim), pvar2(idim), pvar3(idim), pvar4(idim) 
       common/uswest/ usltemp, uslrho, uslu, uslp, u2slu 
       common /typef/ iextf, ieos 
 !
@@ -1518,18 +1541,12 @@
 !                                                           *           
 !************************************************************           
 !                                                                       
+      use grid, only: idim, pr, vsound, u2, vsmax, xold, vold, rhold, &
+                      prold, tempold, yeold, xnold, xpold, deltam, abar
       implicit double precision (a-h,o-z) 
-!                                                                       
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1) 
 !                                                                       
       dimension rho(idim), u(idim) 
 !                                                                       
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
-      common /prev/ xold(0:idim),vold(0:idim),rhold(idim),              &
-     &              prold(idim), tempold(idim), yeold(idim),            &
-     &              xnold(idim), xpold(idim)                            
-      common /carac/ deltam(idim), abar(idim) 
       common /cgas / gamma 
 !                                                                       
 !--initialize quantities                                                
@@ -1571,21 +1588,14 @@
 !                                                           *           
 !************************************************************           
 !                                                                       
+      use grid, only: idim, xold, vold, rhold, prold, tempold, yeold, &
+                      xnold, xpold, pr, vsound, u2, vsmax, deltam, abar, &
+                      temp, xmu
       implicit double precision (a-h,o-z) 
-!                                                                       
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1) 
 !                                                                       
       dimension rho(idim), u(idim) 
 !                                                                       
       double precision umass 
-      common /prev/ xold(0:idim),vold(0:idim),rhold(idim),              &
-     &              prold(idim), tempold(idim), yeold(idim),            &
-     &              xnold(idim), xpold(idim)                            
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
-      common /carac/ deltam(idim), abar(idim) 
-      common /tempe/ temp(idim) 
-      common /therm/ xmu(idim) 
       common /cgas / gamma 
       common /const/ gg, clight, arad, bigr, xsecnn, xsecne 
       common /units/ umass, udist, udens, utime, uergg, uergcc 
@@ -1636,10 +1646,12 @@
 !                                                                       
 !************************************************************           
 !                                                                       
+      use grid, only: idim, xold, vold, rhold, prold, tempold, yeold, &
+                      xnold, xpold, pr, vsound, u2, vsmax, prnu, deltam, &
+                      abar, temp, xmu, xp, xn, eta, ifleos, xpf, pvar2, &
+                      pvar3, pvar4, xmue, xmuhat, xalpha, xheavy, yeh, &
+                      ifign
       implicit double precision (a-h,o-z) 
-!                                                                       
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1) 
 !                                                                       
       double precision umass 
       double precision rhok, uk, tempk, yek, ptot, cs, etak,            &
@@ -1648,25 +1660,11 @@
 !                                                                       
       dimension rho(idim), u(idim), ye(idim) 
 !                                                                       
-      common /prev/ xold(0:idim),vold(0:idim),rhold(idim),              &
-     &              prold(idim), tempold(idim), yeold(idim),            &
-     &              xnold(idim), xpold(idim)                            
       common /cases/ t9nse, rhoswe, rhonue, rhonux 
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
-      common /eosnu/ prnu(idim1) 
-      common /carac/ deltam(idim), abar(idim) 
-      common /tempe/ temp(idim) 
-      common /therm/ xmu(idim) 
-      common /state/ xp(idim),xn(idim),eta(idim),ifleos(idim) 
-      common /swesty/ xpf(idim), pvar2(idim), pvar3(idim), pvar4(idim) 
-      common /cpots/ xmue(idim), xmuhat(idim) 
-      common /hnucl/ xalpha(idim),xheavy(idim), yeh(idim) 
       common /cgas / gamma 
       common /const/ gg, clight, arad, bigr, xsecnn, xsecne 
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
-      logical ifign 
-      common /ign  / ifign(idim) 
 !                                                                       
       tempmx =-1e20 
       tempmn = 1e20 
@@ -1782,7 +1780,7 @@
       END                                           
 !          
       
-      subroutine eos5(ncell,rho,u,ye_table) 
+      recursive subroutine eos5(ncell,rho,u,ye_table) 
 !*************************************************************          
 !                                                                       
 !     compute pressures and temperatures with the                       
@@ -1791,10 +1789,14 @@
 !************************************************************           
 !                                         
         use eosmodule, clight_eos => clight                           
+!$      use omp_lib
+        use grid, only: idim, xold, vold, rhold, prold, tempold, yeold, &
+                        xnold, xpold, pr, vsound, u2, vsmax, prnu, &
+                        deltam, abar, temp, xmu, xp, xn, eta, ifleos, &
+                        xpf, pvar2, pvar3, pvar4, xmue, xmuhat, xalpha, &
+                        xheavy, yeh, ifign
         implicit double precision (a-h,o-z) 
 !                                                                       
-        parameter (idim=10000) 
-        parameter (idim1 = idim+1)
         parameter (avokb = 6.02e23*1.381e-16)                            
     
         real*8 xrho,xye,xtemp,xtemp2
@@ -1803,6 +1805,19 @@
         real*8 xabar,xzbar,xmu_e,xmu_n,xmu_p,xmuhat_table
         real*8 xxa,xxh,xxn,xxp 
         integer keytemp,keyerr
+        integer(8) count0,count1,count_rate
+        integer nrhomin,ntempmin,nentmin,krhomin,ktempmin,kentmin
+        integer kyeneg,krhomax,kyemin
+        integer eos_calls,eos_threads
+        integer niters,nfirst,nbisect
+        integer stat,ndiff
+        character(len=16) env
+        logical eos_check,eos_check_set,eos_checking
+        double precision, allocatable :: chk_u(:), chk_u2(:), chk_temp(:),   &
+                         chk_pr(:), ref_pr(:), ref_temp(:), chk_lr(:),       &
+                         chk_lt(:), chk_y(:), chk_v(:), chk_d(:,:)
+        save eos_check,eos_check_set,eos_checking
+        data eos_check/.false./, eos_check_set/.false./, eos_checking/.false./
 !                                                                       
         double precision umass 
         double precision rhok, uk, tempk, yek, ptot, cs, etak,            &
@@ -1811,26 +1826,14 @@
 !                                                                       
         dimension rho(idim), u(idim), ye_table(idim) 
 !                                                                       
-        common /prev/ xold(0:idim),vold(0:idim),rhold(idim),              &
-        &              prold(idim), tempold(idim), yeold(idim),            &
-        &              xnold(idim), xpold(idim)                            
         common /cases/ t9nse, rhoswe, rhonue, rhonux 
-        common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
-        common /eosnu/ prnu(idim1) 
-        common /carac/ deltam(idim), abar(idim) 
-        common /tempe/ temp(idim) 
-        common /therm/ xmu(idim) 
-        common /state/ xp(idim),xn(idim),eta(idim),ifleos(idim) 
-        common /swesty/ xpf(idim), pvar2(idim), pvar3(idim), pvar4(idim) 
-        common /cpots/ xmue(idim), xmuhat(idim) 
-        common /hnucl/ xalpha(idim),xheavy(idim), yeh(idim) 
         common /cgas / gamma 
         common /typef/ iextf, ieos
         common /const/ gg, clight, arad, bigr, xsecnn, xsecne 
         common /units/ umass, udist, udens, utime, uergg, uergcc 
         common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
-        logical ifign 
-        common /ign  / ifign(idim) 
+        common /eostim/ eos_time, eos_time_last, eos_calls, eos_threads, &
+                        eos_cells, eos_iters, eos_first, eos_bisect
 
         data ggcgs/6.67e-8/, avo/6.02e23/ 
         data aradcgs /7.565e-15/, boltzk/1.381e-16/ 
@@ -1852,9 +1855,72 @@
         sfac = avokb*utemp/uergg
 
         ifign(:) = .false.  
-        
-        276 format(A,I4,1p,20(E10.3))            
-                    
+
+        call nuc_eos_cache_init(ncell)
+!
+!--with OpenMP and COLLAPSO_EOS_CHECK=1, every sweep is first done on
+!--one thread from the same state and warm-start cache; the threaded
+!--pr and temp have to be identical to it
+!
+        if (.not.eos_check_set) then
+            eos_check_set = .true.
+!$          call get_environment_variable('COLLAPSO_EOS_CHECK', env, status=stat)
+!$          eos_check = stat.eq.0 .and. trim(env).ne.'0'
+!$          if (eos_check) print*, 'eos5: checking the threaded sweeps against serial ones'
+        endif
+        if (eos_check.and..not.eos_checking) then
+            chk_u    = u(1:ncell)
+            chk_u2   = u2(1:ncell)
+            chk_temp = temp(1:ncell)
+            chk_pr   = pr(1:ncell)
+            chk_lr   = cache_lr
+            chk_lt   = cache_lt
+            chk_y    = cache_y
+            chk_v    = cache_v
+            chk_d    = cache_d
+
+            eos_checking = .true.
+            call eos5(ncell,rho,u,ye_table)
+            eos_checking = .false.
+            ref_pr   = pr(1:ncell)
+            ref_temp = temp(1:ncell)
+
+            u(1:ncell)    = chk_u
+            u2(1:ncell)   = chk_u2
+            temp(1:ncell) = chk_temp
+            pr(1:ncell)   = chk_pr
+            cache_lr      = chk_lr
+            cache_lt      = chk_lt
+            cache_y       = chk_y
+            cache_v       = chk_v
+            cache_d       = chk_d
+        endif
+
+        call system_clock(count0, count_rate)
+!
+!--the cells are independent: with OpenMP (make OPENMP=1) they are
+!--split between the threads. Clamps and errors are only counted in
+!--the loop, and reported (or stopped on) for the first cell after it
+!
+        nrhomin  = 0
+        ntempmin = 0
+        nentmin  = 0
+        krhomin  = idim+1
+        ktempmin = idim+1
+        kentmin  = idim+1
+        kyeneg   = idim+1
+        krhomax  = idim+1
+        kyemin   = idim+1
+        niters   = 0
+        nfirst   = 0
+        nbisect  = 0
+
+!$omp parallel do schedule(static) default(shared) if(.not.eos_checking)     &
+!$omp private(xrho,xenr,xent,xtemp,xye,xprs,xcs2,xdedt,xdpderho,xdpdrhoe,    &
+!$omp         xxa,xxh,xxn,xxp,xabar,xzbar,xmu_e,xmu_n,xmu_p,xmuhat_table,    &
+!$omp         keyerr)                                                        &
+!$omp reduction(+:nrhomin,ntempmin,nentmin,niters,nfirst,nbisect)            &
+!$omp reduction(min:krhomin,ktempmin,kentmin,kyeneg,krhomax,kyemin)
         do k=1,ncell                 
             xrho  = rho(k)*udens
             xenr  = u2(k)*uergg
@@ -1864,61 +1930,119 @@
          
             ! set upper and lower bounds based on SFHo table limits
             if (xye  .gt.eos_yemax)  then
-!                if (xye.gt.1.0) print*, 'xye hit max', k, xye
                 xye   = eos_yemax
             endif
             if (xrho .lt.eos_rhomin)  then
-                print*, 'xrho hit min', k, xrho
+                nrhomin = nrhomin+1
+                krhomin = min(krhomin,k)
                 xrho  = eos_rhomin
             endif
             if (xtemp.lt.eos_tempmin) then
-                print*, 'xtemp hit min', k, xtemp
+                ntempmin = ntempmin+1
+                ktempmin = min(ktempmin,k)
                 xtemp = eos_tempmin
             endif   
             if (xent .lt.0.000131) then
-                print*, 'xent hit min', k, xent
+                nentmin = nentmin+1
+                kentmin = min(kentmin,k)
                 xent  = 0.000131  
             endif
 
+            ! outside of the table: the run is stopped after the loop
             if (xye.lt.0.) then 
-                print *,'k,yek',k,xye 
-                stop "ERROR: xye < 0"
+                kyeneg  = min(kyeneg,k)
+                cycle
             endif                  
+            if (xrho.gt.eos_rhomax) then
+                krhomax = min(krhomax,k)
+                cycle
+            endif
+            if (xye.lt.eos_yemin) then
+                kyemin  = min(kyemin,k)
+                cycle
+            endif
 !                                                                       
-!--call EOS tables                                               
+!--call EOS tables, starting the temperature inversion from the
+!--prediction based on the cell's last converged state
 !                    
+            call nuc_eos_guess(k,xrho,xtemp,xye,xenr,xent,keytemp)
             call nuc_eos_full(xrho,xtemp,xye,xenr,xprs,xent,xcs2,xdedt,             &
                 xdpderho,xdpdrhoe,xxa,xxh,xxn,xxp,xabar,xzbar,xmu_e,xmu_n,xmu_p,    &
                 xmuhat_table,keytemp,keyerr,precision)            
-            !                                                                       
-            !--store values                                                       
-            !                           
+            call nuc_eos_remember(k,xrho,xtemp,xye,xenr,xent,keytemp)
+            !
+            !--store values (every thread writes only its own cells)
+            !
             abar(k)   = xabar
-            xalpha(k) = xxa  
-            xheavy(k) = xxh  
-            yeh(k)    = xye  
-            xmue(k)   = xmu_e/utemp/boltzmev  ! Units: 1e9 K -> MeV               
-            xmuhat(k) = xmuhat_table/utemp/boltzmev                 
-
-            if (xxp.le.1d-20) then 
-                xxp=0. 
-            end if 
-            if (xxn.le.1d-20) then 
-                xxn=0. 
-            end if 
+            xalpha(k) = xxa
+            xheavy(k) = xxh
+            yeh(k)    = xye
+            xmue(k)   = xmu_e/utemp/boltzmev  ! Units: 1e9 K -> MeV
+            xmuhat(k) = xmuhat_table/utemp/boltzmev
+
+            if (xxp.le.1d-20) then
+                xxp=0.
+            end if
+            if (xxn.le.1d-20) then
+                xxn=0.
+            end if
 
             xp(k)     = xxp
             xn(k)     = xxn
             eta(k)    = xmu_e/xtemp
             temp(k)   = xtemp/utemp/boltzmev
-            prold(k)  = pr(k) 
+            prold(k)  = pr(k)
             pr(k)     = xprs/upr
             u2(k)     = xenr/uergg
             u(k)      = xent*sfac
-            vsound(k) = sqrt(xcs2)/uv                  
+            vsound(k) = sqrt(xcs2)/uv
 
+            niters  = niters+inv_iters
+            nbisect = nbisect+inv_bisect
+            if (inv_iters.eq.0) nfirst = nfirst+1
             ! zbar would be nice but not completely *necessary*          
         enddo   
+!$omp end parallel do
+
+        if (nrhomin.gt.0) print*, 'xrho hit min',  krhomin,                   &
+                                  rho(krhomin)*udens, ' cells:', nrhomin
+        if (ntempmin.gt.0) print*, 'xtemp hit min', ktempmin, ' cells:', ntempmin
+        if (nentmin.gt.0) print*, 'xent hit min',  kentmin,                    &
+                                  u(kentmin)/sfac, ' cells:', nentmin
+        if (kyeneg.le.ncell) then
+            print *,'k,yek',kyeneg,ye_table(kyeneg) 
+            stop "ERROR: xye < 0"
+        endif
+        if (krhomax.le.ncell) then
+            print *,'k,rhok',krhomax,rho(krhomax)*udens
+            stop "nuc_eos: rho > rhomax"
+        endif
+        if (kyemin.le.ncell) then
+            print *,'k,yek',kyemin,ye_table(kyemin)
+            stop "nuc_eos: ye < yemin"
+        endif
+        if (eos_checking) return
+
+        if (eos_check) then
+            ndiff = count(pr(1:ncell).ne.ref_pr.or.temp(1:ncell).ne.ref_temp)
+            if (ndiff.gt.0) then
+                k = maxloc(abs(pr(1:ncell)-ref_pr)/max(abs(ref_pr),1.d-99), 1)
+                print*, 'k,pr,pr serial,temp,temp serial', k, pr(k), ref_pr(k), &
+                        temp(k), ref_temp(k), ' cells:', ndiff
+                stop "ERROR: threaded eos5 differs from serial"
+            endif
+        endif
+
+        call system_clock(count1)
+        eos_time_last = dble(count1-count0)/dble(count_rate)
+        eos_time      = eos_time + eos_time_last
+        eos_calls     = eos_calls + 1
+        eos_cells     = eos_cells + ncell
+        eos_iters     = eos_iters + niters
+        eos_first     = eos_first + nfirst
+        eos_bisect    = eos_bisect + nbisect
+        eos_threads   = 1
+!$      eos_threads   = omp_get_max_threads()
     return 
     END        
                                                                         
@@ -1932,18 +2056,13 @@
 !                                                               *       
 !****************************************************************       
 !                                                                       
+      use grid, only: idim, pr, vsound, u2, vsmax, geff, fmix1, fmix2, &
+                      vturb2, dmix, alpha, bvf
       implicit double precision (a-h,o-z) 
-!                                                                       
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1) 
 !                                                                       
       dimension x(0:idim),f(0:idim),v(0:idim) 
       dimension fmix(idim) 
       dimension q(idim),rho(idim) 
-!                                                                       
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
-      common /fturb/ geff(idim), fmix1(idim), fmix2(idim) 
-      common /turb/ vturb2(idim),dmix(idim),alpha(4),bvf(idim) 
 !                                                                       
       alpha(1) = 1.d0/6.d0 
       alpha(2) = 1.d0/6.d0 
@@ -2003,23 +2122,18 @@
 !                                                               *       
 !****************************************************************       
 !                                                                       
+      use grid, only: idim, prnu, pr, vsound, u2, vsmax, deltam, abar, &
+                      pr_turb, output_preserve
       implicit double precision (a-h,o-z) 
 !             
       logical add_pturb, first_bounce, track_shock
-      double precision pr_turb
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1) 
 !                                                                       
       dimension x(0:idim),f(0:idim),v(0:idim) 
       dimension q(idim),rho(idim) 
 !                                                                       
-      common /eosnu/ prnu(idim1) 
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
-      common /carac/ deltam(idim), abar(idim) 
       common /damping/ damp, dcell 
       common /bnc/ rlumnue_max, bounce_ntstep, bounce_time, &
                    add_pturb, first_bounce, track_shock
-      common /mlout/ pr_turb(idim1), output_preserve(idim)
       !common /turb/ vturb2(idim),dmix(idim),alpha(4),bvf(idim) 
 !                                                                       
       data pi4/12.56637d0/ 
@@ -2028,7 +2142,12 @@
 !                                                                       
       prnu(1)       = 0.d0 
       prnu(ncell+1) = 0.d0 
+!--turbulent pressure gradient (disabled, see gradpt below)
+      gradpt        = 0.d0
 
+!$omp parallel do schedule(static)                                     &
+!$omp private(km05,kp05,ak,xk3,xkp3,akp1,akm1,akp05,akm05,             &
+!$omp         pressp,pressm,gradp,gradq)
       do k=1,ncell 
          km05  =  k 
          kp05  =  k+1 
@@ -2068,6 +2187,7 @@
             f(k) = f(k)-damp*v(k) 
          end if 
       enddo 
+!$omp end parallel do
 ! 199  format(I4,4(1x,1pe12.4))                                         
 !                                                                       
       return 
@@ -2082,9 +2202,8 @@
 !                                                               *       
 !****************************************************************       
 !                                                                       
+      use grid, only: idim, gshift
       implicit double precision (a-h,o-z) 
-!                                                                       
-      parameter (idim=10000) 
 !                                                                       
       dimension x(0:idim),f(0:idim) 
       dimension gpot(idim),deltam(idim) 
@@ -2092,7 +2211,6 @@
 !                                                                       
       !common /fturb/ geff(idim), fmix1(idim), fmix2(idim) 
       common /core / dcore, xmcore 
-      common /rshift/ gshift(idim) 
       common /const/ gg, clight, arad, bigr, xsecnn, xsecne 
 !                                                                       
 !--compute internal mass for all edges                                  
@@ -2106,12 +2224,14 @@
          xmi(0) = 0 
          f(0)   = 0 
       end if 
+      call prefix_sum(ncell,deltam,xmi)
+!$omp parallel do schedule(static) private(r2)
       do k=1,ncell 
-         xmi(k) = xmi(k-1)+deltam(k) 
          r2     = x(k)**2 
          f(k)   =-gg*xmi(k)/r2 
 !         geff(k) =-gg*xmi(k)/r2 
       enddo 
+!$omp end parallel do
 !                                                                       
 !--calculate gravitational potential                                    
 !                                                                       
@@ -2128,10 +2248,70 @@
 !                                                                       
 !--calculate gravitational redshift (w.r.t. r=infinity)                 
 !                                                                       
+!$omp parallel do schedule(static)
       do k=1,ncell 
          gshift(k) = 1.d0/dsqrt(1.d0-2.0d0*gpot(k)) 
 !         gshift(k)=1.d0                                                
       enddo 
+!$omp end parallel do
+!                                                                       
+      return 
+      END                                           
+!                                                                       
+      subroutine prefix_sum(n,a,s) 
+!****************************************************************       
+!                                                               *       
+!  Inclusive prefix sum s(k) = s(k-1) + a(k), k=1..n, starting  *       
+!  from the given s(0). With OpenMP every thread sums its own   *       
+!  block, the block totals are accumulated, and each thread     *       
+!  adds the offset of the blocks before it; the result then     *       
+!  differs from the serial sum at round-off level.              *       
+!                                                               *       
+!****************************************************************       
+!                                                                       
+!$    use omp_lib
+      implicit double precision (a-h,o-z) 
+!                                                                       
+      dimension a(n), s(0:n) 
+      double precision, allocatable :: part(:) 
+!                                                                       
+      nthr = 1 
+!$    nthr = omp_get_max_threads() 
+
+      if (nthr.eq.1 .or. n.lt.64*nthr) then 
+         do k=1,n 
+            s(k) = s(k-1)+a(k) 
+         enddo 
+         return 
+      end if 
+
+      allocate(part(0:nthr)) 
+!$omp parallel private(ithr,nt,kbeg,kend,k,sum) 
+      ithr = 0 
+      nt   = 1 
+!$    ithr = omp_get_thread_num() 
+!$    nt   = omp_get_num_threads() 
+      kbeg = ithr*n/nt+1 
+      kend = (ithr+1)*n/nt 
+
+      sum = 0.d0 
+      do k=kbeg,kend 
+         sum  = sum+a(k) 
+         s(k) = sum 
+      enddo 
+      part(ithr+1) = sum 
+!$omp barrier 
+!$omp single 
+      part(0) = s(0) 
+      do k=1,nt 
+         part(k) = part(k-1)+part(k) 
+      enddo 
+!$omp end single 
+      do k=kbeg,kend 
+         s(k) = s(k)+part(ithr) 
+      enddo 
+!$omp end parallel 
+      deallocate(part) 
 !                                                                       
       return 
       END                                           
@@ -2144,14 +2324,10 @@
 !                                                             *         
 !**************************************************************         
 !                                                                       
+      use grid, only: u, rho, ye, q, xmu, deltam, abar
       implicit double precision (a-h,o-z) 
 !                                                                       
-      parameter (idim=10000) 
-!                                                                       
-      common /cellc/ u(idim),rho(idim),ye(idim),q(idim) 
       common /numb/ ncell, ncell1 
-      common /therm/ xmu(idim) 
-      common /carac/ deltam(idim), abar(idim) 
 !                                                                       
       do i=1,ncell 
          xmu(i) = abar(i)/(abar(i)*ye(i)+1.) 
@@ -2438,21 +2614,27 @@
       return 
       END                                           
 !                                                                       
-      subroutine nuabs(ncell,rho,x,dye,ynue,ynueb,                      &
-     &                 dynue,dynueb,dunue,dunueb)                       
+      subroutine nuabs(kbeg,kend,rho,x,dye,ynue,ynueb,                  &
+     &                 dynue,dynueb,dunue,dunueb,denue,denueb)          
 !****************************************************                   
 !                                                                       
 ! this subroutine computes the neutrino absorption                      
-! by nucleons.                                                          
+! by nucleons for the cells kbeg..kend (called from                     
+! nuabsorb); the absorbed luminosities are added to                     
+! denue and denueb.                                                     
 ! Note: all neutrino energies are in MeV                                
 !                                                                       
 !****************************************************                   
 !                                                                       
+      use grid, only: idim, trapnue, trapnueb, trapnux, ebetaeq, pbetaeq, &
+                      etanue, etanueb, etanux, dnuae, dnuaeb, dnuse, &
+                      dnuseb, xp, xn, eta, ifleos, xmue, xmuhat, enuet, &
+                      enuebt, enuxt, deltam, abar, dq, dunu, temp, istep, &
+                      t0, steps, dum2v, gshift
       implicit double precision (a-h,o-z) 
 !                                                                       
       integer jtrape,jtrapb,jtrapx 
 !                                                                       
-      parameter(idim=10000) 
       parameter (delta=0.783) 
       parameter (deltab=1.805) 
 !-- tffac=(6pi^2/2)^2/3 hbar*2/(2 mp kb)*avo^2/3                        
@@ -2464,27 +2646,12 @@
       dimension dynue(idim), dynueb(idim),                              &
      &          dunue(idim),dunueb(idim)                                
 !                                                                       
-      logical trapnue, trapnueb, trapnux 
-      common /trap/ trapnue(idim), trapnueb(idim), trapnux(idim) 
       common /ftrap/ ftrape,ftrapb,ftrapx 
       common /jtrap/ jtrape,jtrapb,jtrapx 
-      logical ebetaeq, pbetaeq 
-      common /beta/ ebetaeq(idim), pbetaeq(idim) 
-      common /etnus/ etanue(idim),etanueb(idim),etanux(idim) 
-      common /dnuas/ dnuae(idim),dnuaeb(idim),dnuse(idim),dnuseb(idim) 
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /cpots/ xmue(idim), xmuhat(idim) 
-      common /enus/ enuet(idim),enuebt(idim),enuxt(idim) 
-      common /carac/ deltam(idim), abar(idim) 
-      common /ener1/ dq(idim), dunu(idim) 
-      common /tempe/ temp(idim) 
-      common /timei/ istep(idim),t0(idim),steps(idim),                  &
-     &               dum2v(idim)                                        
       common /nuout/ rlumnue, rlumnueb, rlumnux,                        &
      &               enue, enueb, enux, e2nue, e2nueb, e2nux            
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
-      common /rshift/ gshift(idim) 
       common /const/ gg, clight, arad, bigr, xsecnn, xsecne 
 !                                                                       
 !--the energy input is modified by delta=mn-mp-me=0.783 Mev             
@@ -2507,13 +2674,11 @@
       end if 
 !                                                                       
       tf     = tfermi/utemp 
-      denue  = 0.0 
-      denueb = 0.0 
 !      uconv=1./umevnuc                                                 
       prefac = 4.*3.14159*xsecnn*clight 
       dt     = steps(1) 
       dt9    = 9.*dt 
-      do i=1,ncell 
+      do i=kbeg,kend 
          if (trapnue(i)) then 
 !                                                                       
 !--e neutrino absorption by neutrons                                    
@@ -2525,8 +2690,6 @@
                facn=0. 
             else 
 !--compute degeneracy blocking                                          
-               call integrals(eta(i),f0,f1,f2,f3,f4,f5,0,df2,df3) 
-               call integrals(etanue(i),g0,g1,g2,g3,g4,g5,0,dg2,dg3) 
                expon = dexp(dmin1(enuet(i)/(temp(i)*utmev)-eta(i),50.d0)) 
 !--bel: electron end-state blocking                                     
                bel   = expon/(1.+expon) 
@@ -2617,6 +2780,63 @@
 !                                                                       
          endif 
       enddo 
+!                                                                       
+      return  
+      END                                           
+!                                                                       
+      subroutine nuabsorb(ncell,rho,x,ye,dye,ynue,ynueb,ynux,           &
+     &                    unue,unueb,dynue,dynueb,dunue,dunueb,dunux)   
+!****************************************************                   
+!                                                                       
+! Fused per-cell pass over absorption (nuabs), e+/e-                    
+! scattering (nuscat) and beta equilibrium (nubeta).                    
+! The grid is cut into blocks of nublk cells; each                      
+! block runs through the three routines in turn, and                    
+! with OpenMP the blocks are shared between the                         
+! threads. The absorbed and scattered luminosities                      
+! are reduced over the blocks and set the trapping                      
+! flags in /jtrap/.                                                     
+!                                                                       
+!****************************************************                   
+!                                                                       
+      use grid, only: idim
+      implicit double precision (a-h,o-z) 
+!                                                                       
+      integer jtrape,jtrapb,jtrapx 
+!                                                                       
+      parameter(nublk=32) 
+!                                                                       
+      dimension rho(idim), x(0:idim), ye(idim), dye(idim) 
+      dimension ynue(idim),ynueb(idim),ynux(idim) 
+      dimension unue(idim),unueb(idim) 
+      dimension dynue(idim), dynueb(idim),                              &
+     &          dunue(idim),dunueb(idim),dunux(idim)                    
+!                                                                       
+      common /jtrap/ jtrape,jtrapb,jtrapx 
+      common /units/ umass, udist, udens, utime, uergg, uergcc 
+      common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
+      common /nuout/ rlumnue, rlumnueb, rlumnux,                        &
+     &               enue, enueb, enux, e2nue, e2nueb, e2nux            
+!                                                                       
+      denue  = 0.d0 
+      denueb = 0.d0 
+      dee    = 0.d0 
+      dep    = 0.d0 
+      dex    = 0.d0 
+      nblock = (ncell+nublk-1)/nublk 
+!$omp parallel do schedule(dynamic) private(kbeg,kend)                 &
+!$omp reduction(+:denue,denueb,dee,dep,dex)
+      do ib=1,nblock 
+         kbeg = (ib-1)*nublk+1 
+         kend = min(ib*nublk,ncell) 
+         call nuabs(kbeg,kend,rho,x,dye,ynue,ynueb,                     &
+     &              dynue,dynueb,dunue,dunueb,denue,denueb)             
+         call nuscat(kbeg,kend,rho,x,ynue,ynueb,ynux,                   &
+     &               dunue,dunueb,dunux,dee,dep,dex)                    
+         call nubeta(kbeg,kend,x,rho,ye,dye,ynue,ynueb,unue,unueb,      &
+     &               dynue,dynueb,dunue,dunueb)                         
+      enddo 
+!$omp end parallel do
 !                                                                       
       fo = ufoe/utime 
       !print *, 'denue, denueb, fo', denue, denueb,fo                   
@@ -2626,21 +2846,37 @@
 !--check if denue larger than 0.25*rlumnue                              
 !                                                                       
       if (denue.gt.0.50*rlumnue) then 
-            jtrape = 1 
-         elseif (denue.lt.0.25*rlumnue.or.denue.lt.1.d-8) then 
-            jtrape =-1 
-         else 
-            jtrape = 0 
-         endif 
-   !                                                                       
-         if (denueb.gt.0.50*rlumnueb) then 
-            jtrapb = 1 
-         elseif (denueb.lt.0.25*rlumnueb.or.denueb.lt.1.d-8) then 
-            jtrapb =-1 
-         else 
-            jtrapb = 0 
-         endif 
-         return  
+         jtrape = 1 
+      elseif (denue.lt.0.25*rlumnue.or.denue.lt.1.d-8) then 
+         jtrape =-1 
+      else 
+         jtrape = 0 
+      endif 
+!                                                                       
+      if (denueb.gt.0.50*rlumnueb) then 
+         jtrapb = 1 
+      elseif (denueb.lt.0.25*rlumnueb.or.denueb.lt.1.d-8) then 
+         jtrapb =-1 
+      else 
+         jtrapb = 0 
+      endif 
+!                                                                       
+      f = ufoe/utime 
+!                                                                       
+      !print*,'e- neutrino scattering:',dee*f,' foes/s'                 
+      !print*,'e+ neutrino scattering:',dep*f,' foes/s'                 
+!                                                                       
+!--check if dex larger than 0.25*rlumnux                                
+!                                                                       
+      if (dex.gt.0.25*rlumnux) then 
+         jtrapx = 1 
+      elseif (dex.lt.0.125*rlumnux.or.dex.lt.1.d-8) then 
+         jtrapx =-1 
+      else 
+         jtrapx = 0 
+      endif
+!                                                                       
+      return 
       END                                           
 !                                                                       
       subroutine nuann(ncell,x,rho,ynue,ynueb,ynux,                     &
@@ -2653,9 +2889,10 @@
 !                                                                       
 !*********************************************************              
 !                                                                       
+      use grid, only: idim, trapnue, trapnueb, trapnux, enuet, enuebt, &
+                      enuxt, dnue, dnueb, dnux, xp, xn, eta, ifleos, dq, &
+                      dunu, temp
       implicit double precision (a-h,o-z) 
-!                                                                       
-      parameter(idim=10000) 
 !                                                                       
       parameter(sinw2=0.23) 
       parameter(fe=(1.+4.*sinw2+8.*sinw2*sinw2)/(6.*3.14159)) 
@@ -2669,13 +2906,6 @@
       dimension dynue(idim), dynueb(idim), dynux(idim),                 &
      &          dunue(idim),dunueb(idim),dunux(idim)                    
 !                                                                       
-      logical trapnue, trapnueb, trapnux 
-      common /trap/ trapnue(idim), trapnueb(idim), trapnux(idim) 
-      common /enus/ enuet(idim),enuebt(idim),enuxt(idim) 
-      common /dnus/ dnue(idim),dnueb(idim),dnux(idim) 
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /ener1/ dq(idim), dunu(idim) 
-      common /tempe/ temp(idim) 
       double precision umass 
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
@@ -2724,11 +2954,12 @@
       return 
       END                                           
 !                                                                       
-      subroutine nubeta(ncell,x,rho,ye,dye,ynue,ynueb,unue,unueb,       &
+      subroutine nubeta(kbeg,kend,x,rho,ye,dye,ynue,ynueb,unue,unueb,   &
      &                 dynue,dynueb,dunue,dunueb)                       
 !*************************************************************          
 !                                                                       
-! This subroutine treats cases where beta eq. has occurred.             
+! This subroutine treats cases where beta eq. has occurred              
+! for the cells kbeg..kend (called from nuabsorb).                      
 ! In beta eq.: munue(beta)=mue-muhat                                    
 ! so we compute Ynue(munue(beta)) and unue(munue(beta))                 
 ! assuming thermal distribution at matter temperature,                  
@@ -2738,10 +2969,11 @@
 !************************************************************           
 !                                                                       
 !                                                                       
+      use grid, only: idim, ebetaeq, pbetaeq, xp, xn, eta, ifleos, xmue, &
+                      xmuhat, enuet, enuebt, enuxt, dq, dunu, istep, t0, &
+                      steps, dum2v, temp, pr, vsound, u2, vsmax
       implicit double precision (a-h,o-z) 
 !                                                                       
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1) 
 !--1/(2.*avo*pi**2*(hbar*c)**3 in Mev-3 cm-3 nucleon g-1)               
       parameter (prefac=1.09e7) 
 !--mn-mp-me in MeV                                                      
@@ -2756,19 +2988,9 @@
       dimension dynue(idim), dynueb(idim),                              &
      &          dunue(idim),dunueb(idim)                                
 !                                                                       
-      logical ebetaeq, pbetaeq 
-      common /beta/ ebetaeq(idim), pbetaeq(idim) 
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /cpots/ xmue(idim), xmuhat(idim) 
-      common /enus/ enuet(idim),enuebt(idim),enuxt(idim) 
-      common /ener1/ dq(idim), dunu(idim) 
-      common /timei/ istep(idim),t0(idim),steps(idim),                  &
-     &               dum2v(idim)                                        
-      common /tempe/ temp(idim) 
       double precision umass 
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
 !                                                                       
 !      umevnuct=umevnuc*utime                                           
 !      uconv=1./umevnuct                                                
@@ -2776,7 +2998,7 @@
       ufac=umevnuc*yfac 
       kounte=0 
       kountp=0 
-      do i=1,ncell 
+      do i=kbeg,kend 
 !-- time scale to eq. = 10 sound crossing time                          
          dx=x(i)-x(i-1) 
          dt=steps(i) 
@@ -2837,11 +3059,13 @@
 !*************************************************************          
 !                                                                       
 !                                                                       
+      use grid, only: idim, trapnue, trapnueb, trapnux, enuet, enuebt, &
+                      enuxt, dnue, dnueb, dnux, xp, xn, eta, ifleos, &
+                      deltam, abar, temp
       implicit double precision (a-h,o-z) 
 !                                                                       
       integer jtrape,jtrapb,jtrapx 
 !                                                                       
-      parameter (idim=10000) 
       parameter (tiny=1d-15) 
 
       parameter (rcrit=1.0) 
@@ -2851,15 +3075,8 @@
      &          unue(idim),unueb(idim),unux(idim)                       
 !                                                                       
       double precision umass 
-      logical trapnue, trapnueb, trapnux 
-      common /trap/ trapnue(idim), trapnueb(idim), trapnux(idim) 
       common /ftrap/ ftrape,ftrapb,ftrapx 
       common /jtrap/ jtrape,jtrapb,jtrapx 
-      common /enus/ enuet(idim),enuebt(idim),enuxt(idim) 
-      common /dnus/ dnue(idim),dnueb(idim),dnux(idim) 
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /carac/ deltam(idim), abar(idim) 
-      common /tempe/ temp(idim) 
       common /cases/ t9nse, rhoswe, rhonue, rhonux 
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /const/ gg, clight, arad, bigr, xsecnn, xsecne 
@@ -3006,9 +3223,12 @@
 !                                                                       
 !*****************************************************                  
 !                                                                       
+      use grid, only: idim, trapnue, trapnueb, trapnux, etanue, etanueb, &
+                      etanux, tempnue, tempnueb, tempnux, enuet, enuebt, &
+                      enuxt, dnue, dnueb, dnux, gshift, dq, dunu, temp, &
+                      deltam, abar
       implicit double precision (a-h,o-z) 
 !                                                                       
-      parameter(idim=10000) 
       parameter(fs=1./(12.*3.14159)) 
 !-- cross section Gf / gram is 6.02e23*5.29e-44=3.2e-20                 
       parameter(sigma=fs*3.2e-20) 
@@ -3018,19 +3238,9 @@
       dimension dynue(idim), dynueb(idim), dynux(idim),                 &
      &          dunue(idim),dunueb(idim),dunux(idim)                    
 !                                                                       
-      logical trapnue, trapnueb, trapnux 
-      common /trap/ trapnue(idim), trapnueb(idim), trapnux(idim) 
-      common /etnus/ etanue(idim),etanueb(idim),etanux(idim) 
-      common /tnus / tempnue(idim), tempnueb(idim), tempnux(idim) 
-      common /enus/ enuet(idim),enuebt(idim),enuxt(idim) 
-      common /dnus/ dnue(idim),dnueb(idim),dnux(idim) 
-      common /rshift/ gshift(idim) 
-      common /ener1/ dq(idim), dunu(idim) 
-      common /tempe/ temp(idim) 
       double precision umass 
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
-      common /carac/ deltam(idim), abar(idim) 
       common /nuout/ rlumnue, rlumnueb, rlumnux,                        &
      &               enue, enueb, enux, e2nue, e2nueb, e2nux            
 !                                                                       
@@ -3150,32 +3360,24 @@
 !                                                              *        
 !***************************************************************        
 !                                                                       
+      use grid, only: idim, istep, t0, steps, dum2v, trapnue, trapnueb, &
+                      trapnux, enuet, enuebt, enuxt, dnue, dnueb, dnux, &
+                      etanue, etanueb, etanux, tempnue, tempnueb, &
+                      tempnux, deltam, abar, gshift, dnuae, dnuaeb, &
+                      dnuse, dnuseb
       implicit double precision (a-h,o-z) 
 !                                                                       
       integer ncell 
       parameter (tiny=1.d-10) 
-      parameter (idim=10000) 
 !                                                                       
       dimension x(0:idim), rho(idim), ye(idim) 
       dimension dynue(idim),dynueb(idim),dynux(idim),                   &
      &          dunue(idim),dunueb(idim),dunux(idim),                   &
      &          ynue(idim),ynueb(idim),ynux(idim)                       
 !                                                                       
-      common /timei/ istep(idim),t0(idim),steps(idim),                  &
-     &               dum2v(idim)                                        
-      logical trapnue, trapnueb, trapnux 
-      common /trap/ trapnue(idim), trapnueb(idim), trapnux(idim) 
-      common /enus/ enuet(idim),enuebt(idim),enuxt(idim) 
-      common /dnus/ dnue(idim),dnueb(idim),dnux(idim) 
-      common /etnus/ etanue(idim),etanueb(idim),etanux(idim) 
       common /const/ gg, clight, arad, bigr, xsecnn, xsecne 
-      common /tnus / tempnue(idim), tempnueb(idim), tempnux(idim) 
-      common /carac/ deltam(idim), abar(idim) 
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
-      common /rshift/ gshift(idim) 
       common /nsat/ satc,xtime 
-      common /dnuas/ dnuae(idim),dnuaeb(idim)                           &
-     &     ,dnuse(idim),dnuseb(idim)                                    
       common /neutm/ iflxlm, icvb 
 !                                                                       
       data pi4/12.56637d0/ 
@@ -3535,20 +3737,27 @@
 !                                                                       
       END                                           
 !                                                                       
-      subroutine nuecap(ncell,rho,ye,dye,dynue,dynueb,                  &
-     &                  dunue,dunueb)                                   
+      subroutine nuecap(kbeg,kend,rho,ye,dye,dynue,dynueb,              &
+     &                  dunue,dunueb,sums)                              
 !****************************************************                   
 !                                                                       
 ! this subroutine computes the neutrino production                      
 ! by e+/e- capture on nucleons                                          
+! for the cells kbeg..kend (called from nuemit);                        
+! the free-streaming luminosity sums are added to                       
+! sums(9), in the order of /nuout/                                      
 ! Note: all neutrino energies are in MeV                                
 !                                                                       
 !****************************************************                   
 !                                                                       
+      use grid, only: idim, trapnue, trapnueb, trapnux, ebetaeq, pbetaeq, &
+                      etanue, etanueb, etanux, tempnue, tempnueb, &
+                      tempnux, enuet, enuebt, enuxt, gshift, dq, dunu, &
+                      xmue, xmuhat, xp, xn, eta, ifleos, pr, vsound, u2, &
+                      vsmax, deltam, abar, temp, istep, t0, steps, dum2v, &
+                      ynue, ynueb, ynux, unue, unueb, unux
       implicit double precision (a-h,o-z) 
 !                                                                       
-      parameter(idim=10000) 
-      parameter (idim1 = idim+1) 
 !--1/(avo*pi**2*(hbar*c)**3 in Mev-3 cm-3 nucleon g-1)                  
 !      parameter(prefac=2.19e7)                                         
 !-- tffac=(6pi^2/2)^2/3 hbar*2/(2 mp kb)*avo^2/3                        
@@ -3556,29 +3765,10 @@
 !                                                                       
       dimension rho(idim), ye(idim), dye(idim) 
       dimension dynue(idim),dynueb(idim),dunue(idim),dunueb(idim) 
+      dimension sums(9) 
 !                                                                       
-      logical trapnue, trapnueb, trapnux 
-      common /trap/ trapnue(idim), trapnueb(idim), trapnux(idim) 
-      logical ebetaeq, pbetaeq 
-      common /beta/ ebetaeq(idim), pbetaeq(idim) 
-      common /etnus/ etanue(idim),etanueb(idim),etanux(idim) 
-      common /tnus / tempnue(idim), tempnueb(idim), tempnux(idim) 
-      common /enus/ enuet(idim),enuebt(idim),enuxt(idim) 
-      common /rshift/ gshift(idim) 
-      common /ener1/ dq(idim), dunu(idim) 
-      common /cpots/ xmue(idim), xmuhat(idim) 
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
-      common /carac/ deltam(idim), abar(idim) 
-      common /tempe/ temp(idim) 
-      common /timei/ istep(idim),t0(idim),steps(idim),                  &
-     &               dum2v(idim)                                        
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
-      common /nuout/ rlumnue, rlumnueb, rlumnux,                        &
-     &               enue, enueb, enux, e2nue, e2nueb, e2nux            
-      common /nustuff/ ynue(idim),ynueb(idim),ynux(idim),               &
-     &               unue(idim),unueb(idim),unux(idim)                  
 !                                                                       
       double precision umass 
 !      double precision ugserg,avo                                      
@@ -3594,7 +3784,7 @@
 !--do all cells                                                         
 !                                                                       
       dt9=9.d0*steps(1) 
-      do i=1,ncell 
+      do i=kbeg,kend 
          tempi=temp(i) 
 !         rhoi=rho(i)*udens                                             
          etai=eta(i) 
@@ -3656,7 +3846,6 @@
                else 
                   ebetaeq(i)=.false. 
                endif 
-               call integrals(-eta(i),f0,f1,f2,f3,f4,f5,0,df2,df3) 
 !               ypo=yfac*tmev3*f2/rho(i)                                
 !              if (prate*dt9.gt.ypo.and.trapnueb(i)) then               
                if (facn*dt9.gt.ye(i).and.trapnueb(i)) then 
@@ -3686,9 +3875,9 @@
 !--weigh the mean energy sums by luminosity                             
                   shift=gshift(i) 
                   rlnue=due*deltami*shift 
-                  rlumnue=rlumnue+rlnue 
-                  enue=enue+enumean*shift*rlnue 
-                  e2nue=e2nue+enumean*enumean*shift*shift*rlnue 
+                  sums(1)=sums(1)+rlnue 
+                  sums(4)=sums(4)+enumean*shift*rlnue 
+                  sums(7)=sums(7)+enumean*enumean*shift*shift*rlnue 
                end if 
                if (trapnueb(i)) then 
                   dynueb(i)=dynueb(i)+facn 
@@ -3697,9 +3886,9 @@
 !--weigh the mean energy sums by luminosity                             
                   shift=gshift(i) 
                   rlnueb=dup*deltami*shift 
-                  rlumnueb=rlumnueb+rlnueb 
-                  enueb=enueb+enubmean*shift*rlnueb 
-                  e2nueb=e2nueb+enubmean*enubmean*shift*shift*rlnueb 
+                  sums(2)=sums(2)+rlnueb 
+                  sums(5)=sums(5)+enubmean*shift*rlnueb 
+                  sums(8)=sums(8)+enubmean*enubmean*shift*shift*rlnueb 
                end if 
             endif 
          endif 
@@ -3707,6 +3896,59 @@
 !                                                                       
       return 
       END                                           
+!                                                                       
+      subroutine nuemit(ncell,rho,ye,dye,dynue,dynueb,dynux,            &
+     &                  dunue,dunueb,dunux)                             
+!****************************************************                   
+!                                                                       
+! Fused per-cell pass over the neutrino production by                   
+! e+/e- capture (nuecap) and pair/plasma processes                      
+! (nupp). The grid is cut into blocks of nublk cells;                   
+! each block runs through both routines, and with                       
+! OpenMP the blocks are shared between the threads                      
+! (dynamically, as only hot cells do any work). The                     
+! luminosity sums are reduced over the blocks and then                  
+! added to /nuout/.                                                     
+!                                                                       
+!****************************************************                   
+!                                                                       
+      use grid, only: idim
+      implicit double precision (a-h,o-z) 
+!                                                                       
+      parameter(nublk=32) 
+!                                                                       
+      dimension rho(idim), ye(idim), dye(idim) 
+      dimension dynue(idim), dynueb(idim), dynux(idim),                 &
+     &          dunue(idim),dunueb(idim),dunux(idim)                    
+      dimension sums(9) 
+!                                                                       
+      common /nuout/ rlumnue, rlumnueb, rlumnux,                        &
+     &               enue, enueb, enux, e2nue, e2nueb, e2nux            
+!                                                                       
+      sums(:) = 0.d0 
+      nblock  = (ncell+nublk-1)/nublk 
+!$omp parallel do schedule(dynamic) private(kbeg,kend) reduction(+:sums)
+      do ib=1,nblock 
+         kbeg = (ib-1)*nublk+1 
+         kend = min(ib*nublk,ncell) 
+         call nuecap(kbeg,kend,rho,ye,dye,dynue,dynueb,dunue,dunueb,sums) 
+         call nupp(kbeg,kend,rho,ye,dynue,dynueb,dynux,                 &
+     &             dunue,dunueb,dunux,sums)                             
+      enddo 
+!$omp end parallel do
+!                                                                       
+      rlumnue  = rlumnue +sums(1) 
+      rlumnueb = rlumnueb+sums(2) 
+      rlumnux  = rlumnux +sums(3) 
+      enue     = enue    +sums(4) 
+      enueb    = enueb   +sums(5) 
+      enux     = enux    +sums(6) 
+      e2nue    = e2nue   +sums(7) 
+      e2nueb   = e2nueb  +sums(8) 
+      e2nux    = e2nux   +sums(9) 
+!                                                                       
+      return 
+      END                                           
 !                                                                       
       subroutine nuinit(ncell,rho,x,ye,dye,                             &
      &            ynue,ynueb,ynux,dynue,dynueb,dynux,                   &
@@ -3723,12 +3965,15 @@
 !                                                                       
 !*************************************************************          
 !                                                                       
+      use grid, only: idim, trapnue, trapnueb, trapnux, enuet, enuebt, &
+                      enuxt, etanue, etanueb, etanux, tempnue, tempnueb, &
+                      tempnux, dnue, dnueb, dnux, deltam, abar, xp, xn, &
+                      eta, ifleos, xalpha, xheavy, yeh, temp, dq, dunu
       implicit double precision (a-h,o-z) 
 !                                                                       
       integer jtrape,jtrapb,jtrapx 
 !                                                                       
 !                                                                       
-      parameter (idim=10000) 
       parameter (small=1d-20) 
       parameter (rcrit=1.0) 
 !                                                                       
@@ -3769,19 +4014,8 @@
       dimension ye(idim),dye(idim) 
 !                                                                       
       double precision umass 
-      logical trapnue, trapnueb, trapnux 
-      common /trap/ trapnue(idim), trapnueb(idim), trapnux(idim) 
       common /ftrap/ ftrape,ftrapb,ftrapx 
       common /jtrap/ jtrape,jtrapb,jtrapx 
-      common /enus/ enuet(idim),enuebt(idim),enuxt(idim) 
-      common /etnus/ etanue(idim),etanueb(idim),etanux(idim) 
-      common /tnus / tempnue(idim), tempnueb(idim), tempnux(idim) 
-      common /dnus/ dnue(idim),dnueb(idim),dnux(idim) 
-      common /carac/ deltam(idim), abar(idim) 
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /hnucl/ xalpha(idim),xheavy(idim), yeh(idim) 
-      common /tempe/ temp(idim) 
-      common /ener1/ dq(idim), dunu(idim) 
       common /cases/ t9nse, rhoswe, rhonue, rhonux 
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /const/ gg, clight, arad, bigr, xsecnn, xsecne 
@@ -4104,39 +4338,32 @@
       return 
       END                                             
 !                                                                       
-      subroutine nupp(ncell,rho,ye,dynue,dynueb,dynux,                  &
-     &                dunue,dunueb,dunux)                               
+      subroutine nupp(kbeg,kend,rho,ye,dynue,dynueb,dynux,              &
+     &                dunue,dunueb,dunux,sums)                          
 !****************************************************                   
 !                                                                       
 ! this subroutine computes the neutrino production                      
 ! by e+/e- capture on nucleons                                          
+! for the cells kbeg..kend (called from nuemit);                        
+! the free-streaming luminosity sums are added to                       
+! sums(9), in the order of /nuout/                                      
 ! Note: all neutrino energies are in MeV                                
 !                                                                       
 !****************************************************                   
 !                                                                       
+      use grid, only: idim, trapnue, trapnueb, trapnux, ebetaeq, pbetaeq, &
+                      etanue, etanueb, etanux, tempnue, tempnueb, &
+                      tempnux, gshift, dq, dunu, xp, xn, eta, ifleos, &
+                      deltam, abar, temp
       implicit double precision (a-h,o-z) 
-!                                                                       
-      parameter(idim=10000) 
 !                                                                       
       dimension rho(idim), ye(idim) 
       dimension dynue(idim), dynueb(idim), dynux(idim),                 &
      &          dunue(idim),dunueb(idim),dunux(idim)                    
+      dimension sums(9) 
 !                                                                       
-      logical trapnue, trapnueb, trapnux 
-      common /trap/ trapnue(idim), trapnueb(idim), trapnux(idim) 
-      logical ebetaeq, pbetaeq 
-      common /beta/ ebetaeq(idim), pbetaeq(idim) 
-      common /etnus/ etanue(idim),etanueb(idim),etanux(idim) 
-      common /tnus / tempnue(idim), tempnueb(idim), tempnux(idim) 
-      common /rshift/ gshift(idim) 
-      common /ener1/ dq(idim), dunu(idim) 
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /carac/ deltam(idim), abar(idim) 
-      common /tempe/ temp(idim) 
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
-      common /nuout/ rlumnue, rlumnueb, rlumnux,                        &
-     &               enue, enueb, enux, e2nue, e2nueb, e2nux            
 !                                                                       
       data avo/6.022d23/ 
 !                                                                       
@@ -4149,7 +4376,7 @@
 !                                                                       
 !--loop over all particles                                              
 !                                                                       
-      do i=1,ncell 
+      do i=kbeg,kend 
          yei   = ye(i) 
          tempi = temp(i) 
          rhoi  = rho(i)*udens 
@@ -4187,9 +4414,9 @@
             else 
                shift   = gshift(i) 
                rlnue   = 0.5*dunuel*deltami*shift 
-               rlumnue = rlumnue+rlnue 
-               enue    = enue+enuel*shift*rlnue 
-               e2nue   = e2nue+enuel2*shift*shift*rlnue 
+               sums(1) = sums(1)+rlnue 
+               sums(4) = sums(4)+enuel*shift*rlnue 
+               sums(7) = sums(7)+enuel2*shift*shift*rlnue 
             endif 
 
             if (trapnueb(i)) then 
@@ -4199,9 +4426,9 @@
             else 
                shift    = gshift(i) 
                rlnueb   = 0.5*dunuel*deltami*shift 
-               rlumnueb = rlumnueb+rlnueb 
-               enueb    = enueb+enuel*shift*rlnueb 
-               e2nueb   = e2nueb+enuel2*shift*shift*rlnueb 
+               sums(2)  = sums(2)+rlnueb 
+               sums(5)  = sums(5)+enuel*shift*rlnueb 
+               sums(8)  = sums(8)+enuel2*shift*shift*rlnueb 
             endif 
 
             if (trapnux(i)) then 
@@ -4212,9 +4439,9 @@
             else 
                shift   = gshift(i) 
                rlnux   = dunuxl*deltami*shift 
-               rlumnux = rlumnux+rlnux 
-               enux    = enux+enuxl*shift*rlnux 
-               e2nux   = e2nux+enuxl2*shift*rlnux 
+               sums(3) = sums(3)+rlnux 
+               sums(6) = sums(6)+enuxl*shift*rlnux 
+               sums(9) = sums(9)+enuxl2*shift*rlnux 
             endif 
          endif 
       enddo 
@@ -4230,19 +4457,12 @@
 !                                                                       
 !******************************************************                 
 !                                                                       
+      use grid, only: idim, trapnue, trapnueb, trapnux, etanue, etanueb, &
+                      etanux, prnu, pr, vsound, u2, vsmax
       implicit double precision (a-h,o-z) 
-!                                                                       
-      parameter(idim=10000) 
-      parameter (idim1 = idim+1) 
 !                                                                       
       dimension rho(idim) 
       dimension unue(idim),unueb(idim),unux(idim) 
-!                                                                       
-      logical trapnue, trapnueb, trapnux 
-      common /trap/ trapnue(idim), trapnueb(idim), trapnux(idim) 
-      common /etnus/ etanue(idim),etanueb(idim),etanux(idim) 
-      common /eosnu/ prnu(idim1) 
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
 !                                                                       
       ratmax   = 0.0 
       etanuemx = 0.0 
@@ -4264,12 +4484,14 @@
 !
 !                                                                       
                                                                         
-      subroutine nuscat(ncell,rho,x,ynue,ynueb,ynux,                    &
-     &          dunue,dunueb,dunux)                                     
+      subroutine nuscat(kbeg,kend,rho,x,ynue,ynueb,ynux,                &
+     &          dunue,dunueb,dunux,dee,dep,dex)                         
 !****************************************************                   
 !                                                                       
 ! this subroutine computes the neutrino scatterings                     
-! by electron and positrons.                                            
+! by electron and positrons for the cells kbeg..kend                    
+! (called from nuabsorb); the scattered luminosities                    
+! are added to dee, dep and dex.                                        
 ! Total cross sections from Mandl and Shaw, Quantum Field               
 ! Theory, p.313. I have further assumed that the mean                   
 ! energy transfer is 0.25*(Enu-Ee)                                      
@@ -4284,9 +4506,12 @@
 !                                                                       
 !****************************************************                   
 !                                                                       
+      use grid, only: idim, trapnue, trapnueb, trapnux, etanue, etanueb, &
+                      etanux, tempnue, tempnueb, tempnux, gshift, xp, xn, &
+                      eta, ifleos, enuet, enuebt, enuxt, dq, dunu, &
+                      deltam, abar, temp, istep, t0, steps, dum2v, dnuae, &
+                      dnuaeb, dnuse, dnuseb
       implicit double precision (a-h,o-z) 
-!                                                                       
-      parameter(idim=10000) 
 !                                                                       
       parameter(sinw2=0.23) 
       parameter(ga=-0.5) 
@@ -4313,26 +4538,13 @@
 !                                                                       
       integer jtrape,jtrapb,jtrapx 
       double precision umass 
-      logical trapnue, trapnueb, trapnux 
-      common /trap/ trapnue(idim), trapnueb(idim), trapnux(idim) 
-      common /etnus/ etanue(idim),etanueb(idim),etanux(idim) 
-      common /tnus / tempnue(idim), tempnueb(idim), tempnux(idim) 
-      common /rshift/ gshift(idim) 
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /enus/ enuet(idim),enuebt(idim),enuxt(idim) 
-      common /ener1/ dq(idim), dunu(idim) 
-      common /carac/ deltam(idim), abar(idim) 
-      common /tempe/ temp(idim) 
       common /ftrap/ ftrape,ftrapb,ftrapx 
       common /jtrap/ jtrape,jtrapb,jtrapx 
       common /nuout/ rlumnue, rlumnueb, rlumnux,                        &
      &               enue, enueb, enux, e2nue, e2nueb, e2nux            
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
-      common /timei/ istep(idim),t0(idim),steps(idim),                  &
-     &               dum2v(idim)                                        
       common /const/ gg, clight, arad, bigr, xsecnn, xsecne 
-      common /dnuas/ dnuae(idim),dnuaeb(idim),dnuse(idim),dnuseb(idim) 
 !                                                                       
       dt=steps(1) 
       dt1=1./dt 
@@ -4355,10 +4567,7 @@
          ratioeb=0.0 
       endif 
 !                                                                       
-      dee=0.0 
-      dep=0.0 
-      dex=0.0 
-      do i=1,ncell 
+      do i=kbeg,kend 
          tempi=temp(i) 
          etai=eta(i) 
 !        if (i.eq.1) print *,'nuscat: temp1,trapnue(1)',tempi,trapnue(1)
@@ -4524,20 +4733,6 @@
             endif 
          endif 
       enddo 
-!                                                                       
-      !print*,'e- neutrino scattering:',dee*f,' foes/s'                 
-      !print*,'e+ neutrino scattering:',dep*f,' foes/s'                 
-!                                                                       
-!                                                                       
-!--check if dex larger than 0.25*rlumnux                                
-!                                                                       
-      if (dex.gt.0.25*rlumnux) then 
-            jtrapx=1                                       
-      elseif (dex.lt.0.125*rlumnux.or.dex.lt.1.d-8) then 
-            jtrapx=-1 
-      else 
-            jtrapx=0 
-      endif
 !                                                                       
       return 
       END                                           
@@ -4561,9 +4756,11 @@
 !                                                                       
 !************************************************************           
 !                                                                       
+      use grid, only: idim, trapnue, trapnueb, trapnux, dnue, dnueb, &
+                      dnux, enuet, enuebt, enuxt, dq, dunu, deltam, abar, &
+                      istep, t0, steps, dum2v, gshift
       implicit double precision (a-h,o-z) 
 !                                                                       
-      parameter(idim=10000) 
       parameter(tiny=1d-15) 
 !                                                                       
       dimension x(0:idim) 
@@ -4572,18 +4769,9 @@
      &          ynue(idim),ynueb(idim),ynux(idim),                      &
      &          unue(idim),unueb(idim),unux(idim)                       
 !                                                                       
-      logical trapnue, trapnueb, trapnux 
-      common /trap/ trapnue(idim), trapnueb(idim), trapnux(idim) 
-      common /dnus/ dnue(idim),dnueb(idim),dnux(idim) 
-      common /enus/ enuet(idim),enuebt(idim),enuxt(idim) 
-      common /ener1/ dq(idim), dunu(idim) 
-      common /carac/ deltam(idim), abar(idim) 
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
       common /const/ gg, clight, arad, bigr, xsecnn, xsecne 
-      common /timei/ istep(idim),t0(idim),steps(idim),                  &
-     &               dum2v(idim)                                        
-      common /rshift/ gshift(idim) 
       common /nuout/ rlumnue, rlumnueb, rlumnux,                        &
      &               enue, enueb, enux, e2nue, e2nueb, e2nux            
 !                                                                       
@@ -4693,20 +4881,13 @@
 !                                                                       
 !**********************************************************             
 !                                                                       
+      use grid, only: idim, trapnue, trapnueb, trapnux, prnu, dq, dunu, &
+                      deltam, abar
       implicit double precision (a-h,o-z) 
-!                                                                       
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1) 
 !                                                                       
       dimension x(0:idim),rho(idim),v(0:idim) 
       dimension unue(idim),unueb(idim),unux(idim) 
       dimension dunue(idim),dunueb(idim),dunux(idim) 
-!                                                                       
-      logical trapnue, trapnueb, trapnux 
-      common /trap/ trapnue(idim), trapnueb(idim), trapnux(idim) 
-      common /eosnu / prnu(idim1) 
-      common /ener1/ dq(idim), dunu(idim) 
-      common /carac/ deltam(idim), abar(idim) 
 !                                                                       
       data pi4/12.56637d0/ 
 !                                                                       
@@ -4845,19 +5026,13 @@
 !                                                               *       
 !****************************************************************       
 !                                                                       
+      use grid, only: deltam, abar, u, rho, ye, q, x, v, f, etanue, &
+                      etanueb, etanux, xpf, pvar2, pvar3, pvar4, xmu
       implicit double precision (a-h,o-z) 
 !                                                                       
-      parameter (idim=10000) 
 !                                                                       
-!                                                                       
-      common /carac/ deltam(idim), abar(idim) 
       common /cases/ t9nse, rhoswe, rhonue, rhonux 
-      common /cellc/ u(idim),rho(idim),ye(idim),q(idim) 
-      common /celle/ x(0:idim),v(0:idim),f(0:idim) 
-      common /etnus/ etanue(idim),etanueb(idim),etanux(idim) 
       common /numb/ ncell,ncell1 
-      common /swesty/ xpf(idim), pvar2(idim), pvar3(idim), pvar4(idim) 
-      common /therm/ xmu(idim) 
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
       common /uswest/ usltemp, uslrho, uslu, uslp, u2sluncell1 
@@ -4918,24 +5093,17 @@
 !                                                           *           
 !************************************************************           
 !                                                                       
+      use grid, only: idim, trapnue, trapnueb, trapnux, xp, xn, eta, &
+                      ifleos, xold, vold, rhold, prold, tempold, yeold, &
+                      xnold, xpold, deltam, abar, temp, istep, t0, steps, &
+                      dum2v
       implicit double precision (a-h,o-z) 
-      parameter(idim=10000) 
 !                                                                       
       dimension x(0:idim), v(0:idim),u(idim),                           &
      &     rho(idim), ye(idim)                                          
       dimension ynue(idim),ynueb(idim),ynux(idim),                      &
      &          unue(idim),unueb(idim),unux(idim)                       
 !                                                                       
-      logical trapnue, trapnueb, trapnux 
-      common /trap/ trapnue(idim), trapnueb(idim), trapnux(idim) 
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /prev / xold(0:idim),vold(0:idim),rhold(idim),             &
-     &              prold(idim), tempold(idim), yeold(idim),            &
-     &              xnold(idim), xpold(idim)                            
-      common /carac/ deltam(idim), abar(idim) 
-      common /tempe/ temp(idim) 
-      common /timei/ istep(idim),t0(idim),steps(idim),                  &
-     &               dum2v(idim)                                        
       common /cases/ t9nse, rhoswe, rhonue, rhonux 
       common /core / dcore, xmcore 
       common /heat/ iheat 
@@ -5027,29 +5195,20 @@
 !                                                           *           
 !************************************************************           
 !                                                                       
+      use grid, only: idim, trapnue, trapnueb, trapnux, xp, xn, eta, &
+                      ifleos, xold, vold, rhold, prold, tempold, yeold, &
+                      xnold, xpold, deltam, abar, temp, istep, t0, steps, &
+                      dum2v, pr, vsound, u2, vsmax
       implicit double precision (a-h,o-z) 
-      parameter(idim=10000) 
-      parameter(idim1 = idim+1) 
 !                                                                       
       dimension x(0:idim), v(0:idim),u(idim),                           &
      &     rho(idim), ye(idim)                                          
       dimension ynue(idim),ynueb(idim),ynux(idim),                      &
      &          unue(idim),unueb(idim),unux(idim)                       
 !                                                                       
-      logical trapnue, trapnueb, trapnux 
-      common /trap/ trapnue(idim), trapnueb(idim), trapnux(idim) 
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /prev / xold(0:idim),vold(0:idim),rhold(idim),             &
-     &              prold(idim), tempold(idim), yeold(idim),            &
-     &              xnold(idim), xpold(idim)                            
-      common /carac/ deltam(idim), abar(idim) 
-      common /tempe/ temp(idim) 
-      common /timei/ istep(idim),t0(idim),steps(idim),                  &
-     &               dum2v(idim)                                        
       common /cases/ t9nse, rhoswe, rhonue, rhonux 
       common /core / dcore, xmcore 
       common /heat/ iheat 
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
 !                                                                       
       pi43   = 4.18879 
 !                                                                        
@@ -5069,6 +5228,7 @@
       end do 
 
       if (xvalf.gt.xvcrit) then 
+         if (ncell.ge.idim) stop "ERROR: amp: no headroom left in the grid arrays"
          ncell       = ncell+1 
          pr(ncell+1) = pr(ncell) 
          idiv        = jf 
@@ -5595,70 +5755,57 @@
 !                                                                       
 !************************************************************           
 !                                                                       
+      use pytorch, only: ml_threads, ml_interop, ml_tolerance, ml_max_stale
+      use data_functions, only: resample_order
+      use dumpio, only: async_dump, nrestart, ana_nfield, ana_parse, &
+                        dump_open, s_full, s_ana
+      use grid, only: grid_alloc, idim, ycc, yccave, dq, dunu, x, v, f, &
+                      u, rho, ye, q, ynue, ynueb, ynux, unue, unueb, &
+                      unux, xp, xn, eta, ifleos, pr, vsound, u2, vsmax, &
+                      ufreez, deltam, abar, temp, trapnue, trapnueb, &
+                      trapnux, ifign, istep, t0, steps, dum2v, dj, &
+                      pr_turb, output_preserve
       implicit double precision (a-h,o-z) 
 !                                                                       
-      integer jtrape,jtrapb,jtrapx,mlin_grid_size,idump,skip_dump
+      integer jtrape,jtrapb,jtrapx,mlin_grid_size,idump
       logical from_dump, add_pturb, first_bounce, track_shock      
 !                                                                       
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1) 
       parameter (iqn=17) 
-      real ycc,yccave
       character*1024 mlmodel_name
 !                                                                       
-      common /cc   / ycc(idim,iqn), yccave(iqn) 
-      common /ener1/ dq(idim), dunu(idim) 
       common /numb/ ncell, ncell1 
-      common /celle/ x(0:idim),v(0:idim),f(0:idim) 
-      common /cellc/ u(idim),rho(idim),ye(idim),q(idim) 
-      common /nustuff/ ynue(idim),ynueb(idim),ynux(idim),               &
-     &               unue(idim),unueb(idim),unux(idim)
       common /nuout/ rlumnue, rlumnueb, rlumnux,                        &
      &               enue, enueb, enux, e2nue, e2nueb, e2nux     
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /eosq/ pr(idim1), vsound(idim), u2(idim), vsmax 
-      common /freez/ ufreez(idim) 
-      common /carac/ deltam(idim), abar(idim) 
       common /core / dcore, xmcore 
       common /typef/ iextf, ieos 
       common /bstuf/ rb, dumrb, f1rb, f2rb 
       common /shock/ cq,cl 
-      common /tempe/ temp(idim) 
       common /cgas/ gamma 
       common /timej/ time, dt
       common /rshock/ shock_ind, shock_x
       common /pns/ pns_ind, pns_x
       common /propt/ dtime,tmax 
-      logical trapnue, trapnueb, trapnux 
-      common /trap/ trapnue(idim), trapnueb(idim), trapnux(idim) 
       common /ftrap/ ftrape,ftrapb,ftrapx 
       common /jtrap/ jtrape,jtrapb,jtrapx 
       common /ener2/ tkin, tterm 
       common /outp/ rout, p1out, p2out 
-      logical te(idim), teb(idim), tx(idim) 
-      equivalence(trapnue,te) 
-      equivalence(trapnueb,teb) 
-      equivalence(trapnux,tx) 
       common /nuprint/ nups,nupk,tacr 
       common /damping/ damp,dcell 
       common /neutm/ iflxlm, icvb 
       common /ufactor/ ufact,yefact 
-      logical ifign
-      common /ign  / ifign(idim) 
       !common /turb/ vturb2(idim),dmix(idim),alpha(4),bvf(idim)
       common /mlmod/ mlmodel_name
-      common /timei/ istep(idim),t0(idim),steps(idim),                  &
-      &               dum2v(idim)
-      common /cent/ dj(idim)
       common /dump/ from_dump
       common /idump/ idump
       common /interp/ mlin_grid_size
       common /bnc/ rlumnue_max, bounce_ntstep, bounce_time, &
                    add_pturb, first_bounce, track_shock
-      common /mlout/ pr_turb(idim1), output_preserve(idim)
       common /cpturb/ constant_pturb
+      common /burnp/ iburn, t9burn, rhoburn 
 !                                                                       
-      character*1024 filin,filout,outpath,eos_table   
+      character*1024 filin,filout,outpath,eos_table,ana_fields
+      character*8 magic
+      integer(8) ioff
       logical found_path   
 
       data pi4/12.56637d0/ 
@@ -5714,12 +5861,43 @@
       read(11,*) yefact 
       read(11,*)
       read(11,*) constant_Pturb
+!--optional entries: older setup files end above
+      read(11,*,iostat=ios)
+      if (ios.eq.0) read(11,*,iostat=ios) ml_threads, ml_interop
+      read(11,*,iostat=ios)
+      if (ios.eq.0) read(11,*,iostat=ios) ml_tolerance, ml_max_stale
+      ml_max_stale = max(ml_max_stale,1)
+      read(11,*,iostat=ios)
+      if (ios.eq.0) read(11,*,iostat=ios) resample_order
+      if (resample_order.ne.3) resample_order = 1
+      iburn   = 0
+      t9burn  = 0.08d0
+      rhoburn = 0.d0
+      read(11,*,iostat=ios)
+      if (ios.eq.0) read(11,*,iostat=ios) iburn, t9burn, rhoburn
+      idump_async = 0
+      read(11,*,iostat=ios)
+      if (ios.eq.0) read(11,*,iostat=ios) idump_async
+      async_dump = idump_async.eq.1
+      nrestart = 1
+      read(11,*,iostat=ios)
+      if (ios.eq.0) read(11,*,iostat=ios) nrestart
+      nrestart = max(nrestart,1)
+      ana_fields = 'none'
+      read(11,*,iostat=ios)
+      if (ios.eq.0) read(11,10,iostat=ios) ana_fields
+      call ana_parse(ana_fields)
 
       print*,'================ Setup ================'
       print*, 'Input File:            ', trim(filin)
       print*, 'Output File:           ', trim(filout)
       print*, 'ML Model Name:         ', trim(mlmodel_name)
       print*, 'Grid Size for ML:      ', mlin_grid_size
+      print*, 'ML Resampling order:   ', resample_order
+      if (iburn.eq.1) print*, 'Burning above T9, rho: ', t9burn, rhoburn
+      if (async_dump) print*, 'Dump writing:          ', 'asynchronous'
+      if (nrestart.gt.1) print*, 'Full dump every:       ', nrestart
+      if (ana_nfield.gt.0) print*, 'Analysis Output:       ', trim(filout)//'.ana'
       print*, 'Dump # to read:        ', idump
       print*, 'Dump time interval (s):', dtime
       print*, 'Max time (s):          ', tmax
@@ -5738,7 +5916,8 @@
 !--open binary file containing initial conditions                       
 !                                                                 
       open(60,file=trim(filin),form='unformatted') 
-      open(61,file=trim(filout),form='unformatted') 
+      call dump_open(s_full, 61, trim(filout))
+      if (ana_nfield.gt.0) call dump_open(s_ana, 62, trim(filout)//'.ana')
 !      
 !--find binary output path to write readable neutrino luminosities
 !      
@@ -5750,19 +5929,59 @@
       enddo
 
       open(59,file=trim(outpath)//"nu_lum.txt")    
+      open(57,file=trim(outpath)//"timing.txt")
 !
 !--adjust position pointer relative to individual binary file
 !             
-      read(60) idummy        
-      skip_dump=idump-idummy
+      read(60,iostat=ios) magic
+      if (ios.eq.0.and.magic.eq.'ANALYSIS') then
+         stop "ERROR: Input File is an analysis dump, restart from the full dump"
+      endif
       close(60)
 !                                                                       
-!--position pointer in binary file                                      
+!--look the dump up in the index written next to the file, if any
+!                                                                       
+      ioff = -1
+      open(63,file=trim(filin)//'.idx',status='old',iostat=ios)
+      if (ios.eq.0) then
+         do
+            read(63,*,iostat=ios) idummy, ioff
+            if (ios.ne.0) ioff = -1
+            if (ios.ne.0.or.idummy.eq.idump) exit
+         enddo
+         close(63)
+      endif
+!                                                                       
+!--jump to the dump with stream access (past the record marker), and
+!--size the grid arrays from its number of cells
+!                                                                       
+      if (ioff.ge.0) then
+         open(60,file=trim(filin),form='unformatted',access='stream') 
+         read(60,pos=ioff+5,iostat=ios) idummy, nc 
+         if (ios.eq.0.and.idummy.eq.idump) then
+            print*, 'Dump found in the index at byte', ioff
+            read(60,pos=ioff+5) 
+            goto 15
+         endif
+         print*, 'WARNING: index does not match ',trim(filin),', skipping dumps'
+         close(60)
+      endif
+!                                                                       
+!--otherwise position pointer in binary file by reading the headers
+!--up to the dump: with Full Output > 1 the dump numbers of the file
+!--are not consecutive
 !               
       open(60,file=trim(filin),form='unformatted')        
-      do i=1,skip_dump
-         read(60) idummy                  
+      do
+         read(60,iostat=ios) idummy, nc
+         if (ios.ne.0) then
+            print*, 'dump', idump, ' is not in ', trim(filin)
+            stop "ERROR: Dump # to read not found in Input File"
+         endif
+         if (idummy.eq.idump) exit
       enddo 
+      backspace(60) 
+   15 call grid_alloc(nc) 
 !                                                                       
 !--read data                                                            
 !       
@@ -5777,7 +5996,8 @@
             (unue(i),i=1,nc),(unueb(i),i=1,nc),(unux(i),i=1,nc),       &
             (ufreez(i),i=1,nc),(pr(i),i=1,nc),(u2(i),i=1,nc),          &
             (dj(i),i=1,nc),                                            &
-            (te(i),i=1,nc),(teb(i),i=1,nc),(tx(i),i=1,nc),             &
+            (trapnue(i),i=1,nc),(trapnueb(i),i=1,nc),                  &
+            (trapnux(i),i=1,nc),                                       &
             (steps(i),i=1,nc),((ycc(i,j),j=1,iqn),i=1,nc),             &
             (vsound(i),i=1,nc),(pr_turb(i),i=1,nc)             
 !        (vturb2(i),i=1,nc),                                          &
@@ -5872,57 +6092,41 @@
 !                                                             *         
 !**************************************************************         
 !                                                                       
+      use grid, only: idim, ycc, yccave, dq, dunu, x, v, f, u, rho, ye, &
+                      q, ynue, ynueb, ynux, unue, unueb, unux, xp, xn, &
+                      eta, ifleos, pr, vsound, u2, vsmax, ufreez, temp, &
+                      trapnue, trapnueb, trapnux, deltam, abar, istep, &
+                      t0, steps, dum2v, dj, pr_turb, output_preserve, &
+                      prnu
+      use dumpio, only: dump_begin, stage, dump_write, s_full, s_ana, &
+                        nrestart, ana_nfield, ana_field
       implicit double precision (a-h,o-z) 
 !                                                                       
       integer jtrape,jtrapb,jtrapx 
-      real    ycc,yccave 
       logical from_dump, add_pturb, first_bounce, track_shock      
-      logical trapnue, trapnueb, trapnux 
 !                                                                       
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1) 
       parameter (iqn=17) 
 !                                                                       
-      common /cc   / ycc(idim,iqn), yccave(iqn) 
-      common /ener1/ dq(idim), dunu(idim) 
       common /numb/ ncell, ncell1
-      common /celle/ x(0:idim),v(0:idim),f(0:idim) 
-      common /cellc/ u(idim),rho(idim),ye(idim),q(idim) 
-      common /nustuff/ ynue(idim),ynueb(idim),ynux(idim),               &
-     &               unue(idim),unueb(idim),unux(idim)
       common /nuout/ rlumnue, rlumnueb, rlumnux,                        &
      &               enue, enueb, enux, e2nue, e2nueb, e2nux
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
-      common /freez/ ufreez(idim) 
       common /core / dcore, xmcore 
       common /typef/ iextf, ieos 
       common /bstuf/ rb, dumrb, f1rb, f2rb 
-      common /tempe/ temp(idim) 
       common /cgas / gamma 
       common /timej / time, dt 
       common /rshock/ shock_ind, shock_x
       common /pns/ pns_ind, pns_x      
-      common /trap/ trapnue(idim), trapnueb(idim), trapnux(idim) 
       common /ftrap/ ftrape,ftrapb,ftrapx 
       common /jtrap/ jtrape,jtrapb,jtrapx 
-      common /carac/ deltam(idim), abar(idim) 
       common /ener2/ tkin, tterm
-      common /timei/ istep(idim),t0(idim),steps(idim),                  &
-     &               dum2v(idim)
-      common /cent/ dj(idim)
       common /dump/ from_dump
       common /idump/ idump
+      common /propt/ dtime,tmax 
       common /bnc/ rlumnue_max, bounce_ntstep, bounce_time, &
                    add_pturb, first_bounce, track_shock
-      common /mlout/ pr_turb(idim1), output_preserve(idim)
-      common /eosnu / prnu(idim1)
       !common /turb/ vturb2(idim),dmix(idim),alpha(4),bvf(idim) 
-      logical te(idim), teb(idim), tx(idim) 
       dimension uint(idim), s(idim) 
-      equivalence(trapnue,te) 
-      equivalence(trapnueb,teb) 
-      equivalence(trapnux,tx) 
       
       from_dump=.true.
 !                                                                       
@@ -5944,21 +6148,100 @@
       t   = time 
       nc  = ncell 
 !       
-      write(lu) idump,nc,t,xmcore,rb,ftrape,ftrapb,ftrapx,             &
-            pns_ind,pns_x,shock_ind,shock_x,                           &
-            bounce_time,from_dump,rlumnue,rlumnueb,rlumnux,            &
-            (x(i),i=0,nc),(v(i),i=0,nc),(q(i),i=1,nc),(dq(i),i=1,nc),  &
-            (uint(i),i=1,nc),(deltam(i),i=1,nc),(abar(i),i=1,nc),      &
-            (rho(i),i=1,nc),(temp(i),i=1,nc),(ye(i),i=1,nc),           &
-            (xp(i),i=1,nc),(xn(i),i=1,nc),(ifleos(i),i=1,nc),          &
-            (ynue(i),i=1,nc),(ynueb(i),i=1,nc),(ynux(i),i=1,nc),       &
-            (unue(i),i=1,nc),(unueb(i),i=1,nc),(unux(i),i=1,nc),       &
-            (ufreez(i),i=1,nc),(pr(i),i=1,nc),(s(i),i=1,nc),           &
-            (dj(i),i=1,nc),                                            &
-            (te(i),i=1,nc),(teb(i),i=1,nc),(tx(i),i=1,nc),             &
-            (steps(i),i=1,nc),((ycc(i,j),j=1,iqn),i=1,nc),             &
-            (vsound(i),i=1,nc),(pr_turb(i),i=1,nc),(prnu(i),i=1,nc)
-!          (vturb2(i),i=1,nc),                                          &
+!--full dump, every nrestart intervals and at the end: stage the record
+!--(same layout as a plain write of the list below) and write it, in the
+!--background if async_dump is set
+!       
+      if (mod(idump,nrestart).ne.0.and.time.lt.tmax) goto 20
+!     write(lu) idump,nc,t,xmcore,rb,ftrape,ftrapb,ftrapx,             &
+!           pns_ind,pns_x,shock_ind,shock_x,                           &
+!           bounce_time,from_dump,rlumnue,rlumnueb,rlumnux,            &
+!           (x(i),i=0,nc),(v(i),i=0,nc),(q(i),i=1,nc),(dq(i),i=1,nc),  &
+!           (uint(i),i=1,nc),(deltam(i),i=1,nc),(abar(i),i=1,nc),      &
+!           (rho(i),i=1,nc),(temp(i),i=1,nc),(ye(i),i=1,nc),           &
+!           (xp(i),i=1,nc),(xn(i),i=1,nc),(ifleos(i),i=1,nc),          &
+!           (ynue(i),i=1,nc),(ynueb(i),i=1,nc),(ynux(i),i=1,nc),       &
+!           (unue(i),i=1,nc),(unueb(i),i=1,nc),(unux(i),i=1,nc),       &
+!           (ufreez(i),i=1,nc),(pr(i),i=1,nc),(s(i),i=1,nc),           &
+!           (dj(i),i=1,nc),                                            &
+!           (trapnue(i),i=1,nc),(trapnueb(i),i=1,nc),                  &
+!           (trapnux(i),i=1,nc),                                       &
+!           (steps(i),i=1,nc),((ycc(i,j),j=1,iqn),i=1,nc),             &
+!           (vsound(i),i=1,nc),(pr_turb(i),i=1,nc),(prnu(i),i=1,nc)
+!
+      call dump_begin(s_full)
+      call stage(idump);   call stage(nc);      call stage(t)
+      call stage(xmcore);  call stage(rb)
+      call stage(ftrape);  call stage(ftrapb);  call stage(ftrapx)
+      call stage(pns_ind); call stage(pns_x)
+      call stage(shock_ind); call stage(shock_x)
+      call stage(bounce_time); call stage(from_dump)
+      call stage(rlumnue); call stage(rlumnueb); call stage(rlumnux)
+      call stage(x(0:nc)); call stage(v(0:nc))
+      call stage(q(1:nc)); call stage(dq(1:nc)); call stage(uint(1:nc))
+      call stage(deltam(1:nc)); call stage(abar(1:nc))
+      call stage(rho(1:nc)); call stage(temp(1:nc)); call stage(ye(1:nc))
+      call stage(xp(1:nc)); call stage(xn(1:nc)); call stage(ifleos(1:nc))
+      call stage(ynue(1:nc)); call stage(ynueb(1:nc)); call stage(ynux(1:nc))
+      call stage(unue(1:nc)); call stage(unueb(1:nc)); call stage(unux(1:nc))
+      call stage(ufreez(1:nc)); call stage(pr(1:nc)); call stage(s(1:nc))
+      call stage(dj(1:nc))
+      call stage(trapnue(1:nc)); call stage(trapnueb(1:nc))
+      call stage(trapnux(1:nc))
+      call stage(steps(1:nc)); call stage(transpose(ycc(1:nc,1:iqn)))
+      call stage(vsound(1:nc)); call stage(pr_turb(1:nc))
+      call stage(prnu(1:nc))
+      call dump_write(lu, idump)
+!
+!--analysis dump, every interval: header, field names and the fields
+!--in float32 (x, v from 0 to nc; ycc as in the full dump)
+!
+   20 if (ana_nfield.eq.0) return
+      call dump_begin(s_ana)
+      call stage(idump);   call stage(nc);      call stage(t)
+      call stage(xmcore);  call stage(rb)
+      call stage(ftrape);  call stage(ftrapb);  call stage(ftrapx)
+      call stage(pns_ind); call stage(pns_x)
+      call stage(shock_ind); call stage(shock_x)
+      call stage(bounce_time); call stage(from_dump)
+      call stage(rlumnue); call stage(rlumnueb); call stage(rlumnux)
+      call stage(ana_nfield)
+      do k=1,ana_nfield
+         call stage(ana_field(k))
+      enddo
+      do k=1,ana_nfield
+         select case (ana_field(k))
+         case ('x');       call stage(real(x(0:nc)))
+         case ('v');       call stage(real(v(0:nc)))
+         case ('q');       call stage(real(q(1:nc)))
+         case ('dq');      call stage(real(dq(1:nc)))
+         case ('u');       call stage(real(uint(1:nc)))
+         case ('deltam');  call stage(real(deltam(1:nc)))
+         case ('abar');    call stage(real(abar(1:nc)))
+         case ('rho');     call stage(real(rho(1:nc)))
+         case ('temp');    call stage(real(temp(1:nc)))
+         case ('ye');      call stage(real(ye(1:nc)))
+         case ('xp');      call stage(real(xp(1:nc)))
+         case ('xn');      call stage(real(xn(1:nc)))
+         case ('ifleos');  call stage(real(ifleos(1:nc)))
+         case ('ynue');    call stage(real(ynue(1:nc)))
+         case ('ynueb');   call stage(real(ynueb(1:nc)))
+         case ('ynux');    call stage(real(ynux(1:nc)))
+         case ('unue');    call stage(real(unue(1:nc)))
+         case ('unueb');   call stage(real(unueb(1:nc)))
+         case ('unux');    call stage(real(unux(1:nc)))
+         case ('ufreez');  call stage(real(ufreez(1:nc)))
+         case ('pr');      call stage(real(pr(1:nc)))
+         case ('s');       call stage(real(s(1:nc)))
+         case ('dj');      call stage(real(dj(1:nc)))
+         case ('steps');   call stage(real(steps(1:nc)))
+         case ('ycc');     call stage(transpose(ycc(1:nc,1:iqn)))
+         case ('vsound');  call stage(real(vsound(1:nc)))
+         case ('pr_turb'); call stage(real(pr_turb(1:nc)))
+         case ('prnu');    call stage(real(prnu(1:nc)))
+         end select
+      enddo
+      call dump_write(62, idump)
 !
       return 
 !                                                                       
@@ -6146,6 +6429,20 @@
 !                                                           *           
 !************************************************************           
 !                                                                       
+      use profiler, only: prof_start, prof_stop, prof_print, p_burn, &
+                          p_eosflg
+      use grid, only: idim, ebetaeq, pbetaeq, deltam, abar, u, rho, ye, &
+                      q, x, v, f, pr, vsound, u2, vsmax, etanue, etanueb, &
+                      etanux, ufreez, ynue, ynueb, ynux, unue, unueb, &
+                      unux, xold, vold, rhold, prold, tempold, yeold, &
+                      xnold, xpold, xp, xn, eta, ifleos, xpf, pvar2, &
+                      pvar3, pvar4, temp, xmu, trapnue, trapnueb, &
+                      trapnux, dumx, dumv, dumu, dumye, dumynue, &
+                      dumynueb, dumynux, dumunue, dumunueb, dumunux, f1v, &
+                      f1u, f1ye, f2v, f2u, f2ye, f1ynue, f1ynueb, f1ynux, &
+                      f1unue, f1unueb, f1unux, f2ynue, f2ynueb, f2ynux, &
+                      f2unue, f2unueb, f2unux, istep, t0, steps, dum2v, &
+                      dnue, dnueb, dnux
       implicit double precision (a-h,o-z) 
 !                                                                       
       integer jtrape,jtrapb,jtrapx, ntstep, ind, mlin_grid_size
@@ -6153,66 +6450,37 @@
       character*1024 mlmodel_name, rho_file, x_file      
       character*10 frmtx
       character*11 frmtrho
-!                                                                       
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1) 
 !                                                                       
       logical ifirst, reset(idim)
 !                                                                       
-      logical ebetaeq, pbetaeq 
-      common /beta/ ebetaeq(idim), pbetaeq(idim) 
       common /bstuf/ rb, dumrb, f1rb, f2rb 
-      common /carac/ deltam(idim), abar(idim) 
-      common /cellc/ u(idim),rho(idim),ye(idim),q(idim) 
-      common /celle/ x(0:idim),v(0:idim),f(0:idim) 
       common /cgas / gamma 
       common /const/ gg, clight, arad, bigr, xsecnn, xsecne 
       common /core / dcore, xmcore 
       common /ener2/ tkin, tterm 
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
       common /epcap/ betafac, c2cu, c3cu 
-      common /etnus/ etanue(idim),etanueb(idim),etanux(idim) 
-      common /freez/ ufreez(idim) 
       common /ftrap/ ftrape,ftrapb,ftrapx 
       common /jtrap/ jtrape,jtrapb,jtrapx 
       common /numb / ncell, ncell1 
-      common /nustuff/ ynue(idim),ynueb(idim),ynux(idim),               &
-                       unue(idim),unueb(idim),unux(idim)                  
-      common /prev / xold(0:idim),vold(0:idim),rhold(idim),             &
-                     prold(idim), tempold(idim), yeold(idim),            &
-                     xnold(idim), xpold(idim)                            
       common /shock/ cq,cl 
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /swesty/ xpf(idim), pvar2(idim), pvar3(idim), pvar4(idim) 
-      common /tempe/ temp(idim) 
-      common /therm/ xmu(idim) 
       common /timej / time, dt
       common /rshock/ shock_ind, shock_x
       common /pns/ pns_ind, pns_x
+      common /eostim/ eos_time, eos_time_last, eos_calls, eos_threads, &
+                      eos_cells, eos_iters, eos_first, eos_bisect
+      integer eos_calls, eos_threads
+      common /burnp/ iburn, t9burn, rhoburn 
 
-      logical trapnue, trapnueb, trapnux, print_endstep 
-      common /trap / trapnue(idim), trapnueb(idim), trapnux(idim) 
+      logical print_endstep
       common /typef/ iextf, ieos 
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /unit2/ utemp, utmev, ufoe, umevnuc, umeverg 
-      common /dum  / dumx(0:idim),dumv(0:idim),dumu(idim),              &
-                     dumye(idim)                                        
-      common /dum2 / dumynue(idim),dumynueb(idim),dumynux(idim),        &
-                     dumunue(idim),dumunueb(idim),dumunux(idim)         
-      common /f1   / f1v(0:idim),f1u(idim),f1ye(idim) 
-      common /f2   / f2v(0:idim),f2u(idim),f2ye(idim) 
       !common /fturb/ geff(idim), fmix1(idim), fmix2(idim) 
       !common /turb/ vturb2(idim),dmix(idim),alpha(4),bvf(idim) 
       !common /dturb/ dumvt2(idim) 
-      common /f1nu / f1ynue(idim),f1ynueb(idim),f1ynux(idim),           &
-                     f1unue(idim),f1unueb(idim),f1unux(idim)            
-      common /f2nu / f2ynue(idim),f2ynueb(idim),f2ynux(idim),           &
-                     f2unue(idim),f2unueb(idim),f2unux(idim)            
       common /nuout/ rlumnue, rlumnueb, rlumnux,                        &
                      enue, enueb, enux, e2nue, e2nueb, e2nux            
 !                                                                       
-      common /timei/ istep(idim),t0(idim),steps(idim),                  &
-                     dum2v(idim)                                        
       common /propt/ dtime,tmax 
       common /nsat/ satc,xtime 
       common /nuprint/ nups,nupk,tacr 
@@ -6222,7 +6490,6 @@
       common /bnc/ rlumnue_max, bounce_ntstep, bounce_time, &
                    add_pturb, first_bounce, track_shock
       common /interp/ mlin_grid_size
-      common /dnus/ dnue(idim),dnueb(idim),dnux(idim)
 
       save ifirst
       data ifirst/.true./      
@@ -6548,14 +6815,16 @@
 !                                                                       
 !--burning                                                              
 !                                                                       
-         iburn=0 
-         !print *, 'xxxxxx',iburn                                       
          if(iburn.eq.1)then 
             iflg=0 
             !print *, 'call burn - time',time,steps(1)                  
+            call prof_start(p_burn)
             call burn(ncell,iflg,tfull,steps(1)) 
+            call prof_stop(p_burn)
             if(iflg.eq.1)then 
+               call prof_start(p_eosflg)
                call eosflg(ncell,rho,ye,u,f1ye,f1u) 
+               call prof_stop(p_eosflg)
                do i=1,ncell 
                   tempold(i) = temp(i) 
                   rhold(i)   = rho(i) 
@@ -6596,7 +6865,9 @@
 !--flag particles according to physical state                           
 !
          if (ieos.ne.5.and.ieos.ne.6) then     
+            call prof_start(p_eosflg)
             call eosflg(ncell,rho,ye,u,f1ye,f1u)
+            call prof_stop(p_eosflg)
          endif          
 !                                                                       
 !--do various neutrino flagging and checking                            
@@ -6661,6 +6932,8 @@
       520         format(A,I12,A) 
       501         format(A,1p,E10.3)
       500         format(A,1p,E10.3,A,E10.3,E13.3)
+      502         format(A,1p,E10.3,A,E10.3,' threads',I4)
+      503         format(A,1p,E10.3,A,E10.3,' bisections',I8)
                   print 520,'<',ntstep,                                       &
                   '          > ----------------------------------'            
                   write(*,500)'[    time/tmax, dt (s) ]',                     &
@@ -6669,6 +6942,13 @@
                   if (first_bounce.eqv..true.) then
                   write(*,501)'[    bounce time (s)   ]', bounce_time*utime                                          
                   endif            
+                  if (eos_calls.gt.0) then
+                  write(*,502)'[ EOS (ms): last, mean ]', eos_time_last*1.d3, &
+                              '    ',eos_time/eos_calls*1.d3,eos_threads
+                  write(*,503)'[ EOS iter/cell, warm  ]', eos_iters/eos_cells, &
+                              '    ',eos_first/eos_cells,int(eos_bisect)
+                  endif
+                  call prof_print
 !KLUDGE on
             sumgrav =0.0d0
             sumint = 0.0d0
@@ -6698,8 +6978,8 @@
 
       subroutine write_value(ncell,a,b,c,d,xfile)
        
+        use grid, only: idim
         implicit double precision (a-h,o-z) 
-        parameter (idim=10000)
 
         double precision :: a(0:idim), b(idim),c(0:ncell), d(idim)
         character*30     :: xfile
@@ -6936,15 +7216,16 @@
 !                                                                *      
 !  Nuclear network subroutine.                                   *      
 !  This subroutine uses a 14 elements alpha network from fkt     *      
+!  The network is integrated for every burning cell by burncell  *      
 !                                                                *      
 !*****************************************************************      
 !                                                                       
-      parameter (idim=10000) 
-      parameter (idim1 = idim+1) 
+      use grid, only: idim, ycc, yccave, deltam, abar, u, rho, ye, q, xp, &
+                      xn, eta, ifleos, xalpha, xheavy, yeh, pr, vsound, &
+                      u2, vsmax, ifign, xmue, xmuhat, ufreez, temp
       parameter (iqn=17) 
       parameter (nel=14) 
 !                                                                       
-      integer ifleos 
       double precision pf(7,17),pb(7,14),rrat(17),rlam(15),ya(15),      &
                        def(14),ff(14),yold(15),t9,rhoi,tburn,dtold,     &
                        dtburn,dfmin,dfm,err,eps,dtsec,enrg,             &
@@ -6952,36 +7233,25 @@
                        yel,coefg,coeft,ar(14),ar11,ui,tempi,            &
                        abari,yei,rhoit,xpn,etai,time                    
                                                                         
-      double precision deltam,abar,u,rho,ye,q,xp,xn,eta,xalpha,         &
-                       xheavy,yeh,pr,vsound,u2,vsmax,temp,amas,znum                 
+      double precision amas,znum
       double precision umass,udist,udens,utime,                         &
                        uergg,uergcc,gamma,uvit,uit,deltat                           
-      double precision t9nse, rhoswe, rhonue, rhonux, xmue, xmuhat                                                       
+      double precision t9nse, rhoswe, rhonue, rhonux
       double precision ptot,cs,yehi,stot,ufact,yefact 
-      double precision ufreez 
-      real ycc,yccave
 !                                                                       
       common /ceos / amas(iqn), znum(iqn) 
-      common /cc   / ycc(idim,iqn), yccave(iqn) 
-      common /carac/ deltam(idim), abar(idim) 
-      common /cellc/ u(idim),rho(idim),ye(idim),q(idim) 
-      common /state/ xp(idim), xn(idim), eta(idim), ifleos(idim) 
-      common /hnucl/ xalpha(idim),xheavy(idim), yeh(idim) 
-      common /eosq / pr(idim1), vsound(idim), u2(idim), vsmax 
-      logical ifign 
-      common /ign  / ifign(idim) 
       common /units/ umass, udist, udens, utime, uergg, uergcc 
       common /cgas/ gamma 
       common /cases/ t9nse, rhoswe, rhonue, rhonux 
-      common /cpots/ xmue(idim), xmuhat(idim) 
-      common /freez/ ufreez(idim) 
       common /ufactor/ ufact,yefact 
                                                                         
       common /logun/ iprint, iterm, idisk1, idisk2, idisk3 
       common /nucen/ totnuc, stepnuc 
-      common /tempe/ temp(idim) 
                                                                         
       common /rateinfo/ ratforward(7,17),ratbackward(7,14) 
+      common /burnp/ iburn, t9burn, rhoburn 
+      double precision t9burn, rhoburn 
+      integer list(idim) 
 !                                                                       
       logical first 
 !                                                                       
@@ -7050,139 +7320,196 @@
 !                                                                       
       stepnuc=0.0 
       dtsec=deltat*utime 
-      uvit=udist/utime 
-      errmax=0. 
-      input=2 
 !                                                                       
-!--compute the burn for all particles                                   
+!--skip the cells that are not ignited, colder than t9burn, less     
+!--dense than rhoburn, or already in NSE (ifleos.ne.1), and burn the    
+!--rest; the cells are independent and, with OpenMP, handed out to     
+!--the threads dynamically as their number of network steps varies     
 !                                                                       
+      nburn=0 
       do icell=1,ncell 
-         if(.not.ifign(icell))go to 95 
-         t9=temp(icell) 
-         if(t9.lt.0.08)go to 95 
-!         if(t9.lt.0.12)go to 95                                        
-         iflg=1 
-         rhoi=rho(icell)*udens 
-         ui=u(icell)*uergg 
-         do iel=1,nel 
-            yold(iel)=0.d0 
-            ya(iel)=0.d0 
-            ya(iel)=dble(ycc(icell,iel+3)) 
-            yinput(iel)=ya(iel) 
-         enddo 
-         tburn=0.0 
+         if(ifign(icell).and.temp(icell).ge.t9burn.and.                 &
+            rho(icell)*udens.ge.rhoburn.and.ifleos(icell).eq.1)then     
+            nburn=nburn+1 
+            list(nburn)=icell 
+         endif 
+      enddo 
+      if(nburn.gt.0)iflg=1 
+!                                                                       
+!$omp parallel do schedule(dynamic) private(icell,enrg)                &
+!$omp reduction(+:stepnuc)
+      do ib=1,nburn 
+         icell=list(ib) 
+         call burncell(icell,dtsec,pf,pb,enrg) 
+         stepnuc=stepnuc + enrg*deltam(icell) 
+      enddo 
+!$omp end parallel do
+      totnuc=totnuc + stepnuc 
+      write(*,*)'total nuc. en. generated so far : ',totnuc 
+      write(*,*)'total nuc. en. generated this dt: ',stepnuc 
+      write(80,*)time,stepnuc 
+      call flush(80) 
+!                                                                       
+      return 
+      END 
+
+      subroutine burncell(icell,dtsec,pf,pb,enrg) 
+!*****************************************************************      
+!                                                                *      
+!  Integrates the alpha network of burn over dtsec (s) for one   *      
+!  cell, updating its composition, u, T, pr and vsound; enrg     *      
+!  returns the nuclear energy generated (code units per mass).   *      
+!  All scratch is local, so cells can be burnt concurrently.     *      
+!                                                                *      
+!*****************************************************************      
+!                                                                       
+      use grid, only: ycc, yccave, deltam, abar, u, rho, ye, q, xp, xn, &
+                      eta, ifleos, pr, vsound, u2, vsmax, ufreez, temp
+      parameter (iqn=17) 
+      parameter (nel=14) 
+!                                                                       
+      double precision pf(7,17),pb(7,14),rrat(17),rlam(15),ya(15),      &
+                       def(14),ff(14),yold(15),t9,rhoi,tburn,dtold,     &
+                       dtburn,dfmin,dfm,err,eps,dtsec,enrg,             &
+                       scale,a(14),yinput(15),zn(14),                   &
+                       yel,coefg,coeft,ar(14),ar11,ui,tempi,            &
+                       abari,yei,rhoit,xpn,etai                         
+                                                                        
+      double precision amas,znum
+      double precision umass,udist,udens,utime,                         &
+                       uergg,uergcc,uvit,uit                            
+      double precision t9nse, rhoswe, rhonue, rhonux 
+      double precision ptot,cs,stot,ufact,yefact 
+!                                                                       
+      common /ceos / amas(iqn), znum(iqn) 
+      common /units/ umass, udist, udens, utime, uergg, uergcc 
+      common /cases/ t9nse, rhoswe, rhonue, rhonux 
+      common /ufactor/ ufact,yefact 
+!                                                                       
+      data eps/1.d-3/ , maxstep/10000/ 
+      data a/4.,12.,16.,20.,24.,28.,32.,36.,40.,44.,48.,52.,            &
+             56.,60./                                                   
+      data zn/2.,6.,8.,10.,12.,14.,16.,18.,20.,22.,24.,26.,28.,30./ 
+!                                                                       
+      uvit=udist/utime 
+      enrg=0.d0 
+      dtburn=0.d0 
+      ya(15)=0.d0 
+      yold(15)=0.d0 
+      t9=temp(icell) 
+      rhoi=rho(icell)*udens 
+      ui=u(icell)*uergg 
+      do iel=1,nel 
+         yold(iel)=0.d0 
+         ya(iel)=0.d0 
+         ya(iel)=dble(ycc(icell,iel+3)) 
+         yinput(iel)=ya(iel) 
+      enddo 
+      tburn=0.0 
 !                                                                       
 !--begin of new time step ka                                            
 !                                                                       
-         do ka=1,maxstep 
-            dtold=dtburn 
+      do ka=1,maxstep 
+         dtold=dtburn 
 !                                                                       
 !--calculate rates for temperature                                      
 !                                                                       
-            call genpar(rhoi,t9,a,zn,ya,yel,ar,ar11,coefg,coeft) 
-            call rates(icell,t9,pf,pb,rrat,rlam,yel,coefg,coeft,a,ar,   &
-                       ar11,zn)                                         
+         call genpar(rhoi,t9,a,zn,ya,yel,ar,ar11,coefg,coeft) 
+         call rates(icell,t9,pf,pb,rrat,rlam,yel,coefg,coeft,a,ar,   &
+                    ar11,zn)                                         
 !                                                                       
 !--compute ydot(i)=ff(i) : system of differential equations             
 !  with present ya(i) rho and rates                                     
 !                                                                       
-            call derivn(ya,rhoi,ff,rrat,rlam) 
+         call derivn(ya,rhoi,ff,rrat,rlam) 
 !                                                                       
 !--determine time step from dt=0.1*min (ya(i)/ydot(i))                  
 !  for first time step (ka=1) take ydot=ff                              
 !  for further time steps take ydot=(ya-yold)/dtold                     
 !                                                                       
-            dfmin=1.d20 
-            if(ka.ne.1) goto 60 
-            do 50 i=1,nel 
-               if(ya(i).lt.eps.or.ff(i).eq.0.0d0) goto 50 
-               dfm=abs(ya(i)/ff(i)) 
-               dfmin=min(dfm,dfmin) 
-   50       continue 
-            goto 80 
-   60       do 70 i=1,nel 
-               def(i)=(ya(i)-yold(i)) 
-               if(ya(i).lt.eps.or.def(i).eq.0.0) goto 70 
-               dfm=abs(ya(i)/def(i))*dtold 
-               dfmin=min(dfmin,dfm) 
-   70       continue 
-   80       dtburn=7.0d-2*dfmin 
-            dtbold=dtburn 
-            dtburn=min(dtburn,dtsec-tburn) 
+         dfmin=1.d20 
+         if(ka.ne.1) goto 60 
+         do 50 i=1,nel 
+            if(ya(i).lt.eps.or.ff(i).eq.0.0d0) goto 50 
+            dfm=abs(ya(i)/ff(i)) 
+            dfmin=min(dfm,dfmin) 
+   50    continue 
+         goto 80 
+   60    do 70 i=1,nel 
+            def(i)=(ya(i)-yold(i)) 
+            if(ya(i).lt.eps.or.def(i).eq.0.0) goto 70 
+            dfm=abs(ya(i)/def(i))*dtold 
+            dfmin=min(dfmin,dfm) 
+   70    continue 
+   80    dtburn=7.0d-2*dfmin 
+         dtbold=dtburn 
+         dtburn=min(dtburn,dtsec-tburn) 
 !                                                                       
 !--reset yold(i) by updating from last time step                        
 !                                                                       
-   85       do i=1,nel 
-               yold(i)=ya(i) 
-            enddo 
+   85    do i=1,nel 
+            yold(i)=ya(i) 
+         enddo 
 !                                                                       
 !--calculate new abundances at t+dt                                     
 !                                                                       
-   35       continue 
-            call newab(yold,ya,rhoi,rrat,rlam,ff,dtburn,err,eps) 
-            if(abs(err).gt.abs(errmax))errmax=err 
-            tburn=tburn+dtburn 
-            call epsb(yold,ya,nel,enrg) 
+   35    continue 
+         call newab(yold,ya,rhoi,rrat,rlam,ff,dtburn,err,eps) 
+         tburn=tburn+dtburn 
+         call epsb(yold,ya,nel,enrg) 
 !                                                                       
 !--if energy has been generated, compute new T                          
 !                                                                       
-            ui = ui + enrg 
-            uit=ui/uergg 
-            rhoit=rhoi/udens 
-            tempi=t9 
-            yei=yel 
-            abari=0.d0 
-            do j=4,iqn 
-               abari=abari+dble(ya(j-3))*amas(j)**2 
-            enddo 
-            if(tburn.ge.dtsec)then 
-               iout=1 
-               call rootemp2(icell,rhoit,uit,tempi,yei,abari,           &
-                             ptot,cs,etai,stot)                                  
-               t9=tempi 
-               pr(icell)=ptot/uergcc 
-               vsound(icell)=cs/uvit 
-               abar(icell)=abari 
-               go to 92 
-            else 
-               iout=0 
-               if (tempi.gt.t9nse+1.) then 
-                  ufreez(icell)=-ufact*8.7d2 
-                  temp(icell)=tempi 
-                  goto 95 
-               else 
-                  call rootemp2(icell,rhoit,uit,tempi,yei,abari,        &
-                                ptot,cs,etai,stot)                               
-                  t9=tempi 
-               endif 
-            end if 
+         ui = ui + enrg 
+         uit=ui/uergg 
+         rhoit=rhoi/udens 
+         tempi=t9 
+         yei=yel 
+         abari=0.d0 
+         do j=4,iqn 
+            abari=abari+dble(ya(j-3))*amas(j)**2 
          enddo 
-         write(*,*)'maximum burning steps exceeded! ' 
-   92    continue 
+         if(tburn.ge.dtsec)then 
+            iout=1 
+            call rootemp2(icell,rhoit,uit,tempi,yei,abari,           &
+                          ptot,cs,etai,stot)                                  
+            t9=tempi 
+            pr(icell)=ptot/uergcc 
+            vsound(icell)=cs/uvit 
+            abar(icell)=abari 
+            go to 92 
+         else 
+            iout=0 
+            if (tempi.gt.t9nse+1.) then 
+               ufreez(icell)=-ufact*8.7d2 
+               temp(icell)=tempi 
+               enrg=0.d0 
+               return 
+            else 
+               call rootemp2(icell,rhoit,uit,tempi,yei,abari,        &
+                             ptot,cs,etai,stot)                               
+               t9=tempi 
+            endif 
+         end if 
+      enddo 
+      write(*,*)'maximum burning steps exceeded! ' 
+   92 continue 
 !                                                                       
 !--update particle quantities (rescale composition)                     
 !                                                                       
-         call epsb(yinput,ya,nel,enrg) 
-         enrg=enrg/uergg 
-         u(icell)=u(icell) + enrg 
-         temp(icell)=t9 
-         scale=1./(1.+err) 
-         xpn=1.d0 
-         do i=1,nel 
-            ycc(icell,i+3)=real(scale*ya(i)) 
-            xpn=xpn-scale*ya(i)*amas(i+3) 
-         enddo 
-         xpn=max(0.d0,xpn) 
-         xp(icell)=ye(icell)*xpn 
-         xn(icell)=(1.d0-ye(icell))*xpn 
-         stepnuc=stepnuc + enrg*deltam(icell) 
-   95    continue 
+      call epsb(yinput,ya,nel,enrg) 
+      enrg=enrg/uergg 
+      u(icell)=u(icell) + enrg 
+      temp(icell)=t9 
+      scale=1./(1.+err) 
+      xpn=1.d0 
+      do i=1,nel 
+         ycc(icell,i+3)=real(scale*ya(i)) 
+         xpn=xpn-scale*ya(i)*amas(i+3) 
       enddo 
-      totnuc=totnuc + stepnuc 
-      write(*,*)'total nuc. en. generated so far : ',totnuc 
-      write(*,*)'total nuc. en. generated this dt: ',stepnuc 
-      write(80,*)time,stepnuc 
-      call flush(80) 
+      xpn=max(0.d0,xpn) 
+      xp(icell)=ye(icell)*xpn 
+      xn(icell)=(1.d0-ye(icell))*xpn 
 !                                                                       
       return 
       END 
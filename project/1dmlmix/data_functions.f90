@@ -2,6 +2,9 @@ module data_functions
     use iso_fortran_env, only: dp => real64
     implicit none
 
+    ! Order of resample(): 1 - linear, 3 - limited cubic (set in 'setup')
+    integer :: resample_order = 1
+
     contains
 
     function linspace(start,end,num,endpoint,step) result(samples)
@@ -100,5 +103,100 @@ module data_functions
 
     end function interpolate
 
-end module
 
+    subroutine resample_weights(xs, ns, nt, ind, w)
+        ! Computes, in a single sweep, the brackets and weights that map
+        ! the monotone grid xs(ns) onto nt evenly spaced points over
+        ! [xs(1), xs(ns)]. The same ind/w are then applied to every field
+        ! sampled on xs with resample().
+        !
+        ! ind(1,j) - left end k of the bracket xs(k) <= t_j <= xs(k+1)
+        ! ind(2,j) - first point of the 4-point stencil weighted by w(:,j)
+
+        integer,  intent(in)  :: ns, nt
+        real(dp), intent(in)  :: xs(ns)
+        integer,  intent(out) :: ind(2,nt)
+        real(dp), intent(out) :: w(4,nt)
+
+        integer  :: i, j, k, s
+        real(dp) :: t, step, f
+
+        w = 0.0_dp
+        if (ns.lt.2) then
+            ind    = 1
+            w(1,:) = 1.0_dp
+            return
+        endif
+
+        step = (xs(ns)-xs(1))/real(max(nt-1,1),dp)
+        k    = 1
+        do j=1,nt
+            t = xs(1)+(j-1)*step
+            do while (k.lt.ns-1 .and. xs(k+1).lt.t)
+                k = k+1
+            enddo
+            ind(1,j) = k
+
+            if (resample_order.eq.3 .and. ns.ge.4) then
+                ! Lagrange weights over xs(s:s+3), shifted inwards at the edges
+                s = min(max(k-1,1),ns-3)
+                do i=1,4
+                    w(i,j) = lagrange_weight(xs(s:s+3),i,t)
+                enddo
+            else
+                s      = k
+                f      = (t-xs(k))/(xs(k+1)-xs(k))
+                w(1,j) = 1.0_dp-f
+                w(2,j) = f
+            endif
+            ind(2,j) = s
+        enddo
+
+    end subroutine resample_weights
+
+
+    function resample(ys, ind, w) result(yt)
+        ! Applies the brackets and weights of resample_weights() to ys.
+        ! The result is limited to the values at the bracket ends, so the
+        ! cubic does not overshoot at sharp features (e.g. near the shock).
+
+        real(dp), intent(in) :: ys(:)
+        integer,  intent(in) :: ind(:,:)
+        real(dp), intent(in) :: w(:,:)
+        real(dp)             :: yt(size(ind,2))
+
+        integer  :: i, j, k, ns
+        real(dp) :: y1, y2
+
+        ns = size(ys)
+        do j=1,size(ind,2)
+            yt(j) = 0.0_dp
+            do i=1,4
+                yt(j) = yt(j)+w(i,j)*ys(min(ind(2,j)+i-1,ns))
+            enddo
+            k  = ind(1,j)
+            y1 = ys(k)
+            y2 = ys(min(k+1,ns))
+            yt(j) = min(max(yt(j),min(y1,y2)),max(y1,y2))
+        enddo
+
+    end function resample
+
+
+    pure function lagrange_weight(xn, i, t) result(l)
+        ! i-th Lagrange basis polynomial over the nodes xn, evaluated at t
+
+        real(dp), intent(in) :: xn(:), t
+        integer,  intent(in) :: i
+        real(dp)             :: l
+
+        integer :: m
+
+        l = 1.0_dp
+        do m=1,size(xn)
+            if (m.ne.i) l = l*(t-xn(m))/(xn(i)-xn(m))
+        enddo
+
+    end function lagrange_weight
+
+end module
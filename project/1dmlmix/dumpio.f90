@@ -0,0 +1,263 @@
+module dumpio
+
+    ! Double-buffered writer of the printout records. printout stages a
+    ! record into one of two byte buffers of its stream and dump_write
+    ! writes it as one sequential unformatted record, so the file layout
+    ! is that of a plain write of the same list. There are two streams:
+    ! the full restart dump (Output File, every nrestart dump intervals)
+    ! and the optional analysis dump (Output File.ana, every interval)
+    ! holding the header and the ana_field list in float32, after a
+    ! first record 'ANALYSIS'. With async_dump on (setup), the units are
+    ! opened asynchronous and the writes proceed in the background while
+    ! the next step runs; the next record is staged into the other
+    ! buffer. Before a record is started, the previous one of the stream
+    ! is waited for (on the whole unit, as gfortran's wait(id=) can return
+    ! before the transfer is done), so all but the newest record of a file
+    ! are always complete. dump_close drains, flushes and fsyncs both.
+    ! Each complete record is listed in the index next to its file
+    ! (<file>.idx: dump number and byte offset of the record), which
+    ! readini uses to jump straight to the dump to restart from.
+    use iso_fortran_env, only: int8, int64
+    use iso_c_binding,   only: c_int
+    implicit none
+
+    integer, parameter :: s_full = 1, s_ana = 2
+
+    type dump_buffer
+        integer(int8), allocatable :: b(:)
+    end type
+
+    logical                                  :: async_dump = .false.
+    type(dump_buffer), asynchronous, target  :: dump_buf(2,2)
+    logical                                  :: dump_pending(2,2) = .false.
+    integer                                  :: dump_lu(2)  = 0
+    integer                                  :: dump_ib(2)  = 1
+    integer                                  :: dump_iu(2)  = 0
+    integer(int64)                           :: dump_off(2) = 0
+    integer                                  :: dump_rec(2,2)  = 0
+    integer(int64)                           :: dump_roff(2,2) = 0
+    integer                                  :: dump_is = s_full, dump_pos = 0
+
+    ! restart cadence (dump intervals) and analysis fields (none: no stream)
+    integer, parameter :: nana = 28
+    character(len=8), parameter :: ana_names(nana) = [character(len=8) ::     &
+        'x', 'v', 'q', 'dq', 'u', 'deltam', 'abar', 'rho', 'temp', 'ye',      &
+        'xp', 'xn', 'ifleos', 'ynue', 'ynueb', 'ynux', 'unue', 'unueb',       &
+        'unux', 'ufreez', 'pr', 's', 'dj', 'steps', 'ycc', 'vsound',         &
+        'pr_turb', 'prnu']
+    integer                       :: nrestart   = 1
+    integer                       :: ana_nfield = 0
+    character(len=8)              :: ana_field(nana)
+
+    interface stage
+        module procedure stage_i, stage_d, stage_l, stage_c, stage_i1,     &
+                         stage_d1, stage_r1, stage_l1, stage_r2
+    end interface
+
+    interface
+        function fsync(fd) bind(c, name='fsync')
+            import :: c_int
+            integer(c_int), value :: fd
+            integer(c_int)        :: fsync
+        end function
+    end interface
+
+    contains
+    subroutine ana_parse(line)
+
+    ! analysis fields from a blank or comma separated list of ana_names
+    character(*)     :: line
+    character(len=8) :: name
+    integer          :: i, j, k
+
+        ana_nfield = 0
+        i = 1
+        do while (i.le.len_trim(line))
+            if (line(i:i).eq.' '.or.line(i:i).eq.',') then
+                i = i + 1
+                cycle
+            endif
+            j = i
+            do while (j.lt.len_trim(line))
+                if (line(j+1:j+1).eq.' '.or.line(j+1:j+1).eq.',') exit
+                j = j + 1
+            enddo
+            name = line(i:j)
+            i    = j + 1
+            if (name.eq.'none'.or.name.eq.'None') cycle
+            if (.not.any(ana_names.eq.name)) then
+                print*, 'ERROR: unknown analysis field ', trim(name), ', use one of'
+                print*, (trim(ana_names(k))//' ', k=1,nana)
+                stop
+            endif
+            if (any(ana_field(1:ana_nfield).eq.name)) cycle
+            ana_nfield = ana_nfield + 1
+            ana_field(ana_nfield) = name
+        enddo
+
+    end subroutine
+
+    subroutine dump_open(is, lu, filename)
+
+    ! opens the output file of stream is on unit lu, and its index
+    integer      :: is, lu
+    character(*) :: filename
+
+        if (async_dump) then
+            open(lu, file=filename, form='unformatted', asynchronous='yes')
+        else
+            open(lu, file=filename, form='unformatted')
+        endif
+        open(newunit=dump_iu(is), file=filename//'.idx')
+        dump_lu(is)  = lu
+        dump_off(is) = 0
+
+        if (is.eq.s_ana) then
+            write(lu) 'ANALYSIS'
+            dump_off(is) = 4 + 8 + 4
+        endif
+
+    end subroutine
+
+    subroutine dump_index(is, ib)
+
+    ! lists the record of buffer ib, now complete, in the index
+    integer :: is, ib
+
+        if (dump_iu(is).eq.0) return
+        write(dump_iu(is),'(I8,1x,I16)') dump_rec(ib,is), dump_roff(ib,is)
+        flush(dump_iu(is))
+
+    end subroutine
+
+    subroutine dump_begin(is)
+
+    ! switch stream is to its other buffer, waited for by dump_write
+    integer :: is
+
+        dump_is     = is
+        dump_ib(is) = 3 - dump_ib(is)
+        dump_pos    = 0
+
+    end subroutine
+
+    subroutine dump_write(lu, idump)
+
+    integer :: lu, idump, is, ib
+
+        is = dump_is
+        ib = dump_ib(is)
+        dump_lu(is) = lu
+
+        if (dump_pending(3-ib,is)) then
+            wait(lu)
+            dump_pending(3-ib,is) = .false.
+            call dump_index(is, 3-ib)
+        endif
+
+        dump_rec(ib,is)  = idump
+        dump_roff(ib,is) = dump_off(is)
+        dump_off(is)     = dump_off(is) + dump_pos + 8
+
+        if (async_dump) then
+            write(lu, asynchronous='yes') dump_buf(ib,is)%b(1:dump_pos)
+            dump_pending(ib,is) = .true.
+        else
+            write(lu) dump_buf(ib,is)%b(1:dump_pos)
+            call dump_index(is, ib)
+        endif
+
+    end subroutine
+
+    subroutine dump_close()
+
+    integer :: is, k, lu
+
+        do is=1,2
+            lu = dump_lu(is)
+            if (lu.eq.0) cycle
+            do k=1,2
+                if (.not.dump_pending(k,is)) cycle
+                wait(lu)
+                dump_pending(k,is) = .false.
+                call dump_index(is, k)
+            enddo
+            flush(lu)
+            if (fsync(int(fnum(lu), c_int)).ne.0) print*, 'WARNING: fsync of unit', lu, ' failed'
+        enddo
+
+    end subroutine
+
+    subroutine reserve(nbytes)
+
+    ! grows the current buffer, which is never in flight while staged
+    integer                    :: nbytes, ib
+    integer(int8), allocatable :: tmp(:)
+
+        ib = dump_ib(dump_is)
+        if (.not.allocated(dump_buf(ib,dump_is)%b)) allocate(dump_buf(ib,dump_is)%b(max(nbytes, 2**20)))
+        if (dump_pos+nbytes.le.size(dump_buf(ib,dump_is)%b)) return
+
+        allocate(tmp(max(dump_pos+nbytes, 2*size(dump_buf(ib,dump_is)%b))))
+        tmp(1:dump_pos) = dump_buf(ib,dump_is)%b(1:dump_pos)
+        call move_alloc(tmp, dump_buf(ib,dump_is)%b)
+
+    end subroutine
+
+    subroutine put(bytes)
+
+    integer(int8) :: bytes(:)
+    integer       :: n
+
+        n = size(bytes)
+        call reserve(n)
+        dump_buf(dump_ib(dump_is),dump_is)%b(dump_pos+1:dump_pos+n) = bytes
+        dump_pos = dump_pos + n
+
+    end subroutine
+
+    subroutine stage_i(a)
+    integer :: a
+        call put(transfer(a, 0_int8, storage_size(a)/8))
+    end subroutine
+
+    subroutine stage_d(a)
+    double precision :: a
+        call put(transfer(a, 0_int8, storage_size(a)/8))
+    end subroutine
+
+    subroutine stage_l(a)
+    logical :: a
+        call put(transfer(a, 0_int8, storage_size(a)/8))
+    end subroutine
+
+    subroutine stage_c(a)
+    character(*) :: a
+        call put(transfer(a, 0_int8, len(a)))
+    end subroutine
+
+    subroutine stage_i1(a)
+    integer :: a(:)
+        call put(transfer(a, 0_int8, storage_size(a)/8*size(a)))
+    end subroutine
+
+    subroutine stage_d1(a)
+    double precision :: a(:)
+        call put(transfer(a, 0_int8, storage_size(a)/8*size(a)))
+    end subroutine
+
+    subroutine stage_r1(a)
+    real :: a(:)
+        call put(transfer(a, 0_int8, storage_size(a)/8*size(a)))
+    end subroutine
+
+    subroutine stage_l1(a)
+    logical :: a(:)
+        call put(transfer(a, 0_int8, storage_size(a)/8*size(a)))
+    end subroutine
+
+    subroutine stage_r2(a)
+    real :: a(:,:)
+        call put(transfer(a, 0_int8, storage_size(a)/8*size(a)))
+    end subroutine
+end module
@@ -0,0 +1,222 @@
+module grid
+
+    ! Per-cell state of the Lagrangian grid, formerly the COMMON blocks
+    ! named in the comments and sized by parameter (idim=10000). The arrays
+    ! are allocated by grid_alloc once the number of cells of the initial
+    ! model is known (readini), with headroom for the cells added by amp;
+    ! idim and idim1 keep their old meaning and bound the dummy arguments.
+    implicit none
+
+    integer, parameter :: iqn = 17
+
+    integer :: idim = 0, idim1 = 0
+
+    ! /beta/
+    logical,          allocatable :: ebetaeq(:), pbetaeq(:)
+    ! /carac/
+    double precision, allocatable :: deltam(:), abar(:)
+    ! /cc/
+    real,             allocatable :: ycc(:,:)
+    real                          :: yccave(iqn)
+    ! /cellc/
+    double precision, allocatable :: u(:), rho(:), ye(:), q(:)
+    ! /celle/
+    double precision, allocatable :: x(:), v(:), f(:)
+    ! /cent/
+    double precision, allocatable :: dj(:)
+    ! /cpots/
+    double precision, allocatable :: xmue(:), xmuhat(:)
+    ! /dnuas/
+    double precision, allocatable :: dnuae(:), dnuaeb(:), dnuse(:), dnuseb(:)
+    ! /dnus/
+    double precision, allocatable :: dnue(:), dnueb(:), dnux(:)
+    ! /dum/
+    double precision, allocatable :: dumx(:), dumv(:), dumu(:), dumye(:)
+    ! /dum2/
+    double precision, allocatable :: dumynue(:), dumynueb(:), dumynux(:),    &
+                                     dumunue(:), dumunueb(:), dumunux(:)
+    ! /ener1/
+    double precision, allocatable :: dq(:), dunu(:)
+    ! /enus/
+    double precision, allocatable :: enuet(:), enuebt(:), enuxt(:)
+    ! /eosnu/
+    double precision, allocatable :: prnu(:)
+    ! /eosq/
+    double precision, allocatable :: pr(:), vsound(:), u2(:)
+    double precision              :: vsmax = 0.d0
+    ! /etnus/
+    double precision, allocatable :: etanue(:), etanueb(:), etanux(:)
+    ! /f1/
+    double precision, allocatable :: f1v(:), f1u(:), f1ye(:)
+    ! /f1nu/
+    double precision, allocatable :: f1ynue(:), f1ynueb(:), f1ynux(:),       &
+                                     f1unue(:), f1unueb(:), f1unux(:)
+    ! /f2/
+    double precision, allocatable :: f2v(:), f2u(:), f2ye(:)
+    ! /f2nu/
+    double precision, allocatable :: f2ynue(:), f2ynueb(:), f2ynux(:),       &
+                                     f2unue(:), f2unueb(:), f2unux(:)
+    ! /freez/
+    double precision, allocatable :: ufreez(:)
+    ! /fturb/
+    double precision, allocatable :: geff(:), fmix1(:), fmix2(:)
+    ! /hnucl/
+    double precision, allocatable :: xalpha(:), xheavy(:), yeh(:)
+    ! /ign/
+    logical,          allocatable :: ifign(:)
+    ! /mlout/
+    double precision, allocatable :: pr_turb(:), output_preserve(:)
+    ! /nustuff/
+    double precision, allocatable :: ynue(:), ynueb(:), ynux(:),             &
+                                     unue(:), unueb(:), unux(:)
+    ! /prev/
+    double precision, allocatable :: xold(:), vold(:), rhold(:), prold(:),  &
+                                     tempold(:), yeold(:), xnold(:), xpold(:)
+    ! /rshift/
+    double precision, allocatable :: gshift(:)
+    ! /state/
+    double precision, allocatable :: xp(:), xn(:), eta(:)
+    integer,          allocatable :: ifleos(:)
+    ! /swesty/
+    double precision, allocatable :: xpf(:), pvar2(:), pvar3(:), pvar4(:)
+    ! /tempe/
+    double precision, allocatable :: temp(:)
+    ! /therm/
+    double precision, allocatable :: xmu(:)
+    ! /timei/
+    integer,          allocatable :: istep(:)
+    double precision, allocatable :: t0(:), steps(:), dum2v(:)
+    ! /tnus/
+    double precision, allocatable :: tempnue(:), tempnueb(:), tempnux(:)
+    ! /trap/
+    logical,          allocatable :: trapnue(:), trapnueb(:), trapnux(:)
+    ! /turb/
+    double precision, allocatable :: vturb2(:), dmix(:), bvf(:)
+    double precision              :: alpha(4) = 0.d0
+
+    contains
+    subroutine grid_alloc(ncell)
+
+    ! Allocates the grid for ncell cells plus the headroom, zeroed like
+    ! the COMMON blocks were
+    integer :: ncell
+
+        if (allocated(x)) then
+            if (ncell.le.idim) return
+            call grid_free
+        endif
+
+        idim  = ncell + max(ncell/4, 100)
+        idim1 = idim + 1
+
+        allocate(ebetaeq(idim), pbetaeq(idim))
+        allocate(deltam(idim), abar(idim))
+        allocate(ycc(idim,iqn))
+        allocate(u(idim), rho(idim), ye(idim), q(idim))
+        allocate(x(0:idim), v(0:idim), f(0:idim))
+        allocate(dj(idim))
+        allocate(xmue(idim), xmuhat(idim))
+        allocate(dnuae(idim), dnuaeb(idim), dnuse(idim), dnuseb(idim))
+        allocate(dnue(idim), dnueb(idim), dnux(idim))
+        allocate(dumx(0:idim), dumv(0:idim), dumu(idim), dumye(idim))
+        allocate(dumynue(idim), dumynueb(idim), dumynux(idim),              &
+                 dumunue(idim), dumunueb(idim), dumunux(idim))
+        allocate(dq(idim), dunu(idim))
+        allocate(enuet(idim), enuebt(idim), enuxt(idim))
+        allocate(prnu(idim1))
+        allocate(pr(idim1), vsound(idim), u2(idim))
+        allocate(etanue(idim), etanueb(idim), etanux(idim))
+        allocate(f1v(0:idim), f1u(idim), f1ye(idim))
+        allocate(f1ynue(idim), f1ynueb(idim), f1ynux(idim),                 &
+                 f1unue(idim), f1unueb(idim), f1unux(idim))
+        allocate(f2v(0:idim), f2u(idim), f2ye(idim))
+        allocate(f2ynue(idim), f2ynueb(idim), f2ynux(idim),                 &
+                 f2unue(idim), f2unueb(idim), f2unux(idim))
+        allocate(ufreez(idim))
+        allocate(geff(idim), fmix1(idim), fmix2(idim))
+        allocate(xalpha(idim), xheavy(idim), yeh(idim))
+        allocate(ifign(idim))
+        allocate(pr_turb(idim1), output_preserve(idim))
+        allocate(ynue(idim), ynueb(idim), ynux(idim),                       &
+                 unue(idim), unueb(idim), unux(idim))
+        allocate(xold(0:idim), vold(0:idim), rhold(idim), prold(idim),      &
+                 tempold(idim), yeold(idim), xnold(idim), xpold(idim))
+        allocate(gshift(idim))
+        allocate(xp(idim), xn(idim), eta(idim), ifleos(idim))
+        allocate(xpf(idim), pvar2(idim), pvar3(idim), pvar4(idim))
+        allocate(temp(idim))
+        allocate(xmu(idim))
+        allocate(istep(idim), t0(idim), steps(idim), dum2v(idim))
+        allocate(tempnue(idim), tempnueb(idim), tempnux(idim))
+        allocate(trapnue(idim), trapnueb(idim), trapnux(idim))
+        allocate(vturb2(idim), dmix(idim), bvf(idim))
+
+        ebetaeq = .false.;  pbetaeq = .false.
+        deltam  = 0.d0;     abar    = 0.d0
+        ycc     = 0.0
+        u       = 0.d0;     rho     = 0.d0;     ye      = 0.d0;     q = 0.d0
+        x       = 0.d0;     v       = 0.d0;     f       = 0.d0
+        dj      = 0.d0
+        xmue    = 0.d0;     xmuhat  = 0.d0
+        dnuae   = 0.d0;     dnuaeb  = 0.d0;     dnuse   = 0.d0;     dnuseb = 0.d0
+        dnue    = 0.d0;     dnueb   = 0.d0;     dnux    = 0.d0
+        dumx    = 0.d0;     dumv    = 0.d0;     dumu    = 0.d0;     dumye  = 0.d0
+        dumynue = 0.d0;     dumynueb = 0.d0;    dumynux = 0.d0
+        dumunue = 0.d0;     dumunueb = 0.d0;    dumunux = 0.d0
+        dq      = 0.d0;     dunu    = 0.d0
+        enuet   = 0.d0;     enuebt  = 0.d0;     enuxt   = 0.d0
+        prnu    = 0.d0
+        pr      = 0.d0;     vsound  = 0.d0;     u2      = 0.d0
+        etanue  = 0.d0;     etanueb = 0.d0;     etanux  = 0.d0
+        f1v     = 0.d0;     f1u     = 0.d0;     f1ye    = 0.d0
+        f1ynue  = 0.d0;     f1ynueb = 0.d0;     f1ynux  = 0.d0
+        f1unue  = 0.d0;     f1unueb = 0.d0;     f1unux  = 0.d0
+        f2v     = 0.d0;     f2u     = 0.d0;     f2ye    = 0.d0
+        f2ynue  = 0.d0;     f2ynueb = 0.d0;     f2ynux  = 0.d0
+        f2unue  = 0.d0;     f2unueb = 0.d0;     f2unux  = 0.d0
+        ufreez  = 0.d0
+        geff    = 0.d0;     fmix1   = 0.d0;     fmix2   = 0.d0
+        xalpha  = 0.d0;     xheavy  = 0.d0;     yeh     = 0.d0
+        ifign   = .false.
+        pr_turb = 0.d0;     output_preserve = 0.d0
+        ynue    = 0.d0;     ynueb   = 0.d0;     ynux    = 0.d0
+        unue    = 0.d0;     unueb   = 0.d0;     unux    = 0.d0
+        xold    = 0.d0;     vold    = 0.d0;     rhold   = 0.d0;     prold  = 0.d0
+        tempold = 0.d0;     yeold   = 0.d0;     xnold   = 0.d0;     xpold  = 0.d0
+        gshift  = 0.d0
+        xp      = 0.d0;     xn      = 0.d0;     eta     = 0.d0;     ifleos = 0
+        xpf     = 0.d0;     pvar2   = 0.d0;     pvar3   = 0.d0;     pvar4  = 0.d0
+        temp    = 0.d0
+        xmu     = 0.d0
+        istep   = 0;        t0      = 0.d0;     steps   = 0.d0;     dum2v  = 0.d0
+        tempnue = 0.d0;     tempnueb = 0.d0;    tempnux = 0.d0
+        trapnue = .false.;  trapnueb = .false.; trapnux = .false.
+        vturb2  = 0.d0;     dmix    = 0.d0;     bvf     = 0.d0
+
+    end subroutine
+
+    subroutine grid_free()
+
+        if (.not.allocated(x)) return
+
+        deallocate(ebetaeq, pbetaeq, deltam, abar, ycc, u, rho, ye, q,       &
+                   x, v, f, dj, xmue, xmuhat, dnuae, dnuaeb, dnuse, dnuseb,  &
+                   dnue, dnueb, dnux, dumx, dumv, dumu, dumye,               &
+                   dumynue, dumynueb, dumynux, dumunue, dumunueb, dumunux,   &
+                   dq, dunu, enuet, enuebt, enuxt, prnu, pr, vsound, u2,     &
+                   etanue, etanueb, etanux, f1v, f1u, f1ye,                  &
+                   f1ynue, f1ynueb, f1ynux, f1unue, f1unueb, f1unux,         &
+                   f2v, f2u, f2ye, f2ynue, f2ynueb, f2ynux,                  &
+                   f2unue, f2unueb, f2unux, ufreez, geff, fmix1, fmix2,      &
+                   xalpha, xheavy, yeh, ifign, pr_turb, output_preserve,     &
+                   ynue, ynueb, ynux, unue, unueb, unux,                     &
+                   xold, vold, rhold, prold, tempold, yeold, xnold, xpold,   &
+                   gshift, xp, xn, eta, ifleos, xpf, pvar2, pvar3, pvar4,    &
+                   temp, xmu, istep, t0, steps, dum2v,                       &
+                   tempnue, tempnueb, tempnux, trapnue, trapnueb, trapnux,   &
+                   vturb2, dmix, bvf)
+        idim  = 0
+        idim1 = 0
+
+    end subroutine
+end module
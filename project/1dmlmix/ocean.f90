@@ -11,7 +11,7 @@
 !..                                                                     
       double precision tt,dd,zbar,abar,pel,eel,sel 
 !..                                                                     
-!..communicate                                                          
+!..communicate (private to each thread, see burn)                       
       common/arg/t,den,psi 
       common/iarg/lst,kentr,kpar,jurs,jkk 
       common/nz/nz 
@@ -20,6 +20,7 @@
       common/resel/pe,ee,se,sek,hpr 
       common/str/ppl,epl,spl,cp,gam,da,dpe,dse,dsp,beta 
       common/nzr/nzr 
+!$omp threadprivate(/arg/,/iarg/,/nz/,/az/,/result/,/resel/,/str/,/nzr/)
 !..                                                                     
 !..t in 10**9 den in 10**7                                              
 !     t   = tt * 1.0e-9                                                 
@@ -113,7 +114,6 @@
 !                                                                       
 !  *** the arguments                                                    
       common/arg/t,den,psi 
-      equivalence(den,pl) 
       common/iarg/lst,kentr,kpar,jurs,jkk 
 !***********************************************************************
 !                                                                       
@@ -211,6 +211,8 @@
 !  *** nzr --- identificator of working region on t-den plane when nz=0 
 !***********************************************************************
       common/fdf/f12,f32,f52,f72,f12s,f32s,f52s,f72s 
+!$omp threadprivate(/arg/,/iarg/,/nz/,/az/,/result/,/resel/,/str/,/nzr/,  &
+!$omp               /fdf/)
 !***********************************************************************
 !  *** f12,f32,f52,f72 --- half-integer fermi-dirac functions           
 !  *** f12s,f32s,f52s,f72s --- the first derivatives of f-d functions   
@@ -223,19 +225,20 @@
      &d5(4),d6(4),d(4),a1(4),a2(4),a3(4),a4(4),df1(4),df2(4)            
       dimension uio(5),ui1(5),ui2(5),cio(5),ci1(5),ci2(5),aio(5),ai1(5) 
       dimension ai2(5),xxi(5),aai(5),cci(5),bbi(5),wk1(5),wk2(5),wk3(5) 
-      dimension uac(95),wk4(5),wk5(5),wk6(5) 
+      dimension uac(65),wk4(5),wk5(5),wk6(5),uwk(30) 
       dimension cpp(5),abc(85),ado(5),ad1(5),ad2(5),bdo(5),bd1(5),fgs(8) 
       dimension bd2(5),cdo(5),cd1(5),cd2(5),gdo(5),gd1(5),gd2(5) 
       dimension ggsi(5),zzi(5),vvi(5),hhi(5),ggi(5) 
       dimension asp(3),bsp(3),csp(3),gsp(3),aspa(3),bspa(3),cspa(3),gspa&
      &(3),abcg(24),wk7(5)                                               
-      equivalence(psi,pc) 
       equivalence (uio(1),uac(1)),(ui1(1),uac(6)),(ui2(1),uac(11)),     &
      &(cio(1),uac(16)),(ci1(1),uac(21)),(ci2(1),uac(26)),(aio(1),uac(31)&
      &),(ai1(1),uac(36)),(ai2(1),uac(41)),(xxi(1),uac(46)),(aai(1),uac(5&
-     &1)),(cci(1),uac(56)),(bbi(1),uac(61)),(wk1(1),uac(66)),(wk2(1),uac&
-     &(71)),(wk3(1),uac(76)),(wk4(1),uac(81)),(wk5(1),uac(86)),(wk6(1),u&
-     &ac(91))                                                           
+     &1)),(cci(1),uac(56)),(bbi(1),uac(61))                              
+!  *** the work arrays wk1-wk6 are kept apart from the constants in uac,
+!      which are saved, so that every thread has its own                
+      equivalence (wk1(1),uwk(1)),(wk2(1),uwk(6)),(wk3(1),uwk(11)),     &
+     &(wk4(1),uwk(16)),(wk5(1),uwk(21)),(wk6(1),uwk(26))                
       equivalence(abc(1),ado(1)),(abc(6),ad1(1)),(abc(11),ad2(1)),      &
      &(abc(16),bdo(1)),(abc(21),bd1(1)),(abc(26),bd2(1)),(abc(31),cdo(5)&
      &),(abc(36),cd1(1)),(abc(41),cd2(1)),(abc(46),gdo(1)),(abc(51),gd1(&
@@ -401,8 +404,8 @@
       g41=0.0 
       g4=0.0 
 !                                                                       
-      if(pl.gt.0.d0) go to 102 
-      write(6,5022) pl,jkk 
+      if(den.gt.0.d0) go to 102
+      write(6,5022) den,jkk
 !..      print 5023,pl,jkk                                              
       fac=t*t*t 
       pt=3.025884d-2*fac/cu(17) 
@@ -425,10 +428,10 @@
       hpr=0.d0 
    90 alf=cu(1)/t 
       al1=cu(4)/alf 
-      plm=pl/emue 
+      plm=den/emue
       sqe=0.d0 
       ei=t*rg 
-      pi=ei*pl 
+      pi=ei*den
       eg=cu(3)*ei 
   590  continue 
 !                                                                       
@@ -634,7 +637,7 @@
    56 pe=pi*pe 
       ee=eg*ee 
       if(lst.eq.0) go to 50 
-      pt=rg*pl*pt 
+      pt=rg*den*pt
       et=eg*et/t 
       ppl=ei*ppl 
       epl=eg*epl 
@@ -651,11 +654,11 @@
       x3=v/cu(17) 
       p=x+pe+x3 
       beta=x3/p 
-      x3=v/pl 
+      x3=v/den
       e=x1+x3+ee 
       if(kentr.eq.0) go to 7 
       x6=cu(2)/as 
-      x4=pl*(cu(35)/(t*sqrt(t))) 
+      x4=den*(cu(35)/(t*sqrt(t)))
       x4=log(x4) 
       x4=x6*(cu(24)-x4+scn) 
       x5=cu(36)*x3/t 
@@ -668,19 +671,19 @@
       go to 45 
     7 if(lst.eq.0) go to 9 
    45 pt=pt+(x+cu(36)*v)/t 
-      ppl=ppl+x/pl 
+      ppl=ppl+x/den
       et=et+(x1+cu(37)*x3)/t 
       epl=epl-x3 
 ! ********************************************************************* 
-      x4=pt/(pl*et) 
-      x5=pl/p 
-      gam=x5*(ppl+t*x4*pt/pl) 
+      x4=pt/(den*et)
+      x5=den/p
+      gam=x5*(ppl+t*x4*pt/den)
       da=x4/gam 
       cp=gam*et*(p/ppl) 
-      dpe=x5*(epl+t*pt/pl)-1.d0 
+      dpe=x5*(epl+t*pt/den)-1.d0
       if(kentr.ne.0) then 
       dse=t*st/et-1.d0 
-      dsp=-spl*(pl/pt)-1.d0 
+      dsp=-spl*(den/pt)-1.d0
       endif 
 !                                                                       
 !                 *** exit from epeos ***                               
@@ -757,7 +760,7 @@
       v=sq*al1 
       x=cu(19)*al1 
       z=cu(39)*v 
-      z1=cu(3)*z/pl 
+      z1=cu(3)*z/den
       z3=x1*f32 
       z4=x*f52 
       al4=9.375d-2*al2 
@@ -767,7 +770,7 @@
       y1=al3*f72 
       ee=z1*(f32+z5+y1) 
       if(kentr.eq.0) go to 34 
-      z2=cu(41)*sq/pl 
+      z2=cu(41)*sq/den
       dl=cu(40)*psi 
       z10=cu(44)*psi 
       z11=cu(45)*al1 
@@ -786,7 +789,7 @@
       epl=z1*z8*pap-ee 
       z9=f32s+x*f52s+al4*f72s 
       pt=(cu(27)*pe+z*(z4+cu(15)*y-pal*z9))/t 
-      ppl=z*z9*pap/pl 
+      ppl=z*z9*pap/den
       if(kentr.eq.0) go to 35 
       z9=f32s-z10*f12s-cu(44)*f12+z11*(f52s-dl*f32s-cu(40)*f32) 
       z9=z9+al5*(f72s-0.77777777778d0*f52-y3*f52s) 
@@ -902,9 +905,9 @@
       y4=z*y1 
       g2=z2*y2*x*(x7+y4) 
       g4=x5*cu(17)*y2*(cu(4)+y5*y4) 
-      ee=cu(46)*(g0+g2+g4)/pl 
+      ee=cu(46)*(g0+g2+g4)/den
       if(kentr.eq.0) go to 75 
-      y6=cu(48)/(t*pl) 
+      y6=cu(48)/(t*den)
       se=y6*(f2+cu(15)*f4) 
    75 if(lst.eq.0) go to 76 
       z6=cu(54)*x5/x3 
@@ -914,7 +917,7 @@
       pap=x1/pap 
       z9=cu(51)*x/z 
       z10=x1*z9 
-      z11=cu(46)*pap/pl 
+      z11=cu(46)*pap/den
       ppl=z11*z10 
       y3=cu(46)/t 
       pt=y3*(cu(15)*(f2+cu(15)*f4)-z10*pal) 
@@ -924,7 +927,7 @@
       g4=cu(53)*x5*(cu(37)-z)/(x*y4) 
       g0=g0+g2+g4 
       epl=z11*g0-ee 
-      et=y3*(v-pal*g0)/pl 
+      et=y3*(v-pal*g0)/den
       if(kentr.eq.0) go to 76 
       g4=(z2*x7+cu(55)*x5/x)*z9/x 
       spl=y6*pap*g4-se 
@@ -946,24 +949,24 @@
       z3=1.d0 
       if(z.lt.0.d0) z3=-1.d0 
       z2=z*z3 
-      z1=pc 
-      if(pc.lt.0.d0) z1=-pc 
+      z1=psi
+      if(psi.lt.0.d0) z1=-psi 
       if(z1.lt.1.d0) go to 181 
       z2=z2/z1 
       if(z2.gt.0.3d0) z=0.3d0*z1*z3 
-  181 pc=pc-z 
+  181 psi=psi-z 
       if(z2.gt.eit) go to 151 
       ku=15 
          kw=2 
       go to 151 
   170 z=1.44059d0/(al3*alf) 
-      z1=z/pl 
+      z1=z/den
         z2=z/cu(17) 
       pe=z2*gp 
          ee=z1*ge 
          hpr=cu(15)*g1/z10 
       if(kentr.eq.0) go to 182 
-      z3=pc+alf 
+      z3=psi+alf
          y3=g3+g31+cu(49)*gp-z3*g1m 
       se=z1*y3/t 
   182 if(lst.eq.0) go to 183 
@@ -994,16 +997,16 @@
       woa=0.d0 
          w1a=0.d0 
         w2a=0.d0 
-      if(pc.gt.pc2) go to 155 
+      if(psi.gt.pc2) go to 155
       if(kkk.eq.0) go to 158 
       do 157 k=1,15 
-  157 uac(k+65)=sqrt(uac(k)+x2) 
+  157 uwk(k)=sqrt(uac(k)+x2) 
       kkk=0 
-  158 if(pc.gt.pc1) go to 156 
-      if(pc.lt.-4.4d1) go to 163 
-      x=exp(pc) 
+  158 if(psi.gt.pc1) go to 156
+      if(psi.lt.-4.4d1) go to 163
+      x=exp(psi)
       do 161 k=1,ku 
-  161 uac(k+80)=uac(k+15)/(uac(k+30)*x+1.d0) 
+  161 uwk(k+15)=uac(k+15)/(uac(k+30)*x+1.d0) 
       do 162 k=1,5 
       z=wk1(k)*wk4(k) 
       wo=wo+z 
@@ -1060,9 +1063,9 @@
       g2a1=g2a 
          g3a1=g3a 
          g4a1=g4a 
-  168 pc=-pc-x2 
+  168 psi=-psi-x2 
          kpg=1 
-      if(pc.gt.-4.4d1) go to 152 
+      if(psi.gt.-4.4d1) go to 152
          g1=0.d0 
          g2=0.d0 
          g3=0.d0 
@@ -1075,7 +1078,7 @@
          g2a=0.d0 
          g3a=0.d0 
          g4a=0.d0 
-  166 pc=-pc-x2 
+  166 psi=-psi-x2 
       g1m=g11-g1 
       g1mp=g1p1+g1p 
       gp=g2+g21 
@@ -1084,21 +1087,21 @@
   155 do 171 k=1,5 
       z4=xxi(k)-1.d0 
 !     Avoid floating point underflow                                    
-      if(pc*z4.lt.-100) then 
+      if(psi*z4.lt.-100) then
          z1 = 0.0 
       else 
-         z1=exp(pc*z4) 
+         z1=exp(psi*z4)
       endif 
-      y1=pc*xxi(k) 
+      y1=psi*xxi(k)
       z2=1.d0+z1 
       z3=x2+y1 
-      y2=pc*aai(k)*sqrt(pc*z3)/z2 
-      y4=cci(k)+pc 
+      y2=psi*aai(k)*sqrt(psi*z3)/z2 
+      y4=cci(k)+psi
       z=y4+x2 
       y6=bbi(k)*sqrt(y4*z) 
       wo=wo+y2+y6 
       if((lst.eq.0).and.(kw.ne.1)) go to 172 
-      z5=1./pc 
+      z5=1./psi
          y3=0.5d0*xxi(k)/z3-z4*z1/z2+1.5d0*z5 
       z6=1.d0/y4 
          y5=0.5d0*(1.d0/z+z6) 
@@ -1139,7 +1142,7 @@
          x1=x-0.5d0 
       do 190 k=1,5 
       k2=k1+k 
-        k3=k2+65 
+        k3=k2 
       z=(x+ggsi(k))/pc2 
          y=x1/zzi(k) 
       z1=wk7(k)*(z-cpp(2))*cpp(4) 
@@ -1147,25 +1150,25 @@
       z4=xxi(k)*wk7(k)/wk4(k) 
         z5=wk6(k)/wk5(k) 
          z6=cpp(5)*(z4+z5) 
-      asp(i)=asp(i)+abc(k2)*uac(k3)+z1*wk4(k)+z2*wk5(k)+z6*cpp(1) 
+      asp(i)=asp(i)+abc(k2)*uwk(k3)+z1*wk4(k)+z2*wk5(k)+z6*cpp(1) 
       z8=cpp(5)*(z4/(vvi(k)+x2)+z5/(zzi(k)+x2)) 
-      aspa(i)=aspa(i)+abc(k2)/uac(k3)+z1/wk4(k)+z2/wk5(k)-z8*cpp(1) 
+      aspa(i)=aspa(i)+abc(k2)/uwk(k3)+z1/wk4(k)+z2/wk5(k)-z8*cpp(1) 
       k4=k2+15 
       z1=wk7(k)*(cpp(3)-z)*cpp(1) 
          z2=wk6(k)*(cpp(3)-y)*cpp(1) 
-      bsp(i)=bsp(i)+abc(k4)*uac(k3)+z1*wk4(k)+z2*wk5(k)-z6 
-      bspa(i)=bspa(i)+abc(k4)/uac(k3)+z1/wk4(k)+z2/wk5(k)+z8 
+      bsp(i)=bsp(i)+abc(k4)*uwk(k3)+z1*wk4(k)+z2*wk5(k)-z6 
+      bspa(i)=bspa(i)+abc(k4)/uwk(k3)+z1/wk4(k)+z2/wk5(k)+z8 
       k4=k4+15 
-      csp(i)=csp(i)+abc(k4)*uac(k3) 
-      cspa(i)=cspa(i)+abc(k4)/uac(k3) 
+      csp(i)=csp(i)+abc(k4)*uwk(k3) 
+      cspa(i)=cspa(i)+abc(k4)/uwk(k3) 
       k4=k4+15 
-      gsp(i)=gsp(i)+abc(k4)*uac(k3) 
-      gspa(i)=gspa(i)+abc(k4)/uac(k3) 
+      gsp(i)=gsp(i)+abc(k4)*uwk(k3) 
+      gspa(i)=gspa(i)+abc(k4)/uwk(k3) 
       wk6(k)=wk6(k)*zzi(k) 
   190 wk7(k)=wk7(k)*vvi(k) 
   198 k1=k1+5 
       kk1=0 
-  191 z=pc-pc1 
+  191 z=psi-pc1
          z1=2.d0*z 
          z2=1.5d0*z 
       wo=gsp(1)+z*(csp(1)+z*(bsp(1)+z*asp(1))) 
@@ -1183,7 +1186,7 @@
 !                                                                       
 ! *** relativistic asymptotics (nz=4)                                   
     4 nzr=4 
-  520  ro=pl*cu(58) 
+  520  ro=den*cu(58)
           hi=1.d0/emue 
           r1=ro*0.5d0*hi 
           pit=pi2*al1 
@@ -1236,10 +1239,10 @@
           et=et*cu(2) 
   556  if(kentr.eq.0) go to 557 
           y=cu(62) 
-      se=y*al1*(hu2+.466666666667d0*pt2-.5d0)/pl 
+      se=y*al1*(hu2+.466666666667d0*pt2-.5d0)/den
           if(lst.eq.0) go to 557 
       spl=-se+2.d0*pi2*cu(2)*al1*r2 
-          st=se/t+2.d0*y*pt2*(0.46666666667d0-2.d0*hu2*r)/(pl*cu(1)) 
+          st=se/t+2.d0*y*pt2*(0.46666666667d0-2.d0*hu2*r)/(den*cu(1))
   557  go to 135 
 !                                                                       
 ! *** interpolation between perfect gas and expansion over              
@@ -1254,12 +1257,12 @@
       lst1=lst 
          lst=1 
          kk=0 
-      dni=pl 
+      dni=den
       if(lst1.eq.0) go to 81 
       kk=1 
       tni=t 
          t=t*(cu(4)+dst) 
-   81 pl=pl1 
+   81 den=pl1
          nz=nzp1 
         ki=2 
       go to 90 
@@ -1269,9 +1272,9 @@
          psn1=psi 
          hprn1=hpr 
       pnp1=ppl 
-         enp1=epl/pl 
-         snp1=spl/pl 
-      pl=pl2 
+         enp1=epl/den
+         snp1=spl/den
+      den=pl2
          nz=nzp2 
         ki=3 
          nzr1=nzr 
@@ -1282,7 +1285,7 @@
       wv4=cu(15)*wv1 
          wv3=dni-pl1 
          wv5=wv1*wv3 
-   92 x=epl/pl 
+   92 x=epl/den
       x1=pe-pn1 
          x2=x1*wv4 
          x3=x1*wv1 
@@ -1301,7 +1304,7 @@
       x1=se-sn1 
          x2=x1*wv4 
          x3=x1*wv1 
-      v1=snp1+spl/pl-x2 
+      v1=snp1+spl/den-x2
          v2=x3-v1-snp1 
          v1=wv1*v1 
       se=sn1+wv3*(snp1+wv5*(v2+wv3*v1)) 
@@ -1311,12 +1314,12 @@
       psi=(psi-psn1)*x1+psn1 
       hpr=(hpr-hprn1)*x1+hprn1 
       nzr=10*nzr1+nzr 
-       pl=dni 
-        plm=pl/emue 
+       den=dni
+        plm=den/emue
       ki=kin 
          lst=lst1 
   134 nz=0 
-         pi=ei*pl 
+         pi=ei*den
   135  go to(57,77,78,79,80,577,578), ki 
    82 pn2=pe 
          en2=ee 
@@ -1352,8 +1355,8 @@
       dnt=t 
       if(lst2.eq.0) go to 129 
       kkt=1 
-         plni=pl 
-        pl=pl*(cu(4)+dst) 
+         plni=den
+        den=den*(cu(4)+dst) 
   129 t=t1 
          nz=nz1 
          ki=4 
@@ -1417,10 +1420,10 @@
         ent2=ee 
          snt2=se 
       kkt=2 
-         pl=plni 
+         den=plni
       go to 129 
   131 x1=cu(4)/dst 
-      ppl=x1*(pnt2-pe)/pl 
+      ppl=x1*(pnt2-pe)/den
          epl=x1*(ent2-ee) 
       if(kentr.eq.0) go to 132 
       spl=(snt2-se)*x1 
@@ -0,0 +1,104 @@
+module profiler
+
+    ! Wall-clock time and number of calls of the main phases of the code,
+    ! accumulated by prof_start/prof_stop around the calls (never inside a
+    ! threaded region). step prints the summary every nups steps, and every
+    ! dump appends the time spent per phase since the previous dump to
+    ! timing.txt, next to nu_lum.txt. Indented names are part of hydro.
+    use iso_fortran_env, only: int64
+    implicit none
+
+    integer, parameter :: nprof = 18
+    integer, parameter :: p_hydro    =  1, p_density  =  2, p_eos      =  3, &
+                          p_gravity  =  4, p_nuinit   =  5, p_nuemit   =  6, &
+                          p_nusphere =  7, p_nuabsorb =  8, p_artvis   =  9, &
+                          p_turbpres = 10, p_mlmodel  = 11, p_forces   = 12, &
+                          p_nudiff   = 13, p_energ    = 14, p_nuwork   = 15, &
+                          p_eosflg   = 16, p_burn     = 17, p_printout = 18
+    character(len=11), parameter :: prof_name(nprof) = [character(len=11) :: &
+        'hydro', '  density', '  eos', '  gravity', '  nuinit', '  nuemit',  &
+        '  nusphere', '  nuabsorb', '  artvis', '  turbpress', '   mlmodel',   &
+        '  forces', '  nudiff', '  energ', '  nuwork', 'eosflg', 'burn',      &
+        'printout']
+
+    integer          :: prof_calls(nprof)  = 0
+    double precision :: prof_time(nprof)   = 0.d0
+    double precision :: prof_dumped(nprof) = 0.d0
+    integer(int64)   :: prof_count(nprof)  = 0
+    integer          :: prof_steps = 0
+    integer(int64)   :: prof_count0 = 0, prof_rate = 1
+    logical          :: prof_header = .true.
+
+    contains
+    subroutine prof_init(ntstep)
+
+    integer :: ntstep
+
+        call system_clock(prof_count0, prof_rate)
+        prof_steps = ntstep
+
+    end subroutine
+
+    subroutine prof_start(i)
+
+    integer :: i
+
+        call system_clock(prof_count(i))
+
+    end subroutine
+
+    subroutine prof_stop(i)
+
+    integer        :: i
+    integer(int64) :: count
+
+        call system_clock(count)
+        prof_time(i)  = prof_time(i) + dble(count-prof_count(i))/dble(prof_rate)
+        prof_calls(i) = prof_calls(i) + 1
+
+    end subroutine
+
+    subroutine prof_print()
+
+    ! mean time per call, number of calls and share of the wall time so far
+    integer          :: i
+    integer(int64)   :: count
+    double precision :: wall
+
+        call system_clock(count)
+        wall = max(dble(count-prof_count0)/dble(prof_rate), 1.d-30)
+
+        write(*,'(A)') '[ profile: ms/call, calls, % of wall ]'
+        do i=1,nprof
+            if (prof_calls(i).eq.0) cycle
+            write(*,500) '[ ', prof_name(i), '          ]', prof_time(i)/prof_calls(i)*1.d3, &
+                         prof_calls(i), prof_time(i)/wall*1.d2
+        enddo
+500     format(A,A11,A,1p,E10.3,I10,0p,F7.1)
+
+    end subroutine
+
+    subroutine prof_dump(lu, idump, time, ntstep)
+
+    ! one row per dump: dump number, time (s), wall time (s) since the start,
+    ! timesteps and the time (s) spent in every phase since the previous row
+    integer          :: lu, idump, ntstep, i
+    double precision :: time
+    integer(int64)   :: count
+
+        if (prof_header) then
+            write(lu,'(A,*(1x,A))') 'idump time[s] wall[s] steps',          &
+                                    (trim(adjustl(prof_name(i))), i=1,nprof)
+            prof_header = .false.
+        endif
+
+        call system_clock(count)
+        write(lu,'(I6,1p,2(1x,E11.4),1x,I8,*(1x,E11.4))') idump, time,       &
+            dble(count-prof_count0)/dble(prof_rate),                          &
+            ntstep-prof_steps, prof_time-prof_dumped
+        call flush(lu)
+        prof_dumped = prof_time
+        prof_steps  = ntstep
+
+    end subroutine
+end module
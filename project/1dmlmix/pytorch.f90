@@ -23,30 +23,188 @@ module pytorch
     use torch_ftn
     use iso_fortran_env
 
+    ! The model is loaded once and kept resident. The caller fills ml_input;
+    ! a float64 model reads it in place, while a float32 model reads the
+    ! staging copy input_h. mlmodel_run writes the result straight into
+    ! the caller's array. With COLLAPSO_ML_SERVER set to the socket of
+    ! py_utils/ml_server.py, the inference runs there instead, batched
+    ! with the other runs on the node.
     type(torch_module)      :: torch_mod
     type(torch_tensor_wrap) :: input_tensors
     type(torch_tensor)      :: out_tensor
 
+    logical                                :: model_loaded = .false.
+    logical                                :: input_staged = .true.
+    character(len=1024)                    :: model_name   = ' '
+    double precision, allocatable, target  :: ml_input(:,:,:)
+    real(real32),     allocatable, target  :: input_h(:,:,:)
+    logical                                :: remote       = .false.
+    character(len=1024)                    :: ml_server    = ' '
+
+    ! Torch intra-op and inter-op threads, read from 'setup' and
+    ! overridden by COLLAPSO_ML_THREADS="intra[,inter]"; set once
+    integer :: ml_threads = 1, ml_interop = 1
+    logical :: threads_set = .false.
+
+    ! Inference cadence (see turbpress): fixed every ml_max_stale steps
+    ! if ml_tolerance = 0, otherwise driven by ml_input_change()
+    double precision :: ml_tolerance = 0.d0
+    integer          :: ml_max_stale = 5
+    double precision, allocatable :: input_last(:,:,:)
+
+    ! Inference timing (s)
+    integer          :: ml_calls     = 0
+    double precision :: ml_time      = 0.d0
+    double precision :: ml_time_last = 0.d0
+
     contains
+    subroutine mlmodel_init(filename, shape_input)
+
+    character(*) :: filename
+    integer      :: shape_input(3)
+    character(len=64) :: env
+    integer           :: stat
+
+        if (model_loaded) call mlmodel_free
+
+        allocate(ml_input(shape_input(1),shape_input(2),shape_input(3)))
+        allocate(input_last(shape_input(1),shape_input(2),shape_input(3)))
+        ml_input   = 0
+        input_last = 0
+        model_name = filename
+
+        call get_environment_variable('COLLAPSO_ML_SERVER', ml_server, status=stat)
+        remote = stat.eq.0 .and. len_trim(ml_server).gt.0
+        if (remote) then
+            print*, 'ML Server:             ', trim(ml_server)
+            model_loaded = .true.
+            return
+        endif
+
+        if (.not.threads_set) then
+            call get_environment_variable('COLLAPSO_ML_THREADS', env, status=stat)
+            if (stat.eq.0) then
+                read(env,*,iostat=stat) ml_threads, ml_interop
+                if (stat.ne.0) read(env,*,iostat=stat) ml_threads
+            endif
+            call torch_set_num_threads(ml_threads, ml_interop)
+            print*, 'ML Threads (intra, inter):', ml_threads, ml_interop
+            threads_set = .true.
+        endif
+
+        call torch_mod%load(filename)
+        call input_tensors%create
+
+        input_staged = torch_mod%param_size().ne.8
+        if (input_staged) then
+            allocate(input_h(shape_input(1),shape_input(2),shape_input(3)))
+            input_h = 0
+            call input_tensors%add_array(input_h)
+        else
+            call input_tensors%add_array(ml_input)
+        endif
+
+        model_loaded = .true.
+
+    end subroutine
+
+    subroutine mlmodel_run(output)
+
+    double precision, intent(inout), target, contiguous :: output(:)
+    integer(int64) :: count0, count1, count_rate
+
+        call system_clock(count0, count_rate)
+
+        if (remote) then
+            call torch_remote_forward(trim(ml_server), trim(model_name), ml_input, output)
+        else
+            if (input_staged) input_h = ml_input
+            call torch_mod%forward_into(input_tensors, output)
+        endif
+
+        call system_clock(count1)
+        ml_time_last = dble(count1-count0)/dble(count_rate)
+        ml_time      = ml_time + ml_time_last
+        ml_calls     = ml_calls + 1
+
+        input_last = ml_input
+
+    end subroutine
+
+    function ml_input_change() result(change)
+
+    ! largest relative L2 change of an input channel since the last inference;
+    ! for a channel that was all zero (e.g. turned off by a scale) the change
+    ! is the absolute norm of its current input, so it is caught turning on
+    double precision :: change, norm, diff
+    integer          :: j
+
+        change = 0.d0
+        do j=1,size(ml_input,2)
+            norm = sqrt(sum(input_last(:,j,:)**2))
+            diff = sqrt(sum((ml_input(:,j,:)-input_last(:,j,:))**2))
+            if (norm.eq.0.d0) then
+                change = max(change, diff)
+            else
+                change = max(change, diff/norm)
+            endif
+        enddo
+
+    end function
+
     function mlmodel(input, filename) result(output)
     
     real(real32)                          :: input(:,:,:)
-    real(real32), allocatable             :: input_h(:,:,:)    
     real(real32), pointer                 :: output(:,:,:)
 
     character(*) :: filename
-    integer :: arglen, stat
-    integer :: shape_input(3)
+    integer(int64) :: count0, count1, count_rate
     
-        shape_input = shape(input)
-        allocate(input_h(shape_input(1),shape_input(2),shape_input(3)))
-        input_h = input    
+        if (.not.model_loaded .or. model_name.ne.filename) then
+            call mlmodel_init(filename, shape(input))
+        elseif (any(shape(ml_input).ne.shape(input))) then
+            call mlmodel_init(filename, shape(input))
+        endif
 
-        call input_tensors%create
-        call input_tensors%add_array(input_h)              
-        call torch_mod%load(filename)
+        if (remote) stop "ERROR: mlmodel() runs locally only, use mlmodel_run with COLLAPSO_ML_SERVER"
+
+        ml_input = input    
+        if (input_staged) input_h = ml_input
+
+        call system_clock(count0, count_rate)
+
+        nullify(output)
         call torch_mod%forward(input_tensors, out_tensor)
         call out_tensor%to_array(output)
 
+        call system_clock(count1)
+        ml_time_last = dble(count1-count0)/dble(count_rate)
+        ml_time      = ml_time + ml_time_last
+        ml_calls     = ml_calls + 1
+
     end function
+
+    subroutine mlmodel_free()
+
+        if (.not.model_loaded) return
+
+        if (ml_calls.gt.0) then
+            print*, 'ML inference calls:    ', ml_calls
+            print*, 'ML inference (ms/call):', ml_time/ml_calls*1.d3
+        endif
+
+        if (remote) then
+            call torch_remote_close
+        else
+            call input_tensors%clear
+            call out_tensor%release
+            call torch_mod%release
+        endif
+        deallocate(ml_input, input_last)
+        if (allocated(input_h)) deallocate(input_h)
+
+        model_name   = ' '
+        model_loaded = .false.
+
+    end subroutine
 end module
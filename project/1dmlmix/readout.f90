@@ -8,28 +8,26 @@
 !                                                                       
       implicit double precision (a-h,o-z) 
 !                                                                       
-      parameter (idim=10000) 
-      parameter (idim1=idim+1) 
       parameter (avokb=6.02e23*1.381e-16) 
 !                                                                       
-      dimension encm(0:idim1) 
-      dimension x(0:idim1), v(0:idim1),a(0:idim1) 
-      dimension q(idim), dq(idim), u(idim), ifleos(idim) 
-      dimension deltam(idim), abar(idim), rho(idim) 
-      dimension temp(idim), ye(idim), xp(idim), xn(idim) 
-      dimension ynue(idim), ynueb(idim), ynux(idim) 
-      dimension unue(idim), unueb(idim), unux(idim) 
-      dimension ufreez(idim), pr(idim), u2(idim)
-      dimension pr_turb(idim), prnu(idim)
-      real ycc(idim,19) 
-      dimension eta(idim) 
-      dimension vsound(idim) 
-      dimension f2ynue(idim),f2ynueb(idim),f2ynux(idim) 
-      dimension f2unue(idim),f2unueb(idim),f2unux(idim) 
-      dimension etanue(idim),etanueb(idim),etanux(idim) 
-      dimension tempnue(idim), tempnueb(idim), tempnux(idim) 
-      dimension dj(idim), steps(idim)
-      logical te(idim), teb(idim), tx(idim) 
+!--the arrays are sized from the number of cells of each dump (nc)      
+!                                                                       
+      double precision, allocatable :: encm(:), x(:), v(:)
+      double precision, allocatable :: q(:), dq(:), u(:)
+      double precision, allocatable :: deltam(:), abar(:), rho(:)
+      double precision, allocatable :: temp(:), ye(:), xp(:), xn(:)
+      double precision, allocatable :: ynue(:), ynueb(:), ynux(:)
+      double precision, allocatable :: unue(:), unueb(:), unux(:)
+      double precision, allocatable :: ufreez(:), pr(:), u2(:)
+      double precision, allocatable :: pr_turb(:), vsound(:)
+      double precision, allocatable :: dj(:), steps(:)
+      integer,          allocatable :: ifleos(:)
+      real,             allocatable :: ycc(:,:)
+      logical,          allocatable :: te(:), teb(:), tx(:)
+      real,             allocatable :: abuf(:)
+      integer nmax, nf, nbuf
+      character*8 magic, names(28)
+      logical analysis
       character*1 sample,again
       character*1024 output,basename 
       character*32 dumpn 
@@ -74,6 +72,14 @@
        endif
 
       open(42,file=infile,form='unformatted') 
+!
+!--analysis dumps (Output File.ana) start with a record 'ANALYSIS' and
+!--hold only the fields named in each record, in float32; the fields
+!--that are not there are written out as zeros
+!
+      read(42,iostat=ios) magic
+      analysis = ios.eq.0.and.magic.eq.'ANALYSIS'
+      if (.not.analysis) rewind(42)
 !
       pi43=3.14159265359*4.0/3.0 
    97 continue 
@@ -83,8 +89,26 @@
       ibasenamelen = index(basename,' ')-1 
       nqn=17
       idump_old = -1
+      nmax = 0
 
       do k=1,ndump  
+         read(42) idump,nc 
+         backspace(42) 
+         if (nc.gt.nmax) then 
+            if (nmax.gt.0) deallocate(encm,x,v,q,dq,u,deltam,abar,rho,  &
+                temp,ye,xp,xn,ynue,ynueb,ynux,unue,unueb,unux,ufreez,    &
+                pr,u2,pr_turb,vsound,dj,steps,ifleos,ycc,te,teb,tx)      
+            nmax = nc 
+            allocate(encm(0:nmax+1),x(0:nmax+1),v(0:nmax+1)) 
+            allocate(q(nmax),dq(nmax),u(nmax),deltam(nmax),abar(nmax))   
+            allocate(rho(nmax),temp(nmax),ye(nmax),xp(nmax),xn(nmax))    
+            allocate(ynue(nmax),ynueb(nmax),ynux(nmax))                  
+            allocate(unue(nmax),unueb(nmax),unux(nmax))                  
+            allocate(ufreez(nmax),pr(nmax),u2(nmax),pr_turb(nmax))       
+            allocate(vsound(nmax),dj(nmax),steps(nmax),ifleos(nmax))     
+            allocate(ycc(nmax,19),te(nmax),teb(nmax),tx(nmax))           
+         endif 
+         if (analysis) goto 30
          read(42) idump,nc,t,xmcore,rb,ftrape,ftrapb,ftrapx,             &
                pns_ind,pns_x,shock_ind,shock_x,                          &
                bounce_time,from_dump,rlumnue,rlumnueb,rlumnux,           &
@@ -100,6 +124,80 @@
                (steps(i),i=1,nc),((ycc(i,j),j=1,nqn),i=1,nc),            &                  
                (vsound(i),i=1,nc),(pr_turb(i),i=1,nc)
             !    (prnu(i),i=1,nc)   
+         goto 40
+!
+!--analysis dump: size the float32 payload from the field names first
+!
+   30    read(42) idump,nc,t,xmcore,rb,ftrape,ftrapb,ftrapx,             &
+               pns_ind,pns_x,shock_ind,shock_x,                          &
+               bounce_time,from_dump,rlumnue,rlumnueb,rlumnux,           &
+               nf,(names(j),j=1,nf)
+         backspace(42)
+         nbuf = 0
+         do j=1,nf
+            if (names(j).eq.'x'.or.names(j).eq.'v') then
+               nbuf = nbuf+nc+1
+            elseif (names(j).eq.'ycc') then
+               nbuf = nbuf+nc*nqn
+            else
+               nbuf = nbuf+nc
+            endif
+         enddo
+         if (allocated(abuf)) deallocate(abuf)
+         allocate(abuf(nbuf))
+         read(42) idump,nc,t,xmcore,rb,ftrape,ftrapb,ftrapx,             &
+               pns_ind,pns_x,shock_ind,shock_x,                          &
+               bounce_time,from_dump,rlumnue,rlumnueb,rlumnux,           &
+               nf,(names(j),j=1,nf),(abuf(i),i=1,nbuf)
+
+         x=0.; v=0.; q=0.; dq=0.; u=0.; deltam=0.; abar=0.; rho=0.
+         temp=0.; ye=0.; xp=0.; xn=0.; ifleos=1; ynue=0.; ynueb=0.
+         ynux=0.; unue=0.; unueb=0.; unux=0.; ufreez=0.; pr=0.; u2=0.
+         dj=0.; steps=0.; ycc=0.; vsound=0.; pr_turb=0.
+         te=.false.; teb=.false.; tx=.false.
+         ib = 0
+         do j=1,nf
+            select case (names(j))
+            case ('x');       x(0:nc)      = abuf(ib+1:ib+nc+1)
+            case ('v');       v(0:nc)      = abuf(ib+1:ib+nc+1)
+            case ('q');       q(1:nc)      = abuf(ib+1:ib+nc)
+            case ('dq');      dq(1:nc)     = abuf(ib+1:ib+nc)
+            case ('u');       u(1:nc)      = abuf(ib+1:ib+nc)
+            case ('deltam');  deltam(1:nc) = abuf(ib+1:ib+nc)
+            case ('abar');    abar(1:nc)   = abuf(ib+1:ib+nc)
+            case ('rho');     rho(1:nc)    = abuf(ib+1:ib+nc)
+            case ('temp');    temp(1:nc)   = abuf(ib+1:ib+nc)
+            case ('ye');      ye(1:nc)     = abuf(ib+1:ib+nc)
+            case ('xp');      xp(1:nc)     = abuf(ib+1:ib+nc)
+            case ('xn');      xn(1:nc)     = abuf(ib+1:ib+nc)
+            case ('ifleos');  ifleos(1:nc) = nint(abuf(ib+1:ib+nc))
+            case ('ynue');    ynue(1:nc)   = abuf(ib+1:ib+nc)
+            case ('ynueb');   ynueb(1:nc)  = abuf(ib+1:ib+nc)
+            case ('ynux');    ynux(1:nc)   = abuf(ib+1:ib+nc)
+            case ('unue');    unue(1:nc)   = abuf(ib+1:ib+nc)
+            case ('unueb');   unueb(1:nc)  = abuf(ib+1:ib+nc)
+            case ('unux');    unux(1:nc)   = abuf(ib+1:ib+nc)
+            case ('ufreez');  ufreez(1:nc) = abuf(ib+1:ib+nc)
+            case ('pr');      pr(1:nc)     = abuf(ib+1:ib+nc)
+            case ('s');       u2(1:nc)     = abuf(ib+1:ib+nc)
+            case ('dj');      dj(1:nc)     = abuf(ib+1:ib+nc)
+            case ('steps');   steps(1:nc)  = abuf(ib+1:ib+nc)
+            case ('vsound');  vsound(1:nc) = abuf(ib+1:ib+nc)
+            case ('pr_turb'); pr_turb(1:nc)= abuf(ib+1:ib+nc)
+            case ('ycc')
+               do i=1,nc
+                  ycc(i,1:nqn) = abuf(ib+(i-1)*nqn+1:ib+i*nqn)
+               enddo
+            end select
+            if (names(j).eq.'x'.or.names(j).eq.'v') then
+               ib = ib+nc+1
+            elseif (names(j).eq.'ycc') then
+               ib = ib+nc*nqn
+            else
+               ib = ib+nc
+            endif
+         enddo
+   40    continue
                
 !                read(42) nc,t,xmcore,rb,ftrape,ftrapb,ftrapx,    &
 !                   (x(i),i=0,nc),(v(i),i=0,nc),(q(i),i=1,nc),(dq(i),i=1,nc), &
@@ -20,6 +20,7 @@ import time
 import shutil
 from subprocess import Popen, PIPE
 from mpi4py import MPI
+from history import RunHistory
 import h5py as h5
 
 sys.path.append("/home/pkarpov/Sapsan")
@@ -370,14 +371,11 @@ class Readout:
         return get_numfiles(self.base_path, self.dataset, self.base_file)
     
     def get_all_outfiles(self):
-        outfiles = [filename for filename in os.listdir(f'{self.base_path}{self.dataset}') if ("restart" in filename or filename=='DataOut')]
-        if self.only_last:
-            if any("restart" in file for file in outfiles):   
-                to_remove = 'DataOut'  
-                try: outfiles.remove(f'{to_remove}')       
-                except: colored.warn(f"No '{to_remove}', only '_restart_'")
-                last_num   = max([int(filename.split('_')[-1]) for filename in outfiles])            
-                return [f"DataOut_restart_{last_num}"]
+        # the files of the run's history in the order they were written, so the
+        # later file wins for dumps repeated at restarts; the analysis dumps
+        # (*.ana) are written every dump interval and are used when there are any
+        outfiles = RunHistory(self.full_output_path).files()
+        if self.only_last: return outfiles[-1:]
         return outfiles
 
     def copy_readout(self):
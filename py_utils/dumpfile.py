@@ -0,0 +1,151 @@
+# Reader of the binary dumps of 1dmlmix, without the readout conversion.
+#
+# Full dumps (Output File, DataOut_restart_N) hold the whole state in
+# float64 and are the ones to restart from; analysis dumps (Output File.ana,
+# see the 'Analysis Output' entry of setup) start with a record b'ANALYSIS'
+# and hold the header and the fields named in each record in float32.
+#
+#   for dump in read_dumps('DataOut.ana'):
+#       print(dump['idump'], dump['t'], dump['rho'][:5])
+#
+# Times are in code units (x10 s), as in the files. The engine lists every
+# complete record in <file>.idx (dump number, byte offset), which readini
+# uses to jump to the dump to restart from; for files written before the
+# index existed, build it with
+#   python dumpfile.py DataOut DataOut_restart_1 ...
+
+import os
+import sys
+import struct
+from array import array
+
+utime = 10  # code time  -> s
+udist = 1e9 # code length -> cm
+
+iqn = 17
+
+# idump, nc, t, xmcore, rb, ftrape, ftrapb, ftrapx, pns_ind, pns_x,
+# shock_ind, shock_x, bounce_time, from_dump, rlumnue, rlumnueb, rlumnux
+header_format = '=ii11di3d'
+header_size   = struct.calcsize(header_format)
+header_names  = ['idump', 'nc', 't', 'xmcore', 'rb', 'ftrape', 'ftrapb', 'ftrapx',
+                 'pns_ind', 'pns_x', 'shock_ind', 'shock_x', 'bounce_time', 'from_dump',
+                 'rlumnue', 'rlumnueb', 'rlumnux']
+
+# fields of a full dump in file order: name, array typecode, edge centred
+full_fields = [('x', 'd', True), ('v', 'd', True), ('q', 'd', False), ('dq', 'd', False),
+               ('u', 'd', False), ('deltam', 'd', False), ('abar', 'd', False),
+               ('rho', 'd', False), ('temp', 'd', False), ('ye', 'd', False),
+               ('xp', 'd', False), ('xn', 'd', False), ('ifleos', 'i', False),
+               ('ynue', 'd', False), ('ynueb', 'd', False), ('ynux', 'd', False),
+               ('unue', 'd', False), ('unueb', 'd', False), ('unux', 'd', False),
+               ('ufreez', 'd', False), ('pr', 'd', False), ('s', 'd', False),
+               ('dj', 'd', False), ('trapnue', 'i', False), ('trapnueb', 'i', False),
+               ('trapnux', 'i', False), ('steps', 'd', False), ('ycc', 'f', False),
+               ('vsound', 'd', False), ('pr_turb', 'd', False), ('prnu', 'd', False)]
+
+
+def is_analysis(filename):
+    with open(filename, 'rb') as file:
+        return file.read(12) == struct.pack('=i', 8)+b'ANALYSIS'
+
+
+def records(file):
+    # yields (offset, payload) of the complete records from the current position
+    while True:
+        offset = file.tell()
+        marker = file.read(4)
+        if len(marker) < 4: return
+        reclen  = struct.unpack('=i', marker)[0]
+        payload = file.read(reclen)
+        if len(payload) < reclen or len(file.read(4)) < 4: return # record still being written
+        yield offset, payload
+
+
+def parse_header(payload):
+    return dict(zip(header_names, struct.unpack(header_format, payload[:header_size])))
+
+
+def parse_record(payload, analysis, fields=None):
+    # header plus the requested fields (all if None); ycc is cell-major, iqn per cell
+    dump = parse_header(payload)
+    nc   = dump['nc']
+    pos  = header_size
+
+    if analysis:
+        nf    = struct.unpack('=i', payload[pos:pos+4])[0]
+        names = [payload[pos+4+8*k:pos+12+8*k].decode().strip() for k in range(nf)]
+        pos  += 4+8*nf
+        layout = [(name, 'f', name in ('x', 'v')) for name in names]
+    else:
+        layout = full_fields
+
+    for name, typecode, edge in layout:
+        count = nc+1 if edge else (nc*iqn if name == 'ycc' else nc)
+        size  = count*array(typecode).itemsize
+        if fields == None or name in fields:
+            values = array(typecode)
+            values.frombytes(payload[pos:pos+size])
+            dump[name] = values
+        pos += size
+
+    return dump
+
+
+def read_headers(filename, offset=None):
+    # headers of the complete records and their byte offsets, seeking over the
+    # payloads; from the record at `offset` on, if given
+    analysis = is_analysis(filename)
+    size     = os.path.getsize(filename)
+    if offset == None: offset = 4+8+4 if analysis else 0 # past the b'ANALYSIS' record
+    with open(filename, 'rb') as file:
+        while offset+4+header_size <= size:
+            file.seek(offset)
+            reclen = struct.unpack('=i', file.read(4))[0]
+            if offset+reclen+8 > size: return # record still being written
+
+            header = parse_header(file.read(header_size))
+            header['offset'] = offset
+            header['reclen'] = reclen
+            yield header
+            offset += reclen+8
+
+
+def read_dumps(filename, fields=None):
+    analysis = is_analysis(filename)
+    with open(filename, 'rb') as file:
+        for offset, payload in records(file):
+            if analysis and offset == 0: continue
+            yield parse_record(payload, analysis, fields)
+
+
+def read_dump(filename, offset, fields=None):
+    # the dump whose record starts at byte `offset`, e.g. from read_index
+    analysis = is_analysis(filename)
+    with open(filename, 'rb') as file:
+        file.seek(offset)
+        for offset, payload in records(file):
+            return parse_record(payload, analysis, fields)
+
+
+def read_index(filename):
+    # {idump: byte offset} of <file>.idx, first of repeated dumps; None without index
+    if not os.path.isfile(f'{filename}.idx'): return None
+    index = {}
+    with open(f'{filename}.idx', 'r') as file:
+        for line in file:
+            idump, offset = [int(value) for value in line.split()]
+            index.setdefault(idump, offset)
+    return index
+
+
+def write_index(filename):
+    with open(f'{filename}.idx', 'w') as file:
+        for header in read_headers(filename):
+            file.write(f"{header['idump']:8d} {header['offset']:16d}\n")
+
+
+if __name__ == '__main__':
+    for filename in sys.argv[1:]:
+        write_index(filename)
+        print(f'{filename}.idx')
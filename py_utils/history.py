@@ -0,0 +1,156 @@
+# Output history of a run: all of its binary outputs (DataOut,
+# DataOut_restart_1, ... and their *.ana analysis streams) as one
+# deduplicated, time-ordered sequence of dumps.
+#
+# A restart from dump k of one file writes the dumps after k to the next
+# DataOut_restart_N, so the later file of the chain supersedes every dump
+# of the earlier ones from its first dump on (the dump at a restart
+# boundary, and whatever an earlier attempt wrote past the restart point).
+# The dump number, time and byte offset of every record are kept in
+# history.json in the run's output folder; update() only reads the
+# headers of records appended since the last update, so it is cheap to
+# call on every restart (setup_run_mpi does) or while the run goes on.
+#
+#   history = RunHistory(f'{output_path}/s12.0_g8k_c7k_p0.6k')
+#   dump    = history.read(120, fields=['x', 'rho'])
+#   for dump in history.read_all(fields=['x', 'v']): ...
+#
+# Without `analysis`, the analysis stream is used when the run has one
+# (it is written every dump interval), otherwise the full dumps. Times
+# are in code units (x10 s), as in the files.
+#
+#   python history.py <run output folder> [dump #]
+
+import os
+import re
+import sys
+import json
+
+from dumpfile import is_analysis, read_headers, read_dump, utime
+
+manifest_name = 'history.json'
+outfile_re    = re.compile(r'^DataOut(_restart_(\d+))?(\.ana)?$')
+
+
+class RunHistory:
+    def __init__(self, full_output_path, update=True):
+        self.full_output_path = full_output_path
+        self.manifest         = f'{full_output_path}/{manifest_name}'
+        self.outfiles         = {}  # file: {'size', 'next', 'analysis', 'dumps': [[idump, t, offset]]}
+
+        if os.path.isfile(self.manifest):
+            with open(self.manifest, 'r') as file:
+                self.outfiles = json.load(file)['files']
+        if update: self.update()
+
+    def update(self):
+        # reads the headers appended to the outputs since the last update
+        names   = [filename for filename in os.listdir(self.full_output_path) if outfile_re.match(filename)]
+        changed = False
+        for filename in list(self.outfiles):
+            if filename not in names:
+                del self.outfiles[filename]
+                changed = True
+
+        for filename in names:
+            path  = f'{self.full_output_path}/{filename}'
+            size  = os.path.getsize(path)
+            entry = self.outfiles.get(filename)
+            if entry != None and entry['size'] == size: continue
+            if size == 0: continue
+
+            # a file written anew (fresh run on the same folder) starts over
+            if entry != None and (size < entry['size'] or not self.same_file(path, entry)): entry = None
+            if entry == None:
+                entry = {'size': 0, 'next': None, 'analysis': is_analysis(path), 'dumps': []}
+
+            for header in read_headers(path, entry['next']):
+                entry['dumps'].append([header['idump'], header['t'], header['offset']])
+                entry['next'] = header['offset']+header['reclen']+8
+            entry['size'] = size
+            self.outfiles[filename] = entry
+            changed = True
+
+        if changed: self.write()
+        return self
+
+    def same_file(self, path, entry):
+        if len(entry['dumps']) == 0: return True
+        for header in read_headers(path, entry['dumps'][0][2]):
+            return [header['idump'], header['t']] == entry['dumps'][0][:2]
+        return False
+
+    def write(self):
+        # replaced in one go, so readers never see a partial manifest
+        with open(f'{self.manifest}.tmp', 'w') as file:
+            json.dump({'files': self.outfiles}, file)
+        os.replace(f'{self.manifest}.tmp', self.manifest)
+
+    def chain(self, analysis=None):
+        # the files of one stream, in the order they were written
+        if analysis == None:
+            analysis = any(entry['analysis'] for entry in self.outfiles.values())
+
+        chain = [filename for filename, entry in self.outfiles.items()
+                 if entry['analysis'] == analysis and len(entry['dumps']) > 0]
+        return sorted(chain, key=lambda filename: int(outfile_re.match(filename).group(2) or 0))
+
+    def dumps(self, analysis=None):
+        # [{'idump', 't', 'file', 'offset'}] in time order, one per dump number
+        dumps = {}
+        for filename in self.chain(analysis):
+            records = self.outfiles[filename]['dumps']
+            first   = min(record[0] for record in records)
+            dumps   = {idump: dump for idump, dump in dumps.items() if idump < first}
+            for idump, t, offset in records:
+                # a dump written twice to one file (the last one at Max time): the later one
+                dumps[idump] = {'idump': idump, 't': t, 'file': filename, 'offset': offset}
+
+        return [dumps[idump] for idump in sorted(dumps)]
+
+    def files(self, analysis=None):
+        # the files holding at least one dump of the history
+        files = []
+        for dump in self.dumps(analysis):
+            if dump['file'] not in files: files.append(dump['file'])
+        return files
+
+    def last(self, analysis=None):
+        dumps = self.dumps(analysis)
+        return dumps[-1] if len(dumps) > 0 else None
+
+    def find(self, idump, analysis=None):
+        for dump in self.dumps(analysis):
+            if dump['idump'] == idump: return dump
+        raise KeyError(f'dump {idump} is not in the history of {self.full_output_path}')
+
+    def read(self, idump, fields=None, analysis=None):
+        # the dump with number idump, parsed as in dumpfile.read_dumps
+        dump = self.find(idump, analysis)
+        return read_dump(f"{self.full_output_path}/{dump['file']}", dump['offset'], fields)
+
+    def read_all(self, fields=None, analysis=None, start=None):
+        # every dump of the history in order, from dump # start on
+        for dump in self.dumps(analysis):
+            if start != None and dump['idump'] < start: continue
+            yield read_dump(f"{self.full_output_path}/{dump['file']}", dump['offset'], fields)
+
+
+if __name__ == '__main__':
+    history = RunHistory(sys.argv[1])
+
+    if len(sys.argv) > 2:
+        dump = history.read(int(sys.argv[2]))
+        for name, value in dump.items():
+            if isinstance(value, (int, float)): print(f'{name:12s} {value}')
+            else: print(f'{name:12s} [{len(value)}] {value[0]:.6e} ... {value[-1]:.6e}')
+    else:
+        for analysis in (False, True):
+            dumps = history.dumps(analysis)
+            if len(dumps) == 0: continue
+            print(f"{'analysis' if analysis else 'full'}: {len(dumps)} dumps, "+
+                  f"{dumps[0]['idump']}-{dumps[-1]['idump']}, "+
+                  f"t = {dumps[0]['t']*utime:.4f}-{dumps[-1]['t']*utime:.4f} s")
+            for filename in history.files(analysis):
+                numbers = [dump['idump'] for dump in dumps if dump['file'] == filename]
+                print(f'  {filename:24s} {numbers[0]:6d}-{numbers[-1]:6d}')
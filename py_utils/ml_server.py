@@ -0,0 +1,221 @@
+# Local inference server shared by the 1dmlmix runs on a node.
+#
+# Every model is loaded once, and concurrent requests for the same model
+# and input shape are stacked along the batch dimension into one forward.
+# The engine is pointed at the server with
+#   export COLLAPSO_ML_SERVER=/tmp/collapso_ml.sock
+# in which case mlmodel_run (pytorch.f90) sends its input over the socket instead of
+# loading libtorch and the model in every process.
+#
+#   python ml_server.py --socket /tmp/collapso_ml.sock --threads 8
+#   python ml_server.py --standin   (no torch: returns the channel mean)
+#
+# Protocol (native byte order, one request/response at a time per connection):
+#   request : b'CMLR', uint32 len, model path, uint32 rank, int64 shape[rank]
+#             (torch order), uint32 element size (4 or 8), input data
+#   response: uint32 status, uint64 n, then n float64 values (status 0)
+#             or an n-byte error message
+
+import os
+import sys
+import time
+import queue
+import signal
+import struct
+import argparse
+import threading
+import socketserver
+from array import array
+
+
+class TorchModel:
+    def __init__(self, path, threads):
+        import torch
+        self.torch = torch
+        if threads > 0: torch.set_num_threads(threads)
+
+        self.model = torch.jit.load(path)
+        self.model.eval()
+        params     = list(self.model.parameters())
+        self.dtype = params[0].dtype if len(params) > 0 else torch.float32
+
+    def forward(self, batch):
+        torch = self.torch
+        types = {4: torch.float32, 8: torch.float64}
+
+        x = torch.cat([torch.frombuffer(bytearray(data), dtype=types[size]).reshape(shape)
+                       for shape, size, data in batch], 0).to(self.dtype)
+        with torch.inference_mode():
+            y = self.model(x)
+        y = y.reshape(len(batch), -1).to(torch.float64)
+
+        return [y[i].contiguous().numpy().tobytes() for i in range(len(batch))]
+
+
+class StandinModel:
+    # mean over the channels at every grid point; stands in for a model in tests
+    def forward(self, batch):
+        results = []
+        for shape, size, data in batch:
+            values = array('f' if size == 4 else 'd', data)
+            n, channels, length = shape[0], shape[1], shape[-1]
+            mean = array('d', [0.0]*(n*length))
+            for b in range(n):
+                for c in range(channels):
+                    offset = (b*channels+c)*length
+                    for i in range(length): mean[b*length+i] += values[offset+i]/channels
+            results.append(mean.tobytes())
+        return results
+
+
+class Request:
+    def __init__(self, shape, size, data):
+        self.shape  = shape
+        self.size   = size
+        self.data   = data
+        self.result = None
+        self.error  = None
+        self.done   = threading.Event()
+
+
+class Batcher(threading.Thread):
+    #
+    # Collects requests for one model and input shape; the first request
+    # waits at most `window` seconds for others to join its batch
+    #
+    def __init__(self, model, window, max_batch, stats):
+        super().__init__(daemon=True)
+        self.model     = model
+        self.window    = window
+        self.max_batch = max_batch
+        self.stats     = stats
+        self.queue     = queue.Queue()
+
+    def run(self):
+        while True:
+            batch    = [self.queue.get()]
+            deadline = time.time()+self.window
+            while len(batch) < self.max_batch:
+                try:    batch.append(self.queue.get(timeout=max(deadline-time.time(), 0)))
+                except queue.Empty: break
+
+            try:
+                results = self.model.forward([(r.shape, r.size, r.data) for r in batch])
+                for request, result in zip(batch, results): request.result = result
+            except Exception as e:
+                for request in batch: request.error = str(e)
+
+            self.stats['forwards'] += 1
+            self.stats['requests'] += len(batch)
+            for request in batch: request.done.set()
+
+
+class MLServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, window=2e-3, max_batch=64, threads=0, standin=False):
+        if os.path.exists(socket_path): os.remove(socket_path)
+        super().__init__(socket_path, Handler)
+
+        self.window    = window
+        self.max_batch = max_batch
+        self.threads   = threads
+        self.standin   = standin
+        self.models    = {}
+        self.batchers  = {}
+        self.lock      = threading.Lock()
+        self.stats     = {'forwards': 0, 'requests': 0}
+
+    def batcher(self, model_path, shape, size):
+        key = (model_path, tuple(shape[1:]), size)
+        with self.lock:
+            if key not in self.batchers:
+                if model_path not in self.models:
+                    if self.standin: self.models[model_path] = StandinModel()
+                    else:            self.models[model_path] = TorchModel(model_path, self.threads)
+                    print(f'Loaded {model_path}', flush=True)
+                self.batchers[key] = Batcher(self.models[model_path], self.window, self.max_batch, self.stats)
+                self.batchers[key].start()
+        return self.batchers[key]
+
+
+class Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            header = self.recv(8)
+            if header == None: return
+            magic, length = struct.unpack('=4sI', header)
+            if magic != b'CMLR': return
+
+            request = self.read_request(length)
+            # client gone mid-request: returning lets socketserver close the connection
+            if request == None: return
+            model, request = request
+
+            try:
+                self.server.batcher(model, request.shape, request.size).queue.put(request)
+                request.done.wait()
+            except Exception as e:
+                request.error = str(e)
+
+            if request.error == None:
+                self.request.sendall(struct.pack('=IQ', 0, len(request.result)//8)+request.result)
+            else:
+                message = request.error.encode()
+                self.request.sendall(struct.pack('=IQ', 1, len(message))+message)
+
+    def read_request(self, length):
+        # (model, Request) after the header, None if the client disconnects
+        model = self.recv(length)
+        if model == None: return None
+        rank  = self.recv(4)
+        if rank == None: return None
+        rank  = struct.unpack('=I', rank)[0]
+        shape = self.recv(8*rank)
+        if shape == None: return None
+        shape = struct.unpack(f'={rank}q', shape)
+        size  = self.recv(4)
+        if size == None: return None
+        size  = struct.unpack('=I', size)[0]
+        count = 1
+        for n in shape: count *= n
+        data  = self.recv(count*size)
+        if data == None: return None
+        return model.decode(), Request(shape, size, data)
+
+    def recv(self, n):
+        chunks = []
+        while n > 0:
+            try:    chunk = self.request.recv(min(n, 2**20))
+            except ConnectionResetError: return None
+            if not chunk: return None
+            chunks.append(chunk)
+            n -= len(chunk)
+        return b''.join(chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batched inference server for 1dmlmix')
+    parser.add_argument('--socket',    default='/tmp/collapso_ml.sock', help='Unix socket path')
+    parser.add_argument('--window',    type=float, default=2.0, help='batching window (ms)')
+    parser.add_argument('--max-batch', type=int,   default=64,  help='maximum requests per forward')
+    parser.add_argument('--threads',   type=int,   default=0,   help='torch intra-op threads (0: torch default)')
+    parser.add_argument('--standin',   action='store_true',     help='channel-mean stand-in instead of torch models')
+    args = parser.parse_args()
+
+    server = MLServer(args.socket, args.window*1e-3, args.max_batch, args.threads, args.standin)
+    print(f'Serving on {args.socket}', flush=True)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stats = server.stats
+        if stats['forwards'] > 0:
+            print(f"{stats['requests']} requests in {stats['forwards']} forwards "+
+                  f"(mean batch {stats['requests']/stats['forwards']:.1f})", flush=True)
+        os.remove(args.socket)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# Live view of the runs of a sweep.
+#
+# Every run supervised by multirun keeps a summary in status.json in its
+# output folder, refreshed every poll_interval from the records appended
+# to its dumps, nu_lum.txt and timing.txt (see policies.RunMonitor). This
+# script lists them side by side, to spot failed or uninteresting runs
+# early and free their cores:
+#   python monitor.py sweeps/baseline.json           # the runs of a sweep
+#   python monitor.py <output path>/s12.0_g8k ...     # any run folders
+#   python monitor.py sweeps/baseline.json --watch 60 # refreshed every 60 s
+# Runs without status.json (not started by multirun) are followed by the
+# monitor itself, reading only the new records at every refresh.
+
+import os
+import json
+import time
+import argparse
+from policies import RunMonitor
+
+columns = [('status', '{:<10}', 10), ('time', '{:8.1f}', 8), ('postbounce', '{:8.1f}', 8),
+           ('shock', '{:7.0f}', 7), ('pns', '{:6.0f}', 6), ('lnue', '{:8.2e}', 8),
+           ('lnueb', '{:8.2e}', 8), ('lnux', '{:8.2e}', 8), ('steps_per_s', '{:8.1f}', 8)]
+titles  = ['status', 't[ms]', 'tpb[ms]', 'shock', 'PNS', 'Lnue', 'Lnueb', 'Lnux', 'steps/s']
+
+
+class SweepView:
+    def __init__(self, runs, states=None):
+        self.runs     = runs          # {run_name: full_output_path}
+        self.states   = states or {}  # {run_name: status in the sweep state}
+        self.monitors = {}
+
+    def summary(self, run_name):
+        path = self.runs[run_name]
+        if os.path.isfile(f'{path}/status.json'):
+            with open(f'{path}/status.json', 'r') as file:
+                return json.load(file)
+        if not os.path.isdir(path): return {'status': self.states.get(run_name, 'pending')}
+
+        if run_name not in self.monitors: self.monitors[run_name] = RunMonitor(path)
+        self.monitors[run_name].update()
+        summary = self.monitors[run_name].summary()
+        summary['status'] = self.states.get(run_name, '-')
+        return summary
+
+    def show(self):
+        width = max([len(run_name) for run_name in self.runs] + [3])
+        header = [f'{title:<{size}}' if key == 'status' else f'{title:>{size}}'
+                  for title, (key, _, size) in zip(titles, columns)]
+        print(f"{'run':<{width}} "+' '.join(header)+'  updated')
+        for run_name in self.runs:
+            summary = self.summary(run_name)
+            # the sweep knows runs that ended for good, status.json the outcome of the last attempt
+            if self.states.get(run_name) in ['finished', 'terminated', 'failed']:
+                summary['status'] = self.states[run_name]
+
+            row = []
+            for key, form, size in columns:
+                value = summary.get(key)
+                row.append(form.format(value) if value != None else f"{'-':>{size}}")
+            updated = summary.get('updated')
+            age     = f'{(time.time()-updated)/60:5.1f} min ago' if updated != None else ''
+            if summary.get('nan'): age += ' NaN'
+            print(f'{run_name:<{width}} '+' '.join(row)+f'  {age}')
+
+
+def sweep_runs(spec_path):
+    from sweep import Sweep
+
+    sweep   = Sweep(spec_path)
+    states  = sweep.state.load()
+    runs    = {}
+    for member in sweep.expand():
+        runs[member['run_name']] = f"{sweep.output_path}/{member['run_name']}"
+    return runs, dict([(run_name, entry.get('status')) for run_name, entry in states.items()])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Status of running simulations')
+    parser.add_argument('paths', nargs='+', help='sweep spec (*.json) or run output folders')
+    parser.add_argument('--watch', type=float, default=None, help='refresh every WATCH seconds')
+    args = parser.parse_args()
+
+    runs, states = {}, {}
+    for path in args.paths:
+        if path.endswith('.json'):
+            sweep, sweep_states = sweep_runs(path)
+            runs.update(sweep)
+            states.update(sweep_states)
+        else: runs[os.path.basename(os.path.normpath(path))] = path
+
+    view = SweepView(runs, states)
+    while True:
+        if args.watch != None: print('\033[2J\033[H', end='')
+        view.show()
+        if args.watch == None: break
+        time.sleep(args.watch)
@@ -1,72 +1,94 @@
 # The script prepares and launches multiple COLLPASO1D runs,
-# each running independently on the cores provided. 
+# each running independently on the cores provided.
 # Run initialization is performed in serial, but compilation
 # and execution is spread between all available cores via MPI.
+#
+# The runs are described by a sweep specification (see sweep.py),
+# e.g. for the ML-augmented runs:
+#   mpirun -n 6 python multirun.py sweeps/ml.json
+# Crashed or stalled runs are restarted from their last dump up
+# to 'max_retries' times (set in the spec's "options").
+# Relaunching the same command resumes the sweep: finished runs
+# are skipped, started or failed runs restart from their last dump, and
+# the next unfinished runs are assigned to the available ranks.
+# The sweep is a queue: once its run finishes, fails or is terminated
+# early, a rank takes the next member nobody has claimed yet, so
+# sweeps larger than the number of ranks run in a single launch.
+# Such members are initialized by the rank that takes them; data
+# preparation and the template copy are done under a lock on the
+# shared template (multirun.template_lock), one rank at a time.
+# While the runs go on, follow them with
+#   python monitor.py sweeps/ml.json --watch 60
 
 # -pikarpov
 
-import numpy as np
+import sys
 import time
+import uuid
 from mpi4py import MPI
-from setup_run_mpi import multirun
+from sweep import Sweep
+from setup_run_mpi import colored
 
 def main():
-    
+
     comm = MPI.COMM_WORLD
     size = comm.Get_size()
-    rank = comm.Get_rank()    
-        
-    # masses = [19.0]
-    masses = [12.0,13.0,16.0,17.0,18.0,19.0]
-              #12.0,13.0,14.0,15.0,
-              #16.0,17.0,18.0,19.0]
-    enclosed_mass_cutoff = [1.7 for i in masses] # 1.67415 for all except s19.0
-    pns_cutoff           = [1.1 for i in masses]
-    pns_grid_goals       = [600 for i in masses]
-    conv_grid_goals      = [7000 for i in masses]
-    grid_goals           = [8000 for i in masses]
-    maxrads              = [1.5e9 for i in masses] # 1e9 for 9.0 and 10.0
-    suffixs              = ['_g8k_c7k_p0.6k' for i in masses]
-    # suffixs              = ['_g2k_c1.4k_p0.3k' for i in masses]
-    
-    dataset         = 'sukhbold2016'
-    # base_path       = '/home/pkarpov/production/nodamp/baseline'
-    # template_path   = '/home/pkarpov/production/nodamp/template'
-    # output_path     = '/home/pkarpov/scratch/1dccsn/sfho_s/production/nodamp/baseline'
-    base_path       = '/home/pkarpov/production/8k_runs/baseline'
-    template_path   = '/home/pkarpov/production/8k_runs/template'
-    output_path     = '/home/pkarpov/scratch/1dccsn/sfho_s/production/8k_runs/baseline'    
-    eos_table_path  = '/home/pkarpov/COLLAPSO1D/project/1dmlmix/Hempel_SFHoEOS_rho222_temp180_ye60_version_1.3_20190605.h5'
-    mlmodels        = ['None' for i in masses]
-    constant_Pturb  = 0.0
-    read_dump       = 0
-    dump_interval   = 5e-4
-    restart         = False
-    eos             = 5
-    maxtime         = 0.7
-    
-    mr = multirun(suffixs,masses,enclosed_mass_cutoff,pns_cutoff,
-                  dataset,base_path,template_path,output_path,eos_table_path,
-                  pns_grid_goals, conv_grid_goals, grid_goals,maxrads, 
-                  mlmodels, read_dump, dump_interval, restart, 
-                  maxtime=maxtime, eos=eos, pturb=constant_Pturb)    
-    if rank == 0:        
-        if len(mr.masses) != size:
-            print(f'Ranks are not distributed well!\nRank size {size} for {len(mr.masses)} datasets')
-            comm.Abort()
-        if not restart: mr.initialize(rank) # will initialize in serial
-            
-    if restart: mr.initialize(rank) # processes existing data in parallel
-    
+    rank = comm.Get_rank()
+
+    spec  = sys.argv[1] if len(sys.argv) > 1 else 'sweeps/baseline.json'
+    sweep = Sweep(spec)
+    sweep.options.setdefault('prep_nproc', size)
+
+    # rank 0 decides what to run first, so all ranks see the same schedule;
+    # the members are claimed in the state file for this launch
+    if rank == 0:
+        launch   = uuid.uuid4().hex
+        schedule = (launch, sweep.schedule(size, launch))
+    else: schedule = None
+    launch, (fresh, restart) = comm.bcast(schedule, root=0)
+
+    nfresh = len(fresh)
+    nruns  = nfresh+len(restart)
+    if nruns == 0:
+        if rank == 0: colored.head(f"Sweep '{sweep.name}' is complete")
+        return
+    if rank == 0 and nruns < size:
+        colored.warn(f'Rank size {size} for {nruns} remaining runs: {size-nruns} ranks idle')
+
+    if nfresh > 0:       mr_fresh   = sweep.multirun(fresh)
+    if len(restart) > 0: mr_restart = sweep.multirun(restart, restart=True)
+
+    if rank == 0 and nfresh > 0:
+        mr_fresh.initialize(rank) # will initialize in serial
+        for member in fresh: sweep.state.update(member, status='initialized')
+
+    if nfresh <= rank < nruns:
+        mr_restart.initialize(rank-nfresh) # processes existing data in parallel
+
     comm.Barrier()
     time.sleep(0.1)
-        
-    mr.run_name         = f's{mr.masses[rank]}{mr.suffixs[rank]}'
-    mr.run_path         = f'{mr.base_path}/{mr.run_name}'
-    mr.sim_path         = f'{mr.run_path}/project/1dmlmix'
-    mr.full_output_path = f'{mr.output_path}/{mr.run_name}'
-
-    mr.run(rank)               
-        
+
+    if rank < nfresh:   mr, i, member = mr_fresh, rank, fresh[rank]
+    elif rank < nruns:  mr, i, member = mr_restart, rank-nfresh, restart[rank-nfresh]
+    else:               member = None
+
+    # a rank whose run is over takes the next unclaimed member, until none is left
+    while member != None:
+        mr.setup_pars(i)
+        mr.sim_path = f'{mr.run_path}/project/1dmlmix'
+
+        sweep.state.update(member, status='running', rank=rank)
+        status = mr.run(rank)
+        if status == 'finished':              sweep.state.update(member, status='finished')
+        elif status.startswith('terminated'): sweep.state.update(member, status='terminated', reason=status)
+        else:                                 sweep.state.update(member, status='failed', reason=status)
+
+        member = sweep.claim(launch)
+        if member != None:
+            colored.subhead(f"rank {rank} takes {member['run_name']} from the queue")
+            mr, i = sweep.multirun([member], restart=sweep.started(member)), 0
+            mr.initialize(i, ask=False)
+            if not mr.restart: sweep.state.update(member, status='initialized')
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,196 @@
+# Early-termination policies for running simulations.
+#
+# RunMonitor tails a run's nu_lum.txt, timing.txt and the headers of its
+# binary dumps (through its RunHistory, see history.py), reading only what
+# was appended since the last update, and keeps a summary of the run in
+# status.json next to them (see monitor.py); one monitor follows one
+# attempt of a run, a restarted attempt gets a new one. Each policy looks
+# at the monitored history and returns the reason to stop the run, or
+# None to let it continue. Policies are given in the sweep spec as, e.g.
+#   "policies": [{"type": "shock_beyond",   "radius": 3000},
+#                {"type": "shock_receding", "radius": 100, "duration": 100},
+#                {"type": "nan"}]
+# where "type" is one of the names in `registry` below or an importable
+# 'module:Class' path for user-defined policies.
+
+import os
+import math
+import json
+import time
+import importlib
+
+from history import RunHistory
+from dumpfile import read_headers, utime, udist
+
+
+class RunMonitor:
+    def __init__(self, full_output_path, from_dump=None, outfile=None):
+        self.full_output_path = full_output_path
+        self.dumps    = []  # [time (s), shock radius (km), pns radius (km), bounce time (s)]
+        self.lums     = []  # rows of nu_lum.txt
+        self.timing   = []  # [idump, time (s), wall (s), steps] of timing.txt
+        self.nan      = False
+        self.lum_nan  = False
+        self.lum_pos  = 0
+        self.timing_pos = 0
+        self.history  = RunHistory(full_output_path, update=False)
+        self.headers  = {}  # (file, offset, idump, t): row of self.dumps
+        # an attempt restarted from dump from_dump writes to outfile; until it
+        # supersedes them, the dumps the earlier attempt wrote past from_dump
+        # are left out
+        self.from_dump = from_dump
+        self.outfile   = outfile
+
+    def update(self):
+        self.read_lums()
+        self.read_timing()
+        self.read_dumps()
+
+    def read_lums(self):
+        filename = f'{self.full_output_path}/nu_lum.txt'
+        if not os.path.isfile(filename): return
+
+        # nu_lum.txt is rewritten from scratch on restarts
+        if os.path.getsize(filename) < self.lum_pos: self.lum_pos, self.lums, self.lum_nan = 0, [], False
+
+        with open(filename, 'r') as file:
+            file.seek(self.lum_pos)
+            while True:
+                line = file.readline()
+                if not line.endswith('\n'): break # incomplete line, read it next time
+                self.lum_pos = file.tell()
+
+                if 'nan' in line.lower(): self.lum_nan = True
+                try:    self.lums.append([float(value) for value in line.split()])
+                except ValueError: continue       # header
+
+    def read_timing(self):
+        filename = f'{self.full_output_path}/timing.txt'
+        if not os.path.isfile(filename): return
+
+        # rewritten on restarts, with the wall time starting over
+        if os.path.getsize(filename) < self.timing_pos: self.timing_pos, self.timing = 0, []
+
+        with open(filename, 'r') as file:
+            file.seek(self.timing_pos)
+            while True:
+                line = file.readline()
+                if not line.endswith('\n'): break
+                self.timing_pos = file.tell()
+
+                values = line.split()
+                if len(values) < 4 or not values[0].isdigit(): continue # header
+                self.timing.append([int(values[0]), float(values[1]), float(values[2]), int(values[3])])
+
+    def read_dumps(self):
+        # the time-ordered dumps of the history, analysis ones if the run
+        # writes them (every dump interval, the full ones possibly less often)
+        self.history.update()
+        dumps = []
+        for dump in self.history.dumps():
+            if self.from_dump != None and dump['idump'] > self.from_dump and \
+               dump['file'] not in (self.outfile, f'{self.outfile}.ana'): continue
+
+            key = (dump['file'], dump['offset'], dump['idump'], dump['t'])
+            if key not in self.headers:
+                header = next(read_headers(f"{self.full_output_path}/{dump['file']}", dump['offset']))
+                self.headers[key] = [header['t']*utime, header['shock_x']*udist/1e5,
+                                     header['pns_x']*udist/1e5, header['bounce_time']*utime]
+            dumps.append(self.headers[key])
+
+        self.dumps = dumps
+        self.nan   = self.lum_nan or any([math.isnan(value) for dump in dumps for value in dump])
+
+    def summary(self):
+        # latest state of the run: times in ms, radii in km, luminosities in foe/s
+        summary = {'updated': time.time(), 'nan': self.nan, 'dumps': len(self.dumps)}
+        if len(self.dumps) > 0:
+            t, shock, pns, bounce = self.dumps[-1][:4]
+            summary.update(time=t*1e3, shock=shock, pns=pns,
+                           postbounce=(t-bounce)*1e3 if bounce > 0 else None)
+        if len(self.lums) > 0 and len(self.lums[-1]) >= 7:
+            summary.update(lnue=self.lums[-1][1], lnueb=self.lums[-1][3], lnux=self.lums[-1][5])
+        if len(self.timing) > 0:
+            # over the last dump interval, or since the (re)start for the first one
+            idump, t, wall, steps = self.timing[-1]
+            since = self.timing[-2][2] if len(self.timing) > 1 else 0
+            summary.update(wall=wall, steps=sum(row[3] for row in self.timing),
+                           steps_per_s=steps/(wall-since) if wall > since else None)
+        return summary
+
+    def write_status(self, status):
+        # replaced in one go, so readers never see a partial file
+        filename = f'{self.full_output_path}/status.json'
+        summary  = self.summary()
+        summary['status'] = status
+        with open(f'{filename}.tmp', 'w') as file:
+            json.dump(summary, file, indent=2)
+        os.replace(f'{filename}.tmp', filename)
+
+
+class Policy:
+    def __init__(self, **kwargs):
+        for key, value in kwargs.items(): setattr(self, key, value)
+
+    def check(self, monitor):
+        return None
+
+
+class ShockBeyond(Policy):
+    # explosion: shock radius beyond `radius` km
+    radius = 3000
+
+    def check(self, monitor):
+        if len(monitor.dumps) == 0: return None
+        shock = monitor.dumps[-1][1]
+        if shock > self.radius: return f'shock at {shock:.0f} km > {self.radius} km'
+
+
+class ShockReceding(Policy):
+    # failed explosion: shock below `radius` km and receding for `duration` ms after bounce
+    radius   = 100
+    duration = 100
+
+    def check(self, monitor):
+        dumps = [dump for dump in monitor.dumps if dump[3] > 0 and dump[1] > 0]
+        if len(dumps) < 2: return None
+
+        t_end = dumps[-1][0]
+        for i in range(len(dumps)-1, 0, -1):
+            if dumps[i][1] >= self.radius or dumps[i][1] > dumps[i-1][1]: return None
+            if (t_end-dumps[i-1][0])*1e3 >= self.duration:
+                return f'shock receding below {self.radius} km for {self.duration} ms'
+
+
+class MaxPostBounce(Policy):
+    # enough post-bounce time simulated: `time` ms
+    time = 500
+
+    def check(self, monitor):
+        if len(monitor.dumps) == 0 or monitor.dumps[-1][3] <= 0: return None
+        tpb = (monitor.dumps[-1][0]-monitor.dumps[-1][3])*1e3
+        if tpb >= self.time: return f'{tpb:.0f} ms past bounce'
+
+
+class NaNDetected(Policy):
+    def check(self, monitor):
+        if monitor.nan: return 'NaN in the output'
+
+
+registry = {'shock_beyond'    : ShockBeyond,
+            'shock_receding'  : ShockReceding,
+            'max_postbounce'  : MaxPostBounce,
+            'nan'             : NaNDetected}
+
+
+def load_policies(specs):
+    policies = []
+    for spec in specs or []:
+        spec = dict(spec)
+        name = spec.pop('type')
+        if name in registry: policy = registry[name]
+        else:
+            module, cls = name.split(':')
+            policy = getattr(importlib.import_module(module), cls)
+        policies.append(policy(**spec))
+    return policies
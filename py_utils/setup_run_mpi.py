@@ -8,9 +8,15 @@
 import numpy as np
 import os
 import sys
+import json
+import fcntl
 import shutil
+import hashlib
 import time
+import contextlib
 from subprocess import Popen, PIPE
+from policies import RunMonitor, load_policies
+from history import RunHistory, outfile_re
 
 class multirun:
     def __init__(self, suffixs, masses, enclmass_conv_cutoff,pns_cutoff,
@@ -18,7 +24,11 @@ class multirun:
                  pns_grid_goals, conv_grid_goals, grid_goals,
                  maxrads, mlmodels=['None'],
                  read_dump=0, dump_interval=1e-3, restart=False,
-                 data_names=None, maxtime=0.5, eos=5, pturb=0):
+                 data_names=None, maxtime=0.5, eos=5, pturb=0,
+                 data_cache=None, cache_max_size=50, cache_max_age=90,
+                 batch_prep=False, prep_nproc=1,
+                 max_retries=2, stall_timeout=3600, poll_interval=30,
+                 policies=None):
         
         self.suffixs         = suffixs
         self.masses          = masses
@@ -37,11 +47,27 @@ class multirun:
         self.conv_grid_goals = conv_grid_goals
         self.grid_goals      = grid_goals
         self.read_dump       = read_dump
-        self.dump_interval   = dump_interval
-        self.maxtime         = maxtime
         self.restart         = restart
-        self.eos             = eos
-        self.pturb           = pturb
+        # runtime parameters are either shared by all runs or given per run
+        per_run = lambda value: value if isinstance(value, list) else [value]*len(masses)
+        self.dump_intervals  = per_run(dump_interval)
+        self.maxtimes        = per_run(maxtime)
+        self.eoss            = per_run(eos)
+        self.pturbs          = per_run(pturb)
+        # prepared 'Data' is shared between runs with identical setup_prep inputs
+        if data_cache != None: 
+            self.data_cache  = DataCache(data_cache, cache_max_size, cache_max_age)
+        else: self.data_cache = None
+        # prepare Data for all runs at once with 'make data_batch'
+        self.batch_prep      = batch_prep
+        self.prep_nproc      = prep_nproc
+        self.batch_data      = {}
+        # crashed or stalled runs restart from their last dump up to max_retries times
+        self.max_retries     = max_retries
+        self.stall_timeout   = stall_timeout # [s] without new output; None disables
+        self.poll_interval   = poll_interval # [s]
+        # stop runs early once they clearly exploded or failed (see policies.py)
+        self.policies        = load_policies(policies)
         
     def setup_pars(self, i):
         self.mass          = self.masses[i]
@@ -54,6 +80,10 @@ class multirun:
         self.maxrad         = self.maxrads[i]
         self.suffix         = self.suffixs[i]
         self.mlmodel        = self.mlmodels[i]
+        self.dump_interval  = self.dump_intervals[i]
+        self.maxtime        = self.maxtimes[i]
+        self.eos            = self.eoss[i]
+        self.pturb          = self.pturbs[i]
         
         if self.data_names != None: self.data_in = self.data_names[i]
         
@@ -90,14 +120,93 @@ class multirun:
             if counter == 120: colored.error("executable '1dmlmix' not found (waited 2 mins)")
         print(f'rank {rank} prepared {self.run_name}; running...')
         
-        cmd.popen(f'time ./1dmlmix > {stdout} 2> {stderr}')        
+        status = self.supervise(rank, stdout, stderr)
         
         colored.subhead('--------------------------------------------')
-        colored.subhead(f'rank {rank} finished running {self.run_name}')
+        colored.subhead(f'rank {rank} finished running {self.run_name}: {status}')
         colored.subhead('--------------------------------------------')
         
+        return status
+        
+    def supervise(self, rank, stdout, stderr):
+        
+        # Runs the simulation, restarting it from the last complete dump
+        # after abnormal exits; returns 'finished' or the last failure
+        last_dump = None
+        for attempt in range(self.max_retries+1):
+            # each attempt is followed from its own start (see RunMonitor)
+            if self.restart: monitor = RunMonitor(self.full_output_path, self.read_dump,
+                                                  os.path.basename(self.data_out))
+            else:            monitor = RunMonitor(self.full_output_path)
+            start  = time.time()
+            status = self.watch(stdout, stderr, monitor)
+            monitor.update()
+            monitor.write_status(status)
+            print(f'rank {rank}: {self.run_name} {status} after {(time.time()-start)/3600:.2f} h')
+            
+            if status == 'finished' or status.startswith('terminated'): return status
+            if attempt == self.max_retries: break
+            
+            shutil.move(stderr, f'{stderr}_{attempt}') # keep the failure messages
+            self.restart = True
+            self.find_last_dump()
+            if self.read_dump == last_dump:
+                colored.warn(f'{self.run_name} made no progress since the last restart; giving up')
+                break
+            last_dump = self.read_dump
             
-    def initialize(self, rank):
+            self.setup()
+            os.chdir(self.sim_path)
+            colored.warn(f'rank {rank}: restarting {self.run_name} from dump {self.read_dump} '+
+                         f'(retry {attempt+1}/{self.max_retries})')
+        
+        return status
+    
+    def watch(self, stdout, stderr, monitor):
+        
+        # 'stop' exits with status 0, so the outcome is read from stderr
+        with open(stdout, 'w') as out, open(stderr, 'w') as err:
+            p = Popen('./1dmlmix', stdout=out, stderr=err)
+        
+        last_progress = time.time()
+        while p.poll() is None:
+            time.sleep(self.poll_interval)
+            last_progress = max(last_progress, self.last_output())
+            
+            if self.stall_timeout != None and time.time()-last_progress > self.stall_timeout:
+                p.kill()
+                p.wait()
+                return f'stalled (no output for {self.stall_timeout} s)'
+            
+            # the status is followed across a sweep with monitor.py
+            monitor.update()
+            monitor.write_status('running')
+            for policy in self.policies:
+                reason = policy.check(monitor)
+                if reason == None: continue
+                p.terminate()
+                p.wait()
+                return f'terminated ({reason})'
+        
+        with open(stderr, 'r') as file:
+            messages = file.read()
+        
+        if 'DONE: reached the maximum time' in messages: return 'finished'
+        if p.returncode != 0: return f'crashed (exit status {p.returncode})'
+        
+        stops = [line.strip() for line in messages.splitlines() if line.strip().startswith('STOP')]
+        if len(stops) > 0: return f'stopped ({stops[-1][4:].strip()})'
+        return 'exited without reaching the maximum time'
+    
+    def last_output(self):
+        # the binary dumps and nu_lum.txt are the only files growing during a run
+        outfiles = [f'{self.full_output_path}/{filename}' for filename in os.listdir(self.full_output_path)
+                    if (filename.startswith('DataOut') and not 'read' in filename) or filename == 'nu_lum.txt']
+        
+        return max([os.path.getmtime(filename) for filename in outfiles] + [0])
+        
+            
+    def initialize(self, rank, ask=True):
         
         if rank==0: 
             colored.head(f'\n=====================================')
@@ -109,18 +218,26 @@ class multirun:
             if rank == 0: colored.head('<<< Converting Binary to Readable >>>') 
             self.setup_pars(rank)            
             self.find_last_dump()
+            read = Readout(self.run_path, self.full_output_path,
+                           base_file = 'DataOut_read', outfile=os.path.basename(self.data_in))
+            read.run_readable()
             self.setup()
             self.setup_readout()
             print(f'Rank',f'{rank}'.ljust(2, ' '),
                   f'{self.run_name} restarts from dump: {self.read_dump}')
         else:
+            if self.batch_prep:
+                with self.template_lock(): self.prep_data_batch()
+            
             # Initializes all fresh runs in serial
             for i in range(len(self.masses)):
                 self.setup_pars(i)
                                     
                 colored.subhead(f'--- {self.run_name} ---')
                 
-                if os.path.exists(self.full_output_path):
+                # runs taken from the sweep queue later on have no terminal to
+                # ask; they never wrote a dump (see Sweep.started)
+                if os.path.exists(self.full_output_path) and ask:
                     if len(os.listdir(self.full_output_path)) != 0:
                         print(self.full_output_path)
                         valid_input = False
@@ -141,7 +258,7 @@ class multirun:
                 # check if run_folder exists; create and copy template if not            
                 # also prep data and copy it to the run folder
                 if self.data_names==None: self.data_in = 'Data'
-                self.prep_data()                
+                with self.template_lock(): self.prep_data()
                 self.data_out = f'{self.full_output_path}/DataOut'
                 
                 # edit 'setup' to include unique output path
@@ -152,8 +269,27 @@ class multirun:
                                                 
             colored.head('<<<< Initialization Completed >>>>')                           
 
+    @contextlib.contextmanager
+    def template_lock(self):
+        # prep_data edits setup_prep, runs make and leaves Data in the shared
+        # template before copying it; ranks initializing runs from the sweep
+        # queue at the same time take turns
+        with open(f'{os.path.normpath(self.template_path)}.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:     yield
+            finally: fcntl.flock(lock, fcntl.LOCK_UN)
+
     def prep_data(self):
         
+        data_file = f'{self.data_path}/project/1dmlmix/{self.data_in}'
+        
+        # already produced by prep_data_batch
+        if self.run_name in self.batch_data:
+            shutil.move(self.batch_data.pop(self.run_name), data_file)
+            print('Data prepared in batch')
+            self.edit_copy_template()
+            return
+        
         # Edit setup_prep
         filepath = f'{self.data_path}/prep_data/setup_prep'
         with open(filepath, 'r') as file:    
@@ -182,6 +318,14 @@ class multirun:
                                                            
         self.write_data(filepath, data)                      
         
+        cache_key = None
+        if self.data_cache != None:
+            cache_key = self.data_cache.key(filepath)
+            if self.data_cache.fetch(cache_key, data_file):
+                print(f'Data found in cache: {cache_key[:12]}')
+                self.edit_copy_template()
+                return
+        
         # run 'make data'
         os.chdir(self.data_path)
         
@@ -193,9 +337,77 @@ class multirun:
         
         print('Data prepared')
         
+        if cache_key != None: self.data_cache.store(cache_key, data_file)
+        
         # deletes run_folder if exists exists; create and copy template if not
         self.edit_copy_template()
 
+    def prep_data_batch(self):
+        
+        # Writes all configurations into setup_prep_batch and prepares them
+        # with a single compilation, loading the EOS table once per process
+        prep_path    = f'{self.data_path}/prep_data'
+        project_path = f'{self.data_path}/project/1dmlmix'
+        defaults     = read_setup(f'{prep_path}/setup_prep')
+        
+        lines   = ['<Batch Data Preparation: one configuration per line below, strings in quotes>\n',
+                   '<Input File> <Output File> <Goal Size of the PNS> <Goal Size of Convective Grid> '+
+                   '<Goal Total Resolution> <Enclosed Mass Cutoff for the PNS (Msol)> '+
+                   '<Enclosed Mass Cutoff for Convective Region (Msol)> <Initial Cell Mass> '+
+                   '<Cell Mass Growth Rate past enclosed mass cutoff> <Maximum Radius of the Grid (cm)> <EOS option>\n',
+                   '<EOS Table Path (shared by all configurations)>\n',
+                   f'{self.eos_table_path}\n',
+                   '<Configurations>\n']
+        to_cache = {}
+        
+        for i in range(len(self.masses)):
+            self.setup_pars(i)
+            
+            inputs = dict(defaults)
+            inputs.update({'Input File'                                 : f'{self.dataset}/s{self.mass}_presn',
+                           'Goal Size of the PNS'                       : f'{self.pns_grid_goal}',
+                           'Goal Size of Convective Grid'               : f'{self.conv_grid_goal}',
+                           'Goal Total Resolution'                      : f'{self.grid_goal}',
+                           'Enclosed Mass Cutoff for the PNS'           : f'{self.enclmass_pns}',
+                           'Enclosed Mass Cutoff for Convective Region' : f'{self.enclmass_conv}',
+                           'Maximum Radius of the Grid'                 : f'{self.maxrad}',
+                           'EOS Table Path'                             : f'{self.eos_table_path}',
+                           'EOS option'                                 : f'{self.eos}'})
+            
+            data_out = f'Data_{self.run_name}'
+            self.batch_data[self.run_name] = f'{project_path}/{data_out}'
+            
+            if self.data_cache != None:
+                cache_key = self.data_cache.key_from_inputs(inputs, prep_path)
+                if self.data_cache.fetch(cache_key, f'{project_path}/{data_out}'): continue
+                to_cache[self.run_name] = cache_key
+            
+            lines.append(f"'{inputs['Input File']}' '{data_out}' "+
+                         f"{inputs['Goal Size of the PNS']} {inputs['Goal Size of Convective Grid']} "+
+                         f"{inputs['Goal Total Resolution']} {inputs['Enclosed Mass Cutoff for the PNS']} "+
+                         f"{inputs['Enclosed Mass Cutoff for Convective Region']} {inputs['Initial Cell Mass']} "+
+                         f"{inputs['Cell Mass Growth Rate past enclosed mass cutoff']} "+
+                         f"{inputs['Maximum Radius of the Grid']} {inputs['EOS option']}\n")
+        
+        nconfig = len(lines)-5
+        colored.head(f'<<< Batch Data Preparation: {nconfig} of {len(self.masses)} not cached >>>')
+        if nconfig == 0: return
+        
+        self.write_data(f'{prep_path}/setup_prep_batch', lines)
+        
+        os.chdir(self.data_path)
+        cmd.popen(f'make data_batch NPROC={min(self.prep_nproc, nconfig)}')
+        cmd.popen('make clean')
+        
+        for run_name, cache_key in to_cache.items():
+            self.data_cache.store(cache_key, self.batch_data[run_name])
+        
+        # runs that failed in batch will fall back to the regular 'make data'
+        for run_name, data_file in list(self.batch_data.items()):
+            if not os.path.isfile(data_file): 
+                colored.warn(f'{run_name} was not prepared in batch')
+                self.batch_data.pop(run_name)
+
     def edit_copy_template(self):     
         # if not os.path.exists(self.run_path): 
             # Edit Makefile
@@ -226,24 +438,20 @@ class multirun:
             file.writelines(data)     
             
     def find_last_dump(self):
-        outfiles = [filename for filename in os.listdir(f'{self.full_output_path}') if "restart" in filename]
+        # the last full dump in the history of the run, which also brings its
+        # manifest up to date; restart files left empty by a crash hold no
+        # dumps, and the analysis dumps (*.ana) cannot be restarted from
+        history = RunHistory(self.full_output_path)
+        last    = history.last(analysis=False)
+        if last == None: colored.error(f'{self.run_name} has no complete dump to restart from')
 
-        if any("restart" in file for file in outfiles):             
-            last_num   = max([int(filename.split('_')[-1]) for filename in outfiles])            
-            input_name = f"DataOut_restart_{last_num}" 
-        else:
-            last_num   = 0
-            input_name = "DataOut"             
-            
+        chain     = history.chain(analysis=False)
+        last_num  = int(outfile_re.match(chain[-1]).group(2) or 0)
         next_num  = last_num + 1
         
-        read      = Readout(self.run_path, self.full_output_path,
-                            base_file = 'DataOut_read', outfile=input_name)
-        last_dump = read.run_readable()
-        
-        self.data_in   = f'{self.full_output_path}/{input_name}'
+        self.data_in   = f"{self.full_output_path}/{last['file']}"
         self.data_out  = f'{self.full_output_path}/DataOut_restart_{next_num}'
-        self.read_dump = last_dump
+        self.read_dump = last['idump']
                 
         return             
         
@@ -296,6 +504,124 @@ class multirun:
         self.check_path(self.full_output_path)     
         
         
+def read_setup(filepath):
+    # parses '<Name (units)>' / value pairs of setup files into {Name: value}
+    inputs = {}
+    with open(filepath, 'r') as file:
+        data = file.readlines()
+        for i, line in enumerate(data):
+            if line.startswith('<') and i+1 < len(data):
+                inputs[line.strip()[1:].split('>')[0].split(' (')[0]] = data[i+1].strip()
+    return inputs
+
+        
+class DataCache:
+    #
+    # Content-addressed store of prepared progenitor 'Data' files.
+    # The key is a hash of every setup_prep value that affects the grid
+    # (the output name is excluded), the progenitor file contents, and
+    # every source and data file prep_data is built from or reads, so
+    # runs that only differ in runtime parameters (pturb, mlmodel,
+    # dump_interval, etc.) skip data prep.
+    #
+    ignore_keys = ['Output File']
+    # in prep_data/: sources, includes, tables (*.atb) and the network
+    prep_inputs = ('.f90', '.F90', '.f', '.inc', '.atb', 'netwinv4')
+    
+    def __init__(self, cache_path, max_size=50, max_age=90):
+        self.cache_path = cache_path  
+        self.max_size   = max_size    # [GB]
+        self.max_age    = max_age     # [days]
+        
+        if not os.path.exists(self.cache_path): os.makedirs(self.cache_path)
+        
+    def key(self, setup_prep):
+        prep_path = os.path.dirname(os.path.abspath(setup_prep))
+        return self.key_from_inputs(read_setup(setup_prep), prep_path)
+    
+    def key_from_inputs(self, inputs, prep_path):
+        sha = hashlib.sha256()        
+        for name in sorted(inputs):
+            if name in self.ignore_keys: continue
+            sha.update(f'{name}={inputs[name]}\n'.encode())
+            
+        # contents of the progenitor, and of everything prep_data is compiled
+        # from or reads besides it; the EOS driver (nuc_eos.a) by its sources
+        sha.update(self.file_hash(f'{prep_path}/{inputs["Input File"]}').encode())
+        for filename in sorted(os.listdir(prep_path)):
+            if not filename.endswith(self.prep_inputs): continue
+            sha.update(f'{filename}:{self.file_hash(f"{prep_path}/{filename}")}'.encode())
+        
+        eosdriver_path = f'{os.path.dirname(prep_path)}/EOSdriver'
+        if os.path.isdir(eosdriver_path):
+            for filename in sorted(os.listdir(eosdriver_path)):
+                if not filename.endswith(('.F90', '.f')): continue
+                sha.update(f'{filename}:{self.file_hash(f"{eosdriver_path}/{filename}")}'.encode())
+        
+        # EOS tables are too large to hash on every call: their size and
+        # modification time stand in for the contents
+        if 'EOS Table Path' in inputs:
+            eos_table = inputs['EOS Table Path']
+            if not os.path.isabs(eos_table): eos_table = f'{prep_path}/{eos_table}'
+            if os.path.exists(eos_table):
+                stat = os.stat(eos_table)
+                sha.update(f'{os.path.abspath(eos_table)}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+        
+        return sha.hexdigest()
+    
+    def fetch(self, key, data_file):
+        entry = f'{self.cache_path}/{key}'
+        if not os.path.isfile(f'{entry}/Data'): return False
+        
+        shutil.copy(f'{entry}/Data', data_file)
+        os.utime(f'{entry}/meta.json')  # marks the entry as recently used
+        return True
+        
+    def store(self, key, data_file):
+        if not os.path.isfile(data_file): 
+            colored.warn(f'{data_file} was not produced, nothing to cache')
+            return
+        
+        # copy into a temporary folder first, so an interrupted copy is never used
+        entry = f'{self.cache_path}/{key}'
+        tmp   = f'{entry}.tmp{os.getpid()}'
+        if os.path.exists(tmp): shutil.rmtree(tmp)
+        os.makedirs(tmp)
+        
+        shutil.copy(data_file, f'{tmp}/Data')
+        with open(f'{tmp}/meta.json', 'w') as file:
+            json.dump({'created': time.time(), 'source': data_file}, file)
+        
+        if os.path.exists(entry): shutil.rmtree(tmp)
+        else: os.rename(tmp, entry)
+        
+        self.evict()
+    
+    def evict(self):
+        entries = []
+        for key in os.listdir(self.cache_path):
+            meta = f'{self.cache_path}/{key}/meta.json'
+            if not os.path.isfile(meta): continue            
+            size = os.path.getsize(f'{self.cache_path}/{key}/Data')
+            entries.append([os.path.getmtime(meta), size, key])
+        
+        # remove stale entries, then the least recently used until under max_size
+        now     = time.time()
+        entries = sorted(entries)
+        total   = sum([entry[1] for entry in entries])
+        for used, size, key in entries:
+            if (now-used)/86400 > self.max_age or total > self.max_size*1024**3:
+                shutil.rmtree(f'{self.cache_path}/{key}')
+                total -= size
+        
+    @staticmethod
+    def file_hash(filepath, chunk=2**20):
+        sha = hashlib.sha256()
+        with open(filepath, 'rb') as file:
+            for block in iter(lambda: file.read(chunk), b''): sha.update(block)
+        return sha.hexdigest()
+        
+
 class Readout:
     def __init__(self, run_path, full_output_path, base_file, outfile):
         self.base_file        = base_file
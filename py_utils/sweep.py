@@ -0,0 +1,224 @@
+# Declarative sweep specifications for multirun.
+#
+# A sweep is a JSON file with paths, default run parameters and
+# parameter grids:
+#   "zip"       : equal-length lists, varied together (e.g. mass & cutoff)
+#   "product"   : lists whose cartesian product is taken with the zip
+#   "overrides" : [{"match": {...}, "set": {...}}] per-member changes,
+#                 e.g. the s19.0 10k special case
+# String parameters (suffix, mlmodel) are formatted with the member's
+# values, e.g. "mlmodels/limited/model_s{mass}_angav.pt".
+#
+# Optional "policies" stop runs early once they clearly exploded or
+# failed (see policies.py).
+#
+# Identical configurations are dropped, and the progress of every run
+# is kept in a state file, so relaunching a sweep resumes it:
+# finished runs are skipped and started runs restart from their last dump.
+# A member whose configuration changed starts over; the output of the
+# earlier configuration is moved to <run_name>_<its hash>.
+
+import os
+import sys
+import json
+import fcntl
+import hashlib
+import itertools
+from setup_run_mpi import multirun, colored
+
+# parameters that define a run; anything else in a member is bookkeeping
+run_keys = ['mass', 'suffix', 'enclmass_conv_cutoff', 'pns_cutoff',
+            'pns_grid_goal', 'conv_grid_goal', 'grid_goal', 'maxrad',
+            'mlmodel', 'pturb', 'maxtime', 'dump_interval', 'eos']
+
+defaults = {'pns_cutoff'    : 1.1,
+            'pns_grid_goal' : 600,
+            'maxrad'        : 1.5e9,
+            'mlmodel'       : 'None',
+            'pturb'         : 0.0,
+            'maxtime'       : 0.5,
+            'dump_interval' : 1e-3,
+            'eos'           : 5}
+
+
+class Sweep:
+    def __init__(self, spec_path):
+        with open(spec_path, 'r') as file:
+            self.spec = json.load(file)
+
+        self.name           = self.spec.get('name', os.path.basename(spec_path).split('.')[0])
+        self.dataset        = self.spec.get('dataset', 'sukhbold2016')
+        self.base_path      = self.spec['base_path']
+        self.template_path  = self.spec['template_path'].format(base_path=self.base_path)
+        self.output_path    = self.spec['output_path']
+        self.eos_table_path = self.spec['eos_table_path']
+        self.read_dump      = self.spec.get('read_dump', 0)
+        self.resume         = self.spec.get('resume', True)
+        self.options        = self.spec.get('options', {}) # extra multirun keywords
+
+        state_path = self.spec.get('state_file', f'{self.output_path}/sweep_{self.name}.json')
+        self.state = SweepState(state_path)
+
+    def expand(self):
+        zip_pars     = self.spec.get('zip', {})
+        product_pars = self.spec.get('product', {})
+
+        lengths = set([len(vals) for vals in zip_pars.values()])
+        if len(lengths) > 1:
+            colored.error(f"'zip' parameters have different lengths: {dict([(k,len(v)) for k,v in zip_pars.items()])}")
+
+        zipped   = [dict(zip(zip_pars, vals)) for vals in zip(*zip_pars.values())]
+        products = [dict(zip(product_pars, vals)) for vals in itertools.product(*product_pars.values())]
+
+        members, hashes = [], {}
+        for z in zipped or [{}]:
+            for p in products or [{}]:
+                member = dict(defaults)
+                member.update(self.spec.get('defaults', {}))
+                member.update(z)
+                member.update(p)
+
+                for override in self.spec.get('overrides', []):
+                    if all([member.get(k) == v for k, v in override['match'].items()]):
+                        member.update(override['set'])
+
+                for key in ['suffix', 'mlmodel']:
+                    member[key] = str(member[key]).format(**member)
+
+                missing = [key for key in run_keys if key not in member]
+                if missing: colored.error(f'sweep member {member} is missing {missing}')
+
+                member['run_name'] = f"s{member['mass']}{member['suffix']}"
+                member['hash']     = config_hash(member)
+
+                if member['hash'] in hashes.values():
+                    colored.warn(f"duplicate configuration dropped: {member['run_name']}")
+                    continue
+                if member['run_name'] in hashes:
+                    colored.error(f"different configurations share the run name {member['run_name']}")
+
+                hashes[member['run_name']] = member['hash']
+                members.append(member)
+
+        return members
+
+    def schedule(self, size, launch):
+        # Claims the first `size` members for the ranks, split into fresh runs and restarts
+        fresh, restart = [], []
+        for rank in range(size):
+            member = self.claim(launch)
+            if member == None: break
+            if self.started(member): restart.append(member)
+            else:                    fresh.append(member)
+
+        return fresh, restart
+
+    def claim(self, launch):
+        # Marks the next member that is neither done nor taken in this launch as
+        # taken, and returns it (None once there is none left); ranks call it
+        # whenever their run is over, so the sweep is a queue shared by all ranks
+        members = self.members()
+
+        def take(state):
+            for member in members:
+                entry = state.get(member['run_name'], {})
+                if entry.get('hash', member['hash']) != member['hash']:
+                    self.set_aside(member, entry['hash'])
+                    entry = {}
+
+                if entry.get('status') in ['finished', 'terminated']: continue
+                if entry.get('launch') == launch: continue
+
+                entry.update({'hash': member['hash'], 'launch': launch, 'status': 'claimed'})
+                state[member['run_name']] = entry
+                return member
+            return None
+
+        return self.state.transact(take)
+
+    def set_aside(self, member, old_hash):
+        # the output of an earlier configuration must not be restarted from
+        # (see started), so it is moved out of the member's way
+        path = f"{self.output_path}/{member['run_name']}"
+        if os.path.exists(path):
+            aside, n = f'{path}_{old_hash}', 1
+            while os.path.exists(aside): aside, n = f'{path}_{old_hash}_{n}', n+1
+            os.rename(path, aside)
+            colored.warn(f"{member['run_name']} configuration changed; starting over, "+
+                         f"previous output moved to {aside}")
+        else: colored.warn(f"{member['run_name']} configuration changed; starting over")
+
+    def started(self, member):
+        return self.resume and os.path.isfile(f"{self.output_path}/{member['run_name']}/DataOut")
+
+    def members(self):
+        if not hasattr(self, '_members'): self._members = self.expand()
+        return self._members
+
+    def multirun(self, members, restart=False):
+        # per-run lists in the order multirun expects
+        par = lambda key: [member[key] for member in members]
+
+        return multirun(par('suffix'), par('mass'), par('enclmass_conv_cutoff'), par('pns_cutoff'),
+                        self.dataset, self.base_path, self.template_path, self.output_path,
+                        self.eos_table_path, par('pns_grid_goal'), par('conv_grid_goal'),
+                        par('grid_goal'), par('maxrad'), par('mlmodel'), self.read_dump,
+                        par('dump_interval'), restart, maxtime=par('maxtime'), eos=par('eos'),
+                        pturb=par('pturb'), policies=self.spec.get('policies'), **self.options)
+
+    def status(self):
+        state = self.state.load()
+        for member in self.expand():
+            entry = state.get(member['run_name'], {})
+            print(f"{member['run_name']:<32} {entry.get('status', 'pending')}")
+
+
+class SweepState:
+    #
+    # JSON state file shared by all ranks; every update is done
+    # under an exclusive lock and written atomically
+    #
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not os.path.isfile(self.path): return {}
+        with open(self.path, 'r') as file:
+            return json.load(file)
+
+    def update(self, member, **fields):
+        def change(state):
+            entry = state.get(member['run_name'], {})
+            entry.update({'hash': member['hash']})
+            entry.update(fields)
+            state[member['run_name']] = entry
+
+        self.transact(change)
+
+    def transact(self, change):
+        # change(state) edits the loaded state in place; its result is returned
+        if not os.path.exists(os.path.dirname(self.path)): os.makedirs(os.path.dirname(self.path))
+
+        with open(f'{self.path}.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            state  = self.load()
+            result = change(state)
+
+            with open(f'{self.path}.tmp', 'w') as file:
+                json.dump(state, file, indent=2)
+            os.replace(f'{self.path}.tmp', self.path)
+
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+        return result
+
+
+def config_hash(member):
+    config = json.dumps([member[key] for key in run_keys])
+    return hashlib.sha256(config.encode()).hexdigest()[:16]
+
+
+if __name__ == '__main__':
+    # python sweep.py sweeps/baseline.json : prints the expanded sweep and its status
+    Sweep(sys.argv[1]).status()
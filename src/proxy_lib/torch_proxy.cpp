@@ -21,6 +21,7 @@
 
 #include <filesystem>
 #include <mutex>
+#include <cstdio>
 
 #include <torch/torch.h>
 #include <torch/script.h>
@@ -98,8 +99,6 @@ torch::Tensor tensor_from_array(void* array,
     // Reverse axes fortran -> c
     std::vector<int64_t> torch_shape(arr_rank);
 
-    torch::set_num_threads(1);
-
     for (int i=0; i<arr_rank; i++) {
         torch_shape[i] = ftn_shape[ arr_rank - (i+1) ];
     }
@@ -204,6 +203,34 @@ void torch_module_forward_cpp(void* h_module, void* h_inputs, void** h_output, i
     update_map(p_tensor->data_ptr(), mod->host_cache);
 }
 
+void torch_module_forward_into_cpp(void* h_module, void* h_inputs, void* array,
+        int arr_rank, FtnShapeType* arr_shape, int elem_type, int elem_size, int flags) {
+    c10::InferenceMode mode( is_present_flag(flags, TORCH_FTN_MODULE_USE_INFERENCE_MODE) );
+    auto mod    = static_cast<JITModule*>(h_module);
+    auto inputs = static_cast<IWrap*>(h_inputs);
+
+    debug_print("Module %p :: forward_into(in: %p * %ld, out: %p)\n", h_module, h_inputs, inputs->size(), array);
+
+    // The caller's preallocated array viewed as a tensor
+    auto output = tensor_from_array(array, arr_rank, arr_shape, elem_type, elem_size);
+    auto result = mod->jit_module.forward(*inputs).toTensor();
+
+    if (result.numel() != output.numel()) {
+        throw std::runtime_error("Size mismatch in forward_into, module returned "
+            +std::to_string(result.numel())+" elements, the array holds "+std::to_string(output.numel()));
+    }
+    // Single copy straight into the Fortran array, converting dtype and device if needed
+    output.copy_(result.reshape(output.sizes()));
+}
+
+int torch_module_param_size_cpp(void* h_module) {
+    auto mod = static_cast<JITModule*>(h_module);
+    for (const auto& param : mod->jit_module.parameters()) {
+        return param.element_size();
+    }
+    return 4;
+}
+
 void torch_module_train_cpp(void* h_module, void* h_inputs, void* h_target, void* h_optimizer, float* loss) {
     auto mod = static_cast<JITModule*>(h_module);
     auto inputs = static_cast<IWrap*>(h_inputs);
@@ -292,6 +319,22 @@ void torch_pymodule_free_cpp(void* h_module) {
 /*
  * Miscellaneous
  */
+void torch_set_num_threads_cpp(int intra_op, int inter_op) {
+    if (intra_op > 0) { torch::set_num_threads(intra_op); }
+
+    // The inter-op pool can only be sized once, before it is first used
+    static bool interop_set = false;
+    if (inter_op > 0 && !interop_set) {
+        try {
+            torch::set_num_interop_threads(inter_op);
+        } catch (const std::exception& e) {
+            fprintf(stderr, "torch_set_num_threads: inter-op threads already set (%s)\n", e.what());
+        }
+        interop_set = true;
+    }
+    debug_print("Torch threads: intra-op %d, inter-op %d\n", torch::get_num_threads(), torch::get_num_interop_threads());
+}
+
 void torch_optimizer_create_sgd_cpp(void** handle, void* h_module, float lr) {
     auto mod = static_cast<torch::jit::Module*>(h_module);
 
@@ -28,6 +28,9 @@ extern "C" {
 
     void torch_module_load_cpp(void** h_module, const char* file_name, int flags);
     void torch_module_forward_cpp(void* h_module, void* h_input, void** h_output, int flags);
+    void torch_module_forward_into_cpp(void* h_module, void* h_input, void* array,
+        int arr_rank, FtnShapeType* arr_shape, int elem_type, int elem_size, int flags);
+    int  torch_module_param_size_cpp(void* h_module);
     void torch_module_train_cpp(void* h_module, void* h_input, void* h_target, void* h_optimizer, float* loss);
     void torch_optimizer_create_sgd_cpp(void** handle, void* h_module, float lr);
     void torch_module_save_cpp(void* h_module, char* filename);
@@ -53,4 +56,10 @@ extern "C" {
     void torch_tensor_wrap_add_scalar_cpp    (void*  handle, void* value, int elem_type, int elem_size);
     void torch_tensor_wrap_clear_cpp         (void*  handle);
     void torch_tensor_wrap_free_cpp          (void*  handle);
+
+    void torch_set_num_threads_cpp(int intra_op, int inter_op);
+
+    void torch_remote_forward_cpp(const char* socket_path, const char* model, const void* array,
+        int arr_rank, FtnShapeType* arr_shape, int elem_size, double* output, int64_t out_size);
+    void torch_remote_close_cpp();
 }
\ No newline at end of file
@@ -0,0 +1,108 @@
+// Client for py_utils/ml_server.py: sends a Fortran array to the local
+// inference server over a Unix socket and receives the float64 result.
+// The connection is opened on the first call and kept for the whole run.
+
+#include <cstdint>
+#include <cstring>
+#include <string>
+#include <vector>
+#include <stdexcept>
+#include <filesystem>
+
+#include <sys/socket.h>
+#include <sys/un.h>
+#include <unistd.h>
+
+#include "torch_proxy.h"
+
+namespace {
+
+int server_fd = -1;
+std::string server_path;
+
+void send_all(const void* data, size_t size) {
+    auto ptr = static_cast<const char*>(data);
+    while (size > 0) {
+        ssize_t n = send(server_fd, ptr, size, 0);
+        if (n <= 0) { throw std::runtime_error("ML server: connection lost while sending"); }
+        ptr  += n;
+        size -= n;
+    }
+}
+
+void recv_all(void* data, size_t size) {
+    auto ptr = static_cast<char*>(data);
+    while (size > 0) {
+        ssize_t n = recv(server_fd, ptr, size, 0);
+        if (n <= 0) { throw std::runtime_error("ML server: connection lost while receiving"); }
+        ptr  += n;
+        size -= n;
+    }
+}
+
+void connect_server(const char* socket_path) {
+    if (server_fd >= 0 && server_path == socket_path) { return; }
+    if (server_fd >= 0) { close(server_fd); }
+
+    sockaddr_un addr;
+    std::memset(&addr, 0, sizeof(addr));
+    addr.sun_family = AF_UNIX;
+    std::strncpy(addr.sun_path, socket_path, sizeof(addr.sun_path)-1);
+
+    server_fd = socket(AF_UNIX, SOCK_STREAM, 0);
+    if (server_fd < 0 || connect(server_fd, reinterpret_cast<sockaddr*>(&addr), sizeof(addr)) != 0) {
+        server_fd = -1;
+        throw std::runtime_error(std::string("ML server: cannot connect to ") + socket_path);
+    }
+    server_path = socket_path;
+}
+
+}
+
+void torch_remote_forward_cpp(const char* socket_path, const char* model, const void* array,
+        int arr_rank, FtnShapeType* arr_shape, int elem_size, double* output, int64_t out_size) {
+
+    connect_server(socket_path);
+
+    // The server loads models by absolute path, as it runs in its own folder
+    std::string path = std::filesystem::absolute(model).string();
+
+    // Reverse axes fortran -> torch
+    std::vector<int64_t> shape(arr_rank);
+    int64_t count = 1;
+    for (int i=0; i<arr_rank; i++) {
+        shape[i] = arr_shape[ arr_rank - (i+1) ];
+        count   *= shape[i];
+    }
+
+    uint32_t length = path.size(), rank = arr_rank, size = elem_size;
+    send_all("CMLR", 4);
+    send_all(&length, sizeof(length));
+    send_all(path.data(), length);
+    send_all(&rank, sizeof(rank));
+    send_all(shape.data(), sizeof(int64_t)*arr_rank);
+    send_all(&size, sizeof(size));
+    send_all(array, count*elem_size);
+
+    uint32_t status;
+    uint64_t n;
+    recv_all(&status, sizeof(status));
+    recv_all(&n, sizeof(n));
+
+    if (status != 0) {
+        std::string message(n, ' ');
+        recv_all(message.data(), n);
+        throw std::runtime_error("ML server: " + message);
+    }
+    if (static_cast<int64_t>(n) != out_size) {
+        std::vector<double> discard(n);
+        recv_all(discard.data(), n*sizeof(double));
+        throw std::runtime_error("ML server returned "+std::to_string(n)+" values, expected "+std::to_string(out_size));
+    }
+    recv_all(output, n*sizeof(double));
+}
+
+void torch_remote_close_cpp() {
+    if (server_fd >= 0) { close(server_fd); }
+    server_fd = -1;
+}